@@ -7,10 +7,11 @@ Provides REST API for document translation functionality
 import os
 import uuid
 import json
-import threading
+import math
 import time
+import hashlib
 from datetime import datetime
-from flask import Flask, request, jsonify, send_file, send_from_directory
+from flask import Flask, Response, request, jsonify, send_file, send_from_directory
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
 import tempfile
@@ -25,11 +26,12 @@ from translate_arxiv import (
     translate_dir,
     download_source_with_cache,
     zipdir,
-    fallback_compile,
-    loop_files
+    fallback_compilation
 )
-from translate import translate_single_tex_file
 from config import config
+from utils import __version__
+import jobqueue
+import artifacts
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
@@ -37,23 +39,45 @@ CORS(app)  # Enable CORS for all routes
 # Configuration
 UPLOAD_FOLDER = 'uploads'
 OUTPUT_FOLDER = 'api_output'
+WORK_FOLDER = 'api_work'  # working directories of the jobs, kept until they are done so that they can resume
+JOBS_DATABASE = 'api_jobs.db'
+API_WORKERS = 2  # worker processes translating at the same time
+MAX_QUEUED_JOBS = 20  # jobs waiting for a worker, beyond which requests are answered with 429
+MIN_PRIORITY, MAX_PRIORITY = 0, 10  # priorities of the requests are clamped to this range
+ARTIFACT_FOLDER = 'api_cache'  # outputs of completed tasks, reused by identical requests
+ARTIFACT_TTL = 7 * 24 * 3600
+ARTIFACT_MAX_BYTES = 2 * 1024 ** 3
+PROGRESS_INTERVAL = 1  # seconds between two writes of the paragraphs translated by a task
+EVENTS_POLL_INTERVAL = 0.5  # seconds between two reads of a task followed by /api/events
+EVENTS_KEEPALIVE = 15  # seconds after which an event stream without news gets a comment, so that proxies keep it open
+LONG_POLL_TIMEOUT = 30
 ALLOWED_EXTENSIONS = {'tex', 'pdf', 'zip', 'tar', 'gz', 'bz2', 'xz'}
 MAX_CONTENT_LENGTH = 100 * 1024 * 1024  # 100MB max file size
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['OUTPUT_FOLDER'] = OUTPUT_FOLDER
+app.config['WORK_FOLDER'] = WORK_FOLDER
+app.config['JOBS_DATABASE'] = JOBS_DATABASE
+app.config['API_WORKERS'] = API_WORKERS
+app.config['MAX_QUEUED_JOBS'] = MAX_QUEUED_JOBS
+app.config['ARTIFACT_FOLDER'] = ARTIFACT_FOLDER
+app.config['ARTIFACT_TTL'] = ARTIFACT_TTL
+app.config['ARTIFACT_MAX_BYTES'] = ARTIFACT_MAX_BYTES
 app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
 
 # Ensure directories exist
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(OUTPUT_FOLDER, exist_ok=True)
+os.makedirs(WORK_FOLDER, exist_ok=True)
 
-# Task management
-tasks = {}
-task_lock = threading.Lock()
+# Task management, the tasks are the jobs of a queue persisted in SQLite and run by a pool of worker processes
+jobs = jobqueue.JobQueue(app.config['JOBS_DATABASE'], app.config['MAX_QUEUED_JOBS'])
+worker_pool = None
+artifact_cache = artifacts.ArtifactCache(app.config['ARTIFACT_FOLDER'], app.config['ARTIFACT_TTL'], app.config['ARTIFACT_MAX_BYTES'])
 
 class TaskStatus:
     PENDING = 'pending'
+    QUEUED = 'queued'
     PROCESSING = 'processing'
     COMPLETED = 'completed'
     FAILED = 'failed'
@@ -70,16 +94,110 @@ def create_task_id():
 
 def update_task_status(task_id, status, message=None, progress=None, result=None):
     """Update task status"""
-    with task_lock:
-        if task_id in tasks:
-            tasks[task_id]['status'] = status
-            tasks[task_id]['updated_at'] = datetime.now().isoformat()
-            if message:
-                tasks[task_id]['message'] = message
-            if progress is not None:
-                tasks[task_id]['progress'] = progress
-            if result:
-                tasks[task_id]['result'] = result
+    fields = {'status': status}
+    if message:
+        fields['message'] = message
+    if progress is not None:
+        fields['progress'] = progress
+    if result:
+        fields['result'] = result
+    jobs.update(task_id, **fields)
+
+# how far the translation of the current tex file is
+progress_fields = ('paragraphs_done', 'paragraphs', 'eta')
+
+def public_task(job):
+    """Task as shown to clients, without the paths and the bookkeeping of the queue"""
+    if job['status'] == jobqueue.following:
+        # a task waiting for an identical one shows how far that one is
+        followed = jobs.get(job['follows'])
+        if followed is None:
+            job.update(status=TaskStatus.FAILED, message='The identical task it was waiting for was deleted')
+        else:
+            job.update({name: followed[name] for name in ('status', 'stage', 'message', 'progress') + progress_fields})
+            job['updated_at'] = max(job['updated_at'], followed['updated_at'])
+    for name in ('input_path', 'worker', 'main_tex_files', 'queued_at', 'started_at', 'content_key', 'cache_key'):
+        job.pop(name, None)
+    return job
+
+def file_hash(path):
+    """SHA-256 of a file, read by blocks"""
+    hash_object = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            hash_object.update(block)
+    return hash_object.hexdigest()
+
+def content_key(options, source):
+    """Key of what a task produces: its source (arXiv ID or hash of the upload), its options and the version of the tool"""
+    model = config.openai_model if 'openai' in options.engine else None
+    key = (source, options.engine, model, options.language_from, options.language_to, options.compile, options.notranslate, __version__)
+    return hashlib.sha256(json.dumps(key).encode()).hexdigest()
+
+def retarget_files(result, old, new):
+    """Result whose output files are named after the id new instead of old: the paths start with the id of the task,
+    and so does the name of the zip, which is its path. Nothing else of the result is changed"""
+    files = []
+    for file in result['files']:
+        file = dict(file)
+        if file['filename'] == file['path']:
+            file['filename'] = new + file['filename'][len(old):]
+        file['path'] = new + file['path'][len(old):]
+        files.append(file)
+    return dict(result, files=files)
+
+def result_template(result, task_id):
+    """Result stored in the artifact cache, with '{task_id}' in place of the id of the task that produced it"""
+    return retarget_files(result, task_id, '{task_id}')
+
+def task_result(template, task_id):
+    """Result of task_id from a result stored in the artifact cache"""
+    return retarget_files(template, '{task_id}', task_id)
+
+def cached_result(task_id, key, **fields):
+    """Complete the task from the artifact cache, returns whether it was there"""
+    template = artifact_cache.get(key)
+    if template is None:
+        return False
+    jobs.save(task_id, TaskStatus.COMPLETED, message='Translation completed successfully!', progress=100,
+              result=task_result(template, task_id), content_key=key, cache_key=key, **fields)
+    return True
+
+def finish_followers(task_id, status, message, template=None, key=None):
+    """Give the outcome of a task to the identical tasks that were waiting for it"""
+    for follower in jobs.followers(task_id):
+        result = task_result(template, follower['id']) if template is not None else None
+        jobs.update(follower['id'], status=status, message=message, progress=100 if template is not None else follower['progress'],
+                    result=result, follows=None, cache_key=key)
+
+def request_priority(data):
+    """Priority asked by a request, clamped to MIN_PRIORITY..MAX_PRIORITY, or None if it is not an integer"""
+    priority = data.get('priority', 0)
+    if isinstance(priority, bool):
+        return None
+    try:
+        priority = int(priority)
+    except (TypeError, ValueError):
+        return None
+    return max(MIN_PRIORITY, min(MAX_PRIORITY, priority))
+
+def queue_full():
+    """429 answer telling the client when the queue is likely to admit its job"""
+    retry_after = jobs.retry_after(worker_pool.workers if worker_pool else app.config['API_WORKERS'])
+    response = jsonify({'error': 'Too many translations are waiting, please retry later', 'retry_after': retry_after})
+    response.headers['Retry-After'] = str(retry_after)
+    return response, 429
+
+def start_workers(workers=None, debug=False):
+    """Start the worker processes of the job queue, once per server process"""
+    global worker_pool
+    if debug and os.environ.get('WERKZEUG_RUN_MAIN') != 'true':
+        # the process of the reloader does not serve requests
+        return None
+    if worker_pool is None:
+        worker_pool = jobqueue.WorkerPool(jobs, run_job, workers or app.config['API_WORKERS'])
+        worker_pool.start()
+    return worker_pool
 
 class TranslationOptions:
     """Translation options class"""
@@ -90,15 +208,54 @@ class TranslationOptions:
         self.compile = kwargs.get('compile', True)
         self.nocache = kwargs.get('nocache', False)
         self.notranslate = kwargs.get('notranslate', False)
+        self.threads = kwargs.get('threads', 1)
+        self.batch = kwargs.get('batch', False)
+        self.asynchronous = kwargs.get('asynchronous', False)
+        self.metrics = kwargs.get('metrics', False)
+        self.debug = False
+
+    # names of the languages in the options of translate_arxiv.translate_dir
+    @property
+    def l_from(self):
+        return self.language_from
+
+    @property
+    def l_to(self):
+        return self.language_to
+
+def run_job(job):
+    """Run a job of the queue in a worker process, resuming after its last completed stage"""
+    task_id = job['id']
+    options = TranslationOptions(**job['options'])
+    work_dir = os.path.join(app.config['WORK_FOLDER'], task_id)
+    working_dir = os.path.join(work_dir, f"task_{task_id}")
+    os.makedirs(work_dir, exist_ok=True)
+    stage = job['stage']
+    input_path = job['input_path']
+
+    def cancelled():
+        # the task was deleted while it was running
+        if jobs.get(task_id) is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+            return True
+        return False
 
-def process_translation_task(task_id, input_path, options):
-    """Process translation task in background thread"""
     try:
-        update_task_status(task_id, TaskStatus.PROCESSING, "Starting translation...", 0)
+        update_task_status(task_id, TaskStatus.PROCESSING, "Starting translation..." if stage is None else f"Resuming after stage {stage}...")
 
-        # Create temporary working directory
-        with tempfile.TemporaryDirectory() as temp_dir:
-            working_dir = os.path.join(temp_dir, f"task_{task_id}")
+        if job['arxiv_id'] and stage is None:
+            update_task_status(task_id, TaskStatus.PROCESSING, "Downloading from ArXiv...", 5)
+            input_path = os.path.join(work_dir, f"{job['arxiv_id'].replace('/', '-')}.tar.gz")
+            download_source_with_cache(job['arxiv_id'], input_path)
+            stage = 'downloaded'
+            jobs.update(task_id, stage=stage, input_path=input_path)
+
+        if stage in (None, 'downloaded'):
+            if cancelled():
+                return
+            # extracted again when resuming, an interrupted translation has overwritten some of the files,
+            # the paragraphs it had translated are found in the translation memory
+            shutil.rmtree(working_dir, ignore_errors=True)
             os.makedirs(working_dir)
 
             # Extract archive if needed
@@ -112,95 +269,123 @@ def process_translation_task(task_id, input_path, options):
                 filename = os.path.basename(input_path)
                 shutil.copy2(input_path, os.path.join(working_dir, filename))
 
-            # Find main LaTeX files and translate
-            update_task_status(task_id, TaskStatus.PROCESSING, "Analyzing LaTeX structure...", 20)
+            # Translate directory, every path is under working_dir so that tasks can run side by side
+            update_task_status(task_id, TaskStatus.PROCESSING, "Translating documents...", 30)
+
+            # the paragraphs translated are written at most every PROGRESS_INTERVAL seconds, the ETA comes from their rate
+            times = {'started': 0, 'written': 0}
+
+            def progress(i, total, basename, paragraphs_done=None, paragraphs=None):
+                message = f"Translating {os.path.basename(basename)}.tex..."
+                if paragraphs_done is None:
+                    update_task_status(task_id, TaskStatus.PROCESSING, message, 30 + (50 * i / total))
+                    jobs.update(task_id, paragraphs_done=None, paragraphs=None, eta=None)
+                    return
+                now = time.monotonic()
+                if paragraphs_done == 0:
+                    times['started'] = now
+                elif paragraphs_done < paragraphs and now - times['written'] < PROGRESS_INTERVAL:
+                    return
+                times['written'] = now
+                eta = (paragraphs - paragraphs_done) * (now - times['started']) / paragraphs_done if paragraphs_done else None
+                jobs.update(
+                    task_id,
+                    message=f"{message} {paragraphs_done}/{paragraphs} paragraphs",
+                    progress=30 + (50 * (i + paragraphs_done / max(1, paragraphs)) / total),
+                    paragraphs_done=paragraphs_done,
+                    paragraphs=paragraphs,
+                    eta=eta
+                )
+
+            complete_texs = translate_dir(working_dir, options, progress)
+
+            if not complete_texs:
+                raise Exception("No complete LaTeX files found")
+            stage = 'translated'
+            jobs.update(task_id, stage=stage, main_tex_files=[os.path.relpath(tex, working_dir) for tex in complete_texs])
+
+        complete_texs = [os.path.join(working_dir, tex) for tex in jobs.get(task_id)['main_tex_files']]
+
+        if stage == 'translated':
+            if cancelled():
+                return
+            # Compile if requested
+            output_files = []
+            if options.compile and complete_texs:
+                update_task_status(task_id, TaskStatus.PROCESSING, "Compiling LaTeX...", 80)
+
+                main_tex = complete_texs[0]  # Use first complete tex as main
+                try:
+                    # the PDF is copied to the output folder as <task_id>_<main tex>.pdf
+                    pdf_name = f"{task_id}_{os.path.basename(main_tex)}"
+                    if fallback_compilation(os.path.dirname(main_tex), f"{os.path.basename(main_tex)}.tex", pdf_name, app.config['OUTPUT_FOLDER']):
+                        output_files.append({
+                            'type': 'pdf',
+                            'filename': f"{os.path.basename(main_tex)}.pdf",
+                            'path': f"{pdf_name}.pdf"
+                        })
+                except Exception as e:
+                    print(f"Compilation failed: {e}")
+            stage = 'compiled'
+            jobs.update(task_id, stage=stage, result={'files': output_files})
+
+        if cancelled():
+            return
+        output_files = jobs.get(task_id)['result']['files']
+
+        # Create output zip
+        update_task_status(task_id, TaskStatus.PROCESSING, "Creating output package...", 90)
+        output_zip = os.path.join(app.config['OUTPUT_FOLDER'], f"{task_id}.zip")
+        zipdir(working_dir, output_zip)
+
+        output_files.append({
+            'type': 'zip',
+            'filename': f"{task_id}.zip",
+            'path': f"{task_id}.zip"
+        })
 
-            # Change to working directory
-            original_cwd = os.getcwd()
-            os.chdir(working_dir)
+        result = {
+            'files': output_files,
+            'translated_files': [os.path.relpath(tex, working_dir) for tex in complete_texs]
+        }
 
+        # the outputs go to the artifact cache, named after what follows the id of the task in their paths
+        key = job['content_key']
+        template = None
+        if key:
+            files = {f"translated{file['path'][len(task_id):]}": os.path.join(app.config['OUTPUT_FOLDER'], file['path']) for file in output_files}
+            template = result_template(result, task_id)
             try:
-                # Translate directory
-                update_task_status(task_id, TaskStatus.PROCESSING, "Translating documents...", 30)
-                complete_texs = translate_dir(working_dir, options)
-
-                if not complete_texs:
-                    raise Exception("No complete LaTeX files found")
-
-                # Perform translation
-                for i, basename in enumerate(complete_texs):
-                    update_task_status(
-                        task_id,
-                        TaskStatus.PROCESSING,
-                        f"Translating {basename}.tex...",
-                        30 + (50 * (i + 1) / len(complete_texs))
-                    )
-
-                    translate_single_tex_file(
-                        f"{basename}.tex",
-                        f"{basename}.tex",
-                        options.engine,
-                        options.language_to,
-                        options.language_from,
-                        debug=False,
-                        nocache=options.nocache,
-                        threads=1
-                    )
-
-                # Compile if requested
-                output_files = []
-                if options.compile and complete_texs:
-                    update_task_status(task_id, TaskStatus.PROCESSING, "Compiling LaTeX...", 80)
-
-                    main_tex = complete_texs[0]  # Use first complete tex as main
-                    try:
-                        fallback_compile(f"{main_tex}.tex", working_dir)
-
-                        # Find generated PDF
-                        pdf_files = [f for f in loop_files(working_dir) if f.endswith('.pdf')]
-                        for pdf_file in pdf_files:
-                            output_filename = os.path.basename(pdf_file)
-                            output_path = os.path.join(app.config['OUTPUT_FOLDER'], f"{task_id}_{output_filename}")
-                            shutil.copy2(pdf_file, output_path)
-                            output_files.append({
-                                'type': 'pdf',
-                                'filename': output_filename,
-                                'path': f"{task_id}_{output_filename}"
-                            })
-                    except Exception as e:
-                        print(f"Compilation failed: {e}")
-
-                # Create output zip
-                update_task_status(task_id, TaskStatus.PROCESSING, "Creating output package...", 90)
-                output_zip = os.path.join(app.config['OUTPUT_FOLDER'], f"{task_id}.zip")
-                zipdir(working_dir, output_zip)
-
-                output_files.append({
-                    'type': 'zip',
-                    'filename': f"{task_id}.zip",
-                    'path': f"{task_id}.zip"
-                })
-
-                # Task completed
-                update_task_status(task_id, TaskStatus.COMPLETED, "Translation completed successfully!", 100, {
-                    'files': output_files,
-                    'translated_files': complete_texs
-                })
-
-            finally:
-                os.chdir(original_cwd)
+                artifact_cache.put(key, files, template)
+            except OSError as e:
+                # the task has its own files, only the identical tasks waiting for it need the cache
+                print(f"Warning: the outputs of task {task_id} could not be cached: {e}")
+                template = None
+
+        # Task completed
+        jobs.finish(task_id, TaskStatus.COMPLETED, message="Translation completed successfully!", progress=100, result=result)
+        if template is not None:
+            finish_followers(task_id, TaskStatus.COMPLETED, "Translation completed successfully!", template, key)
+        else:
+            # without the cache, the identical tasks run themselves: the oldest one is queued and the others follow it
+            jobs.promote(task_id)
 
     except Exception as e:
-        update_task_status(task_id, TaskStatus.FAILED, f"Translation failed: {str(e)}")
+        jobs.finish(task_id, TaskStatus.FAILED, message=f"Translation failed: {str(e)}")
+        finish_followers(task_id, TaskStatus.FAILED, f"Translation failed: {str(e)}")
         print(f"Task {task_id} failed: {e}")
 
+    shutil.rmtree(work_dir, ignore_errors=True)
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
     return jsonify({
         'status': 'healthy',
         'timestamp': datetime.now().isoformat(),
-        'version': '1.0.0'
+        'version': '1.0.0',
+        'queue': worker_pool.stats() if worker_pool else None,
+        'artifacts': artifact_cache.stats()
     })
 
 @app.route('/api/engines', methods=['GET'])
@@ -249,18 +434,13 @@ def upload_file():
     file.save(upload_path)
 
     # Create task record
-    with task_lock:
-        tasks[task_id] = {
-            'id': task_id,
-            'status': TaskStatus.PENDING,
-            'message': 'File uploaded, waiting to start translation...',
-            'progress': 0,
-            'created_at': datetime.now().isoformat(),
-            'updated_at': datetime.now().isoformat(),
-            'input_filename': filename,
-            'input_path': upload_path,
-            'result': None
-        }
+    jobs.create(
+        task_id,
+        TaskStatus.PENDING,
+        message='File uploaded, waiting to start translation...',
+        input_filename=filename,
+        input_path=upload_path
+    )
 
     return jsonify({
         'task_id': task_id,
@@ -276,137 +456,213 @@ def translate_arxiv(arxiv_id):
 
     # Get options from request
     data = request.get_json() or {}
+    priority = request_priority(data)
+    if priority is None:
+        return jsonify({'error': 'priority must be an integer'}), 400
     options = TranslationOptions(**data)
+    key = content_key(options, f'arxiv:{arxiv_id}')
 
-    # Create task record
-    with task_lock:
-        tasks[task_id] = {
-            'id': task_id,
-            'status': TaskStatus.PENDING,
-            'message': 'ArXiv translation task created, waiting to start...',
-            'progress': 0,
-            'created_at': datetime.now().isoformat(),
-            'updated_at': datetime.now().isoformat(),
+    # An identical request is answered from the cache or waits for the task already running it
+    if not options.nocache and cached_result(task_id, key, arxiv_id=arxiv_id, options=vars(options)):
+        return jsonify({
+            'task_id': task_id,
+            'message': f'ArXiv translation task created for {arxiv_id}',
             'arxiv_id': arxiv_id,
-            'options': vars(options),
-            'result': None
-        }
-
-    # Start background task
-    def arxiv_task():
-        try:
-            update_task_status(task_id, TaskStatus.PROCESSING, "Downloading from ArXiv...", 5)
-
-            # Download arxiv paper
-            with tempfile.TemporaryDirectory() as temp_dir:
-                download_path = os.path.join(temp_dir, f"{arxiv_id}.tar.gz")
-                download_source_with_cache(arxiv_id, download_path)
-
-                # Process as local archive
-                process_translation_task(task_id, download_path, options)
-
-        except Exception as e:
-            update_task_status(task_id, TaskStatus.FAILED, f"ArXiv download failed: {str(e)}")
+            'cached': True
+        })
 
-    thread = threading.Thread(target=arxiv_task)
-    thread.daemon = True
-    thread.start()
+    # Queue the task, a worker downloads the paper when its turn comes
+    status = jobs.submit_or_follow(
+        task_id,
+        key,
+        priority,
+        coalesce=not options.nocache,
+        message='ArXiv translation task created, waiting for a worker...',
+        arxiv_id=arxiv_id,
+        options=vars(options)
+    )
+    if status is None:
+        return queue_full()
 
-    return jsonify({
+    response = {
         'task_id': task_id,
         'message': f'ArXiv translation task created for {arxiv_id}',
         'arxiv_id': arxiv_id
-    })
+    }
+    if status == jobqueue.following:
+        response['coalesced'] = True
+    return jsonify(response)
 
 @app.route('/api/translate/<task_id>', methods=['POST'])
 def start_translation(task_id):
     """Start translation task for uploaded file"""
-    with task_lock:
-        if task_id not in tasks:
-            return jsonify({'error': 'Task not found'}), 404
+    task = jobs.get(task_id)
+    if task is None:
+        return jsonify({'error': 'Task not found'}), 404
 
-        task = tasks[task_id]
-        if task['status'] != TaskStatus.PENDING:
-            return jsonify({'error': 'Task already processed or in progress'}), 400
+    if task['status'] != TaskStatus.PENDING:
+        return jsonify({'error': 'Task already processed or in progress'}), 400
 
     # Get options from request
     data = request.get_json() or {}
+    priority = request_priority(data)
+    if priority is None:
+        return jsonify({'error': 'priority must be an integer'}), 400
     options = TranslationOptions(**data)
+    key = content_key(options, f"upload:{file_hash(task['input_path'])}")
 
-    # Update task with options
-    task['options'] = vars(options)
+    # An identical upload is answered from the cache or waits for the task already running it
+    if not options.nocache and cached_result(task_id, key, options=vars(options)):
+        return jsonify({
+            'task_id': task_id,
+            'message': 'Translation completed from the cache',
+            'options': vars(options),
+            'cached': True
+        })
 
-    # Start background translation task
-    thread = threading.Thread(
-        target=process_translation_task,
-        args=(task_id, task['input_path'], options)
-    )
-    thread.daemon = True
-    thread.start()
+    # Queue the task with its options, a worker starts it when its turn comes
+    status = jobs.submit_or_follow(task_id, key, priority, coalesce=not options.nocache, options=vars(options), message='Waiting for a worker...')
+    if status is None:
+        return queue_full()
 
+    if status == jobqueue.following:
+        return jsonify({
+            'task_id': task_id,
+            'message': 'Waiting for an identical task',
+            'options': vars(options),
+            'coalesced': True
+        })
     return jsonify({
         'task_id': task_id,
-        'message': 'Translation started',
+        'message': 'Translation queued',
         'options': vars(options)
     })
 
 @app.route('/api/status/<task_id>', methods=['GET'])
 def get_task_status(task_id):
     """Get task status"""
-    with task_lock:
-        if task_id not in tasks:
-            return jsonify({'error': 'Task not found'}), 404
-
-        task = tasks[task_id].copy()
-        # Remove sensitive information
-        task.pop('input_path', None)
-
-        return jsonify(task)
+    task = jobs.get(task_id)
+    if task is None:
+        return jsonify({'error': 'Task not found'}), 404
+
+    # Remove sensitive information
+    return jsonify(public_task(task))
+
+def task_event(job, previous):
+    """Server-sent event of a task that changed: stage when its status or stage did, progress otherwise"""
+    name = 'progress'
+    if previous is None or (job['status'], job['stage']) != (previous['status'], previous['stage']):
+        name = 'stage'
+    return f"id: {job['updated_at']}\nevent: {name}\ndata: {json.dumps(job)}\n\n"
+
+@app.route('/api/events/<task_id>', methods=['GET'])
+def task_events(task_id):
+    """Follow the progress of a task, as server-sent events or by long polling"""
+    task = jobs.get(task_id)
+    if task is None:
+        return jsonify({'error': 'Task not found'}), 404
+
+    # Workers are other processes, the task is read from the database until it changes
+    if 'text/event-stream' not in request.headers.get('Accept', ''):
+        # Long polling: answers once the task is no longer at the given updated_at, or after timeout seconds
+        since = request.args.get('since')
+        try:
+            timeout = float(request.args.get('timeout', LONG_POLL_TIMEOUT))
+        except ValueError:
+            timeout = math.nan
+        if math.isnan(timeout):
+            return jsonify({'error': 'timeout must be a number of seconds'}), 400
+        timeout = max(0, min(timeout, LONG_POLL_TIMEOUT))
+        deadline = time.monotonic() + timeout
+        while True:
+            task = jobs.get(task_id)
+            if task is None:
+                return jsonify({'error': 'Task not found'}), 404
+            task = public_task(task)
+            if since is None or task['updated_at'] != since or task['status'] in jobqueue.finished or time.monotonic() >= deadline:
+                return jsonify(task)
+            time.sleep(EVENTS_POLL_INTERVAL)
+
+    # the id of an event is the updated_at of the task: a client reconnecting with it, or with since, is not sent that state again
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('since')
+
+    def events():
+        previous = None
+        sent = time.monotonic()
+        while True:
+            task = jobs.get(task_id)
+            if task is None:
+                yield 'event: deleted\ndata: {}\n\n'
+                return
+            task = public_task(task)
+            if task != previous:
+                if previous is not None or task['updated_at'] != last_event_id:
+                    yield task_event(task, previous)
+                previous = task
+                sent = time.monotonic()
+                if task['status'] in jobqueue.finished:
+                    yield 'event: end\ndata: {}\n\n'
+                    return
+            elif time.monotonic() - sent >= EVENTS_KEEPALIVE:
+                yield ': keepalive\n\n'
+                sent = time.monotonic()
+            time.sleep(EVENTS_POLL_INTERVAL)
+
+    return Response(events(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @app.route('/api/download/<task_id>/<filename>', methods=['GET'])
 def download_file(task_id, filename):
     """Download translated file"""
+    # Check if file belongs to task (basic security)
+    if not filename.startswith(f"{task_id}_") and filename != f"{task_id}.zip":
+        return jsonify({'error': 'Access denied'}), 403
+
     file_path = os.path.join(app.config['OUTPUT_FOLDER'], filename)
 
+    # Tasks answered from the cache, or by an identical task, have their files in the artifact cache
     if not os.path.exists(file_path):
-        return jsonify({'error': 'File not found'}), 404
+        task = jobs.get(task_id)
+        if task is not None and task['cache_key']:
+            file_path = artifact_cache.path(task['cache_key'], f"translated{filename[len(task_id):]}")
+            # the entry may have been evicted since, the task has to be submitted again
+            if not os.path.exists(file_path) and task['status'] == TaskStatus.COMPLETED:
+                return jsonify({'error': 'The files of this task were removed from the result cache, please submit it again'}), 410
 
-    # Check if file belongs to task (basic security)
-    if not filename.startswith(f"{task_id}_") and filename != f"{task_id}.zip":
-        return jsonify({'error': 'Access denied'}), 403
+    if not os.path.exists(file_path):
+        return jsonify({'error': 'File not found'}), 404
 
-    return send_file(file_path, as_attachment=True)
+    return send_file(os.path.abspath(file_path), as_attachment=True)
 
 @app.route('/api/tasks', methods=['GET'])
 def list_tasks():
     """List all tasks"""
-    with task_lock:
-        task_list = []
-        for task_id, task in tasks.items():
-            task_copy = task.copy()
-            task_copy.pop('input_path', None)
-            task_list.append(task_copy)
-
-        # Sort by creation time (newest first)
-        task_list.sort(key=lambda x: x['created_at'], reverse=True)
+    # Sorted by creation time (newest first)
+    task_list = [public_task(task) for task in jobs.list()]
 
-        return jsonify({
-            'tasks': task_list,
-            'total': len(task_list)
-        })
+    return jsonify({
+        'tasks': task_list,
+        'total': len(task_list)
+    })
 
 @app.route('/api/tasks/<task_id>', methods=['DELETE'])
 def delete_task(task_id):
     """Delete task and associated files"""
-    with task_lock:
-        if task_id not in tasks:
-            return jsonify({'error': 'Task not found'}), 404
+    # Delete task, a worker running it stops at its next stage and removes its working directory
+    task = jobs.get(task_id)
+    if task is None:
+        return jsonify({'error': 'Task not found'}), 404
 
-        # Delete task
-        del tasks[task_id]
+    # The identical tasks waiting for it do not lose their turn, the oldest one is queued in its place
+    if task['status'] in jobqueue.active:
+        jobs.promote(task_id)
+    if not jobs.delete(task_id):
+        return jsonify({'error': 'Task not found'}), 404
 
     # Delete associated files
     try:
+        if task['status'] != TaskStatus.PROCESSING:
+            shutil.rmtree(os.path.join(app.config['WORK_FOLDER'], task_id), ignore_errors=True)
+
         # Delete uploaded file
         for filename in os.listdir(app.config['UPLOAD_FOLDER']):
             if filename.startswith(f"{task_id}_"):
@@ -414,7 +670,7 @@ def delete_task(task_id):
 
         # Delete output files
         for filename in os.listdir(app.config['OUTPUT_FOLDER']):
-            if filename.startswith(f"{task_id}_"):
+            if filename.startswith(f"{task_id}_") or filename == f"{task_id}.zip":
                 os.remove(os.path.join(app.config['OUTPUT_FOLDER'], filename))
 
     except Exception as e:
@@ -447,4 +703,5 @@ if __name__ == '__main__':
     print("  GET  /api/tasks - List all tasks")
     print("  DELETE /api/tasks/<task_id> - Delete task")
 
+    start_workers(debug=True)
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
@@ -0,0 +1,105 @@
+'''
+Cache of the outputs of the API server, keyed by the content of the jobs.
+
+An entry is a directory holding the files of a completed job (zip, PDF) and its result.
+Entries expire ttl seconds after they were last used; beyond max_bytes the least recently used ones are removed.
+Tasks completed from an entry serve their files from it, so they lose them when it is removed: the server answers 410
+for these files and the task has to be submitted again.
+'''
+import os
+import json
+import time
+import shutil
+import threading
+
+result_name = 'result.json'
+
+
+class ArtifactCache:
+    def __init__(self, directory, ttl=7 * 24 * 3600, max_bytes=2 * 1024 ** 3):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def entry(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key):
+        # the result stored with the files of key, or None when they are not cached or have expired
+        entry = self.entry(key)
+        result_path = os.path.join(entry, result_name)
+        found = os.path.exists(result_path) and time.time() - os.path.getmtime(entry) < self.ttl
+        with self.lock:
+            if found:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if not found:
+            return None
+        try:
+            # the modification time of the entry is its last use
+            os.utime(entry)
+            with open(result_path, encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            # evicted by another worker in the meantime
+            return None
+
+    def path(self, key, name):
+        return os.path.join(self.entry(key), name)
+
+    def put(self, key, files, result):
+        # files: {name in the entry: path of the file}, written to another directory first so that readers never see half an entry
+        entry = self.entry(key)
+        temp_entry = f'{entry}.{os.getpid()}.{threading.get_ident()}.tmp'
+        shutil.rmtree(temp_entry, ignore_errors=True)
+        os.makedirs(temp_entry)
+        for name, path in files.items():
+            shutil.copy2(path, os.path.join(temp_entry, name))
+        with open(os.path.join(temp_entry, result_name), 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False)
+        shutil.rmtree(entry, ignore_errors=True)
+        try:
+            os.rename(temp_entry, entry)
+        except OSError:
+            # another worker stored the same key meanwhile
+            shutil.rmtree(temp_entry, ignore_errors=True)
+        self.evict()
+
+    def entries(self):
+        # [(last use, size, path)] of the complete entries, every worker evicts without a lock so entries may vanish while they are listed
+        result = []
+        for name in os.listdir(self.directory):
+            entry = os.path.join(self.directory, name)
+            if name.endswith('.tmp'):
+                continue
+            try:
+                size = sum(os.path.getsize(os.path.join(entry, file)) for file in os.listdir(entry))
+                result.append((os.path.getmtime(entry), size, entry))
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+        return result
+
+    def evict(self):
+        entries = sorted(self.entries())
+        total = sum(size for last_use, size, entry in entries)
+        now = time.time()
+        for last_use, size, entry in entries:
+            if now - last_use < self.ttl and total <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+
+    def stats(self):
+        entries = self.entries()
+        return {
+            'entries': len(entries),
+            'bytes': sum(size for last_use, size, entry in entries),
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
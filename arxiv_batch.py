@@ -0,0 +1,258 @@
+'''
+Batch translation of a list of arXiv papers, for translate_arxiv --file.
+
+Every paper goes through three stages, download, translate and compile, and every stage has its own pool of workers:
+papers flow from one pool to the next, so that a paper is compiled while the next ones are translated and the ones after them downloaded.
+The state of every paper is kept in a JSON manifest. A batch that is run again skips the papers that are done
+and resumes the others at the stage they stopped at. A paper that fails is recorded as failed and does not hold back the others.
+
+Every paper is translated in a process of its own, which writes its output to the translate.log of the paper.
+'''
+import os
+import sys
+import json
+import time
+import shutil
+import zipfile
+import datetime
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import translate_arxiv
+
+pending = 'pending'
+downloaded = 'downloaded'
+translated = 'translated'
+compiled = 'compiled'
+failed = 'failed'
+
+stages = ('download', 'translate', 'compile')
+# the state of a paper once a stage is done
+stage_states = {'download': downloaded, 'translate': translated, 'compile': compiled}
+# the stage a paper resumes at from its state
+resume_stages = {pending: 'download', downloaded: 'translate', translated: 'compile'}
+
+# options of the batch that are not passed on to the translation of every paper, with whether they take a value
+batch_arguments = {
+    '-f': True, '--file': True, '--manifest': True, '-o': True,
+    '--download-workers': True, '--translate-workers': True, '--compile-workers': True,
+    '--compile': False, '--no-compile': False,
+}
+
+
+def paper_arguments(args, number=None):
+    # the command line of the batch without the options of the batch, nor its arxiv number if it was given one
+    result = []
+    skip_value = False
+    for arg in args:
+        if skip_value:
+            skip_value = False
+            continue
+        name = arg.split('=', 1)[0]
+        if name in batch_arguments:
+            skip_value = batch_arguments[name] and '=' not in arg
+            continue
+        if number is not None and arg == number:
+            number = None
+            continue
+        result.append(arg)
+    return result
+
+
+class Manifest:
+    def __init__(self, path, numbers):
+        self.path = path
+        self.lock = threading.Lock()
+        self.papers = {}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self.papers = json.load(f)
+        for number in numbers:
+            self.papers.setdefault(number, {'state': pending, 'attempts': 0, 'durations': {}})
+        with self.lock:
+            self.save()
+
+    def get(self, number):
+        with self.lock:
+            return dict(self.papers[number])
+
+    def update(self, number, **fields):
+        with self.lock:
+            fields['updated_at'] = datetime.datetime.now().isoformat(timespec='seconds')
+            self.papers[number].update(fields)
+            self.save()
+
+    def save(self):
+        # written to another file first, an interrupted batch leaves the previous manifest rather than half of it
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.papers, f, indent=2, ensure_ascii=False)
+        os.replace(temp_path, self.path)
+
+
+class BatchRun:
+    def __init__(self, numbers, options, args, manifest_path):
+        self.numbers = list(dict.fromkeys(numbers))
+        self.compile = options.compile and not options.no_compile
+        self.args = paper_arguments(args, options.number)
+        self.manifest = Manifest(manifest_path, self.numbers)
+        self.output_dir = os.path.join(os.getcwd(), 'output')
+        self.workers = {
+            'download': options.download_workers,
+            'translate': options.translate_workers,
+            'compile': options.compile_workers,
+        }
+        self.executors = {stage: ThreadPoolExecutor(max(1, workers), thread_name_prefix=stage) for stage, workers in self.workers.items()}
+        self.lock = threading.Lock()
+        self.finished = threading.Event()
+        self.remaining = 0
+        self.busy = {stage: 0.0 for stage in stages}
+        self.runs = {stage: 0 for stage in stages}
+        self.completed = {stage: 0 for stage in stages}
+        self.failed = []
+
+    def document_dir(self, number):
+        return os.path.join(self.output_dir, translate_arxiv.get_document_name(number))
+
+    def first_stage(self, paper):
+        # None when the paper is done
+        if paper['state'] == failed:
+            stage = paper['failed_stage']
+        else:
+            stage = resume_stages.get(paper['state'])
+        if stage == 'compile' and not self.compile:
+            return None
+        return stage
+
+    def next_stage(self, stage):
+        if stage == 'download':
+            return 'translate'
+        if stage == 'translate' and self.compile:
+            return 'compile'
+        return None
+
+    def download(self, number):
+        # fills the cache of the arxiv sources, the translation then takes the source from there without waiting for the network
+        if translate_arxiv.is_local_archive(number) or translate_arxiv.is_local_directory(number):
+            return
+        document_dir = self.document_dir(number)
+        os.makedirs(document_dir, exist_ok=True)
+        path = os.path.join(document_dir, 'source.download')
+        try:
+            translate_arxiv.download_source_with_cache(number, path)
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def translate(self, number):
+        document_dir = self.document_dir(number)
+        os.makedirs(document_dir, exist_ok=True)
+        log_path = os.path.join(document_dir, 'translate.log')
+        command = [sys.executable, os.path.abspath(translate_arxiv.__file__), number, '--no-compile', '--no-network-check'] + self.args
+        with open(log_path, 'w', encoding='utf-8') as log:
+            result = subprocess.run(command, stdout=log, stderr=subprocess.STDOUT, env=dict(os.environ, PYTHONIOENCODING='utf-8'))
+        if result.returncode != 0:
+            raise RuntimeError(f'translation failed with exit code {result.returncode}, see {log_path}')
+
+    def compile_paper(self, number):
+        document_name = translate_arxiv.get_document_name(number)
+        document_dir = self.document_dir(number)
+        zip_path = os.path.join(document_dir, f'{document_name}.zip')
+        temp_dir = os.path.join(document_dir, 'compile_temp')
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        try:
+            with zipfile.ZipFile(zip_path) as f:
+                f.extractall(temp_dir)
+                # translate_dir only leaves the main tex files in the project
+                main_tex_files = [os.path.splitext(name)[0] for name in f.namelist() if name.endswith('.tex')]
+            if not translate_arxiv.compile_document(temp_dir, document_dir, main_tex_files, document_name, self.output_dir):
+                raise RuntimeError('no PDF was produced')
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def run_stage(self, number, stage):
+        start = time.monotonic()
+        error = None
+        try:
+            if stage == 'compile':
+                self.compile_paper(number)
+            else:
+                getattr(self, stage)(number)
+        except Exception as e:
+            error = f'{type(e).__name__}: {e}'
+        duration = time.monotonic() - start
+        durations = dict(self.manifest.get(number)['durations'], **{stage: duration})
+        with self.lock:
+            self.busy[stage] += duration
+            self.runs[stage] += 1
+        if error is not None:
+            print(f'{number}: {stage} failed after {duration:.1f} s: {error}')
+            self.manifest.update(number, state=failed, failed_stage=stage, error=error, durations=durations)
+            with self.lock:
+                self.failed.append(number)
+            self.finish()
+            return
+        print(f'{number}: {stage} done in {duration:.1f} s')
+        self.manifest.update(number, state=stage_states[stage], failed_stage=None, error=None, durations=durations)
+        with self.lock:
+            self.completed[stage] += 1
+        next_stage = self.next_stage(stage)
+        if next_stage is None:
+            self.finish()
+        else:
+            self.executors[next_stage].submit(self.run_stage, number, next_stage)
+
+    def finish(self):
+        with self.lock:
+            self.remaining -= 1
+            if self.remaining == 0:
+                self.finished.set()
+
+    def run(self):
+        # returns the numbers of the papers that failed
+        start = time.monotonic()
+        todo = []
+        for number in self.numbers:
+            paper = self.manifest.get(number)
+            stage = self.first_stage(paper)
+            if stage is not None:
+                todo.append((number, stage))
+                self.manifest.update(number, attempts=paper['attempts'] + 1)
+        skipped = len(self.numbers) - len(todo)
+        print(f'{len(self.numbers)} papers, {skipped} already done according to {self.manifest.path}')
+        self.remaining = len(todo)
+        if not todo:
+            self.finished.set()
+        for number, stage in todo:
+            self.executors[stage].submit(self.run_stage, number, stage)
+        try:
+            # waits in steps so that the batch can be interrupted, the manifest then keeps where every paper is
+            while not self.finished.wait(1):
+                pass
+        except KeyboardInterrupt:
+            for executor in self.executors.values():
+                executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        for executor in self.executors.values():
+            executor.shutdown()
+        self.print_summary(time.monotonic() - start, len(todo), skipped)
+        return self.failed
+
+    def print_summary(self, wall_time, started, skipped):
+        done = started - len(self.failed)
+        print(f"\n{'='*60}")
+        print(f'Batch finished in {wall_time:.1f} s: {done} papers done, {len(self.failed)} failed, {skipped} skipped')
+        if wall_time > 0 and done:
+            print(f'Throughput: {done / wall_time * 3600:.1f} papers per hour')
+        for stage in stages:
+            if stage == 'compile' and not self.compile:
+                continue
+            workers = max(1, self.workers[stage])
+            utilization = self.busy[stage] / (wall_time * workers) if wall_time > 0 else 0
+            mean = self.busy[stage] / self.runs[stage] if self.runs[stage] else 0
+            print(f'{stage}: {self.completed[stage]} papers, {mean:.1f} s per paper, {workers} workers busy {utilization:.0%} of the time')
+        for number in self.failed:
+            paper = self.manifest.get(number)
+            print(f"Failed {number} at {paper['failed_stage']}: {paper['error']}")
+        print('='*60)
@@ -0,0 +1,83 @@
+'''
+Batching of translation requests across paragraphs.
+
+The paragraph workers submit their text parts and wait on a future,
+a dispatcher thread groups what is pending into batches limited in number of segments and characters,
+sends one request per batch and hands every caller its own result.
+'''
+import time
+import queue
+import threading
+import concurrent.futures
+
+
+class BatchTranslator:
+    def __init__(self, translate_batch, max_segments=20, max_chars=5000, max_wait=0.05):
+        # translate_batch(texts) returns the list of translations, in the same order
+        # max_chars: a text longer than that is still sent, alone, so callers send such texts another way
+        self.translate_batch = translate_batch
+        self.max_segments = max_segments
+        self.max_chars = max_chars
+        self.max_wait = max_wait  # how long to wait for more segments before sending a batch that is not full
+        self.queue = queue.Queue()
+        self.carried = None  # the segment that did not fit in the previous batch
+        self.number_of_batches = 0
+        self.number_of_segments = 0
+        self.thread = threading.Thread(target=self.dispatch, daemon=True)
+        self.thread.start()
+
+    def submit(self, text):
+        future = concurrent.futures.Future()
+        self.queue.put((text, future))
+        return future
+
+    def translate(self, text):
+        return self.submit(text).result()
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+
+    def next_batch(self):
+        if self.carried is not None:
+            item, self.carried = self.carried, None
+        else:
+            item = self.queue.get()
+            if item is None:
+                return None
+        batch = [item]
+        chars = len(item[0])
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_segments:
+            try:
+                item = self.queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                break
+            if item is None:
+                # finish what is pending first
+                self.queue.put(None)
+                break
+            if chars + len(item[0]) > self.max_chars:
+                self.carried = item
+                break
+            batch.append(item)
+            chars += len(item[0])
+        return batch
+
+    def dispatch(self):
+        while True:
+            batch = self.next_batch()
+            if batch is None:
+                return
+            texts = [text for text, future in batch]
+            try:
+                results = self.translate_batch(texts)
+                assert len(results) == len(texts), f'{len(texts)} texts are sent but {len(results)} translations are returned'
+            except BaseException as e:
+                for text, future in batch:
+                    future.set_exception(e)
+                continue
+            self.number_of_batches += 1
+            self.number_of_segments += len(texts)
+            for (text, future), result in zip(batch, results):
+                future.set_result(result)
@@ -3,12 +3,21 @@ app_paths = appdata.AppDataPaths('mathtranslate')
 app_dir = app_paths.app_data_path
 import os
 import time
-import hashlib
 import shutil
-cache_dir = os.path.join(app_dir, 'cache')
-os.makedirs(cache_dir, exist_ok=True)
-time_filename = 'update_time'
-max_cache = 5
+import hashlib
+import sqlite3
+import threading
+os.makedirs(app_dir, exist_ok=True)
+memory_path = os.path.join(app_dir, 'translation_memory.db')
+max_entries = 200000
+# the last use of an entry is written again only once it is older than this, so that lookups rarely write
+touch_interval = 3600
+# files of the cache before the translation memory, one directory per document
+old_cache_dir = os.path.join(app_dir, 'cache')
+# the keys include the version of the package, so every release starts with translations of its own.
+# Bump schema_version when the masking, the placeholders or the stored format change without a new version,
+# e.g. on a development branch, so that translations made by the previous code are not reused
+schema_version = 1
 
 
 def deterministic_hash(obj):
@@ -17,69 +26,119 @@ def deterministic_hash(obj):
     return hash_object.hexdigest()[0:20]
 
 
-def get_dirs():
-    dirs = [os.path.join(cache_dir, dir) for dir in os.listdir(cache_dir) if os.path.isdir(os.path.join(cache_dir, dir))]
-    return dirs
-
-
-def get_time(dir):
-    try:
-        timefile = os.path.join(dir, time_filename)
-        t = float(open(timefile, encoding='utf-8').read())
-        return t
-    except FileNotFoundError:
-        # handle the error as needed, for now we'll just return a default value
-        return float('inf')  # This ensures that this directory will be the first to be removed if required
-
-
-
-def write_time(dir):
-    timefile = os.path.join(dir, time_filename)
-    t = time.time()
-    print(t, file=open(timefile, "w", encoding='utf-8'), end='')
-
-
-def argmin(iterable):
-    return min(enumerate(iterable), key=lambda x: x[1])[0]
+def normalize_segment(text):
+    # line endings and trailing spaces do not change the output of latex
+    lines = text.replace('\r\n', '\n').strip().split('\n')
+    return '\n'.join(line.rstrip() for line in lines)
 
 
-def remove_extra():
-    dirs = get_dirs()
-    for dir in dirs:
-        if not os.path.isdir(dir):  # This line might be redundant now, as get_dirs() ensures only directories are returned
-            os.remove(dir)
-        try:
-            get_time(dir)
-        except BaseException:
-            shutil.rmtree(dir)
-    while True:
-        dirs = get_dirs()
-        if len(dirs) <= max_cache:
-            break
-        times = [get_time(dir) for dir in dirs]
-        arg = argmin(times)
-        shutil.rmtree(dirs[arg])
-
-
-def is_cached(hash_key):
-    dir = os.path.join(cache_dir, hash_key)
-    return os.path.exists(dir)
-
-
-def create_cache(hash_key):
-    dir = os.path.join(cache_dir, hash_key)
-    os.makedirs(dir, exist_ok=True)
-    write_time(dir)
-
-
-def load_paragraph(hash_key, hash_key_paragraph):
-    filename = os.path.join(cache_dir, hash_key, hash_key_paragraph)
-    if os.path.exists(filename):
-        return open(filename, encoding='utf-8').read()
-    else:
-        return None
-
-
-def write_paragraph(hash_key, hash_key_paragraph, paragraph):
-    filename = os.path.join(cache_dir, hash_key, hash_key_paragraph)
-    print(paragraph, file=open(filename, "w", encoding='utf-8'), end='')
+def segment_key(segment, context):
+    # context: (engine that translated, model, language from, language to, anything else that changes the masking, version)
+    hash_object = hashlib.sha256()
+    hash_object.update(str((normalize_segment(segment), schema_version) + tuple(context)).encode())
+    return hash_object.hexdigest()
+
+
+class TranslationMemory:
+    '''
+    Translations of paragraphs, shared by every document, revision and process.
+    Entries are keyed by the normalized source segment and the translation context,
+    the least recently used ones are evicted once there are more than max_entries.
+    Every thread gets its own connection, the database is in WAL mode so that readers and a writer can work at the same time.
+    The last use of an entry is kept to touch_interval, lookups of entries used recently do not write.
+    '''
+
+    def __init__(self, path=memory_path, max_entries=max_entries, touch_interval=touch_interval):
+        self.path = path
+        self.max_entries = max_entries
+        self.touch_interval = touch_interval
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        connection = self.connection()
+        connection.execute('CREATE TABLE IF NOT EXISTS memory (key TEXT PRIMARY KEY, translation TEXT NOT NULL, last_used REAL NOT NULL)')
+        connection.execute('CREATE INDEX IF NOT EXISTS memory_last_used ON memory (last_used)')
+        connection.commit()
+
+    def connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self.local.connection = connection
+        return connection
+
+    def get_many(self, keys, metrics=None):
+        # returns {key: translation} for the keys that are in the memory, keys are made by segment_key
+        # metrics: the usage.Metrics of the document, if its lookups are counted as well
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        stale = []
+        now = time.time()
+        connection = self.connection()
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            rows = connection.execute(f'SELECT key, translation, last_used FROM memory WHERE key IN ({",".join("?" * len(chunk))})', chunk).fetchall()
+            found.update((key, translation) for key, translation, last_used in rows)
+            stale.extend(key for key, translation, last_used in rows if last_used < now - self.touch_interval)
+        if stale:
+            connection.executemany('UPDATE memory SET last_used = ? WHERE key = ?', [(now, key) for key in stale])
+            connection.commit()
+        with self.lock:
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        if metrics is not None:
+            metrics.on_cache_lookup(len(found), len(keys) - len(found))
+        return found
+
+    def put_many(self, translations, metrics=None):
+        # translations: {key: translation}
+        now = time.time()
+        rows = [(key, translation, now) for key, translation in translations.items()]
+        connection = self.connection()
+        connection.executemany('INSERT OR REPLACE INTO memory (key, translation, last_used) VALUES (?, ?, ?)', rows)
+        connection.commit()
+        with self.lock:
+            self.writes += len(rows)
+        if metrics is not None:
+            metrics.on_cache_write(len(rows))
+
+    def get(self, key, metrics=None):
+        return self.get_many([key], metrics).get(key)
+
+    def put(self, key, translation, metrics=None):
+        self.put_many({key: translation}, metrics)
+
+    def evict(self):
+        connection = self.connection()
+        count = connection.execute('SELECT COUNT(*) FROM memory').fetchone()[0]
+        if count > self.max_entries:
+            connection.execute('DELETE FROM memory WHERE key IN (SELECT key FROM memory ORDER BY last_used LIMIT ?)', (count - self.max_entries, ))
+            connection.commit()
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'writes': self.writes, 'hit_rate': self.hit_rate()}
+
+
+def remove_old_cache():
+    # its paragraphs are named by a truncated hash of their text, they cannot be moved to the translation memory
+    if os.path.isdir(old_cache_dir):
+        shutil.rmtree(old_cache_dir, ignore_errors=True)
+
+
+memory = None
+
+
+def get_memory():
+    global memory
+    if memory is None:
+        remove_old_cache()
+        memory = TranslationMemory()
+    return memory
@@ -25,6 +25,10 @@ class Config:
     openai_max_tokens_path = 'OPENAI_MAX_TOKENS'
     openai_temperature_path = 'OPENAI_TEMPERATURE'
     openai_chunk_size_path = 'OPENAI_CHUNK_SIZE'
+    openai_stream_path = 'OPENAI_STREAM'
+    openai_stall_timeout_path = 'OPENAI_STALL_TIMEOUT'
+    openai_max_in_flight_chunks_path = 'OPENAI_MAX_IN_FLIGHT_CHUNKS'
+    openai_glossary_path = 'OPENAI_GLOSSARY'
     tencent_secret_id_path = 'TENCENT_SECRET_ID'
     tencent_secret_key_path = 'TENCENT_SECRET_KEY'
     tencent_region_path = 'TENCENT_REGION'
@@ -43,6 +47,10 @@ class Config:
     openai_max_tokens_default = 2000
     openai_temperature_default = 0.3
     openai_chunk_size_default = 3000
+    openai_stream_default = False
+    openai_stall_timeout_default = 20
+    openai_max_in_flight_chunks_default = 4
+    openai_glossary_default = None
     tencent_secret_id_default = None
     tencent_secret_key_default = None
     tencent_region_default = 'ap-shanghai'
@@ -141,6 +149,10 @@ class Config:
             self.openai_max_tokens = openai_config.get('max_tokens', self.openai_max_tokens_default)
             self.openai_temperature = openai_config.get('temperature', self.openai_temperature_default)
             self.openai_chunk_size = openai_config.get('chunk_size', self.openai_chunk_size_default)
+            self.openai_stream = openai_config.get('stream', self.openai_stream_default)
+            self.openai_stall_timeout = openai_config.get('stall_timeout', self.openai_stall_timeout_default)
+            self.openai_max_in_flight_chunks = openai_config.get('max_in_flight_chunks', self.openai_max_in_flight_chunks_default)
+            self.openai_glossary = openai_config.get('glossary', self.openai_glossary_default)
         else:
             # Flat structure: {"openai_api_key": "..."}
             self.openai_api_key = json_config.get('openai_api_key', self.openai_api_key_default)
@@ -149,6 +161,10 @@ class Config:
             self.openai_max_tokens = json_config.get('openai_max_tokens', self.openai_max_tokens_default)
             self.openai_temperature = json_config.get('openai_temperature', self.openai_temperature_default)
             self.openai_chunk_size = json_config.get('openai_chunk_size', self.openai_chunk_size_default)
+            self.openai_stream = json_config.get('openai_stream', self.openai_stream_default)
+            self.openai_stall_timeout = json_config.get('openai_stall_timeout', self.openai_stall_timeout_default)
+            self.openai_max_in_flight_chunks = json_config.get('openai_max_in_flight_chunks', self.openai_max_in_flight_chunks_default)
+            self.openai_glossary = json_config.get('openai_glossary', self.openai_glossary_default)
 
         # Support both flat and nested structure for Tencent
         if 'tencent' in json_config and isinstance(json_config['tencent'], dict):
@@ -0,0 +1,74 @@
+'''
+Circuit breakers of the translation engines.
+
+After failure_threshold failures in a row the circuit of an engine opens,
+its requests go to the next engine of the chain without being tried for cooldown seconds.
+The circuit then half-opens: a few probe requests are let through,
+one success closes it again and one failure opens it for another cooldown.
+'''
+import time
+import threading
+
+closed = 'closed'
+open_ = 'open'
+half_open = 'half-open'
+
+
+class CircuitBreaker:
+    def __init__(self, name, failure_threshold=5, cooldown=30, probes=1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.probes = probes
+        self.lock = threading.Lock()
+        self.state = closed
+        self.failures = 0
+        self.opened_at = 0
+        self.probes_in_flight = 0
+        self.times_opened = 0
+        self.rejected = 0
+
+    def allow(self):
+        with self.lock:
+            if self.state == open_ and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = half_open
+                self.probes_in_flight = 0
+            if self.state == closed:
+                return True
+            if self.state == half_open and self.probes_in_flight < self.probes:
+                self.probes_in_flight += 1
+                return True
+            self.rejected += 1
+            return False
+
+    def on_success(self):
+        with self.lock:
+            if self.state != closed:
+                print(f'{self.name} works again')
+            self.state = closed
+            self.failures = 0
+
+    def on_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == half_open or (self.state == closed and self.failures >= self.failure_threshold):
+                self.state = open_
+                self.opened_at = time.monotonic()
+                self.times_opened += 1
+                print(f'Warning: {self.name} failed {self.failures} times in a row, it is not used for {self.cooldown} s')
+
+    def stats(self):
+        return {'state': self.state, 'times_opened': self.times_opened, 'rejected': self.rejected}
+
+
+breakers = {}
+breakers_lock = threading.Lock()
+
+
+def get_breaker(engine):
+    if engine == 'tencentcloud':
+        engine = 'tencent'
+    with breakers_lock:
+        if engine not in breakers:
+            breakers[engine] = CircuitBreaker(engine)
+        return breakers[engine]
@@ -3,6 +3,7 @@ import socket
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
+from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException
@@ -12,6 +13,9 @@ import tempfile
 import ctypes
 import time
 import socket
+import queue
+import atexit
+import http.server
 GUI = False
 
 
@@ -30,26 +34,31 @@ def set_pdeathsig():
 
 
 class Translator:
-    def __init__(self, target_lang, source_lang, port, tmpdir):
+    def __init__(self, target_lang, source_lang, port, tmpdir, url="https://translate.google.com/"):
         """Initialize the Chrome WebDriver once."""
 
-        os.environ["HOME"] = f"{tmpdir}_home"
-        os.environ["XDG_DATA_HOME"] = f"{tmpdir}_home/.local/share"
-        os.environ["XDG_CONFIG_HOME"] = f"{tmpdir}_home/.config"
-        os.environ["XDG_CACHE_HOME"] = f"{tmpdir}_home/.cache"
-        os.environ["FONTCONFIG_PATH"] = "/etc/fonts"
-        os.environ["FONTCONFIG_FILE"] = "/etc/fonts/fonts.conf"
-        os.makedirs(os.environ["XDG_DATA_HOME"], exist_ok=True)
-        os.makedirs(os.environ["XDG_CONFIG_HOME"], exist_ok=True)
-        os.makedirs(os.environ["XDG_CACHE_HOME"], exist_ok=True)
+        # the profile of every browser is in its own directories, given to its processes rather than set in os.environ,
+        # which is shared by the browsers started at the same time by BrowserPool.warm_up
+        env = {
+            **os.environ,
+            "HOME": f"{tmpdir}_home",
+            "XDG_DATA_HOME": f"{tmpdir}_home/.local/share",
+            "XDG_CONFIG_HOME": f"{tmpdir}_home/.config",
+            "XDG_CACHE_HOME": f"{tmpdir}_home/.cache",
+            "FONTCONFIG_PATH": "/etc/fonts",
+            "FONTCONFIG_FILE": "/etc/fonts/fonts.conf",
+        }
+        os.makedirs(env["XDG_DATA_HOME"], exist_ok=True)
+        os.makedirs(env["XDG_CONFIG_HOME"], exist_ok=True)
+        os.makedirs(env["XDG_CACHE_HOME"], exist_ok=True)
 
         # Step 1: Start a hidden virtual display (Xvfb)
         if not GUI:
-            self.xvfb_process = subprocess.Popen(["Xvfb", f":{port}", "-screen", "0", "1920x1080x24"], preexec_fn=set_pdeathsig)
+            self.xvfb_process = subprocess.Popen(["Xvfb", f":{port}", "-screen", "0", "1920x1080x24"], env=env, preexec_fn=set_pdeathsig)
             time.sleep(2)  # Wait for Xvfb to start
 
         # Step 2: Start Chrome in the hidden display
-        opts = dict() if GUI else dict(env={**os.environ, "DISPLAY": f":{port}"}, preexec_fn=set_pdeathsig)
+        opts = dict(env=env) if GUI else dict(env={**env, "DISPLAY": f":{port}"}, preexec_fn=set_pdeathsig)
         self.chrome_process = subprocess.Popen([
             "/usr/bin/google-chrome",
             f"--remote-debugging-port={port}",  # Allow Selenium to attach
@@ -72,64 +81,216 @@ class Translator:
         #options.add_argument("--headless")
         self.driver = webdriver.Chrome(options=options)
         self.target_lang, self.source_lang = target_lang, source_lang
-        self.url = f"https://translate.google.com/?sl={self.source_lang}&tl={self.target_lang}&op=translate"
+        self.url = f"{url}?sl={self.source_lang}&tl={self.target_lang}&op=translate"
         self.input_box_xpath = '//textarea[@aria-label="Source text"]'
         self.output_box_xpath = '//span[@class="HwtZe"]'
+        self.input_box = None
         print(self.url)
 
-    def translate(self, text):
-        """Translate text using Google Translate."""
-
+    def load(self):
+        """Load the translate page, it is then reused by every call."""
         self.driver.get(self.url)
         self.input_box = WebDriverWait(self.driver, 10, poll_frequency=0.05).until(
             EC.presence_of_element_located((By.XPATH, self.input_box_xpath))
         )
-        self.input_box.clear()
+
+    def output_text(self):
+        try:
+            return self.driver.find_element(By.XPATH, self.output_box_xpath).text.strip()
+        except Exception:
+            return ''
+
+    def set_input(self, text):
         self.driver.execute_script("arguments[0].value = arguments[1];", self.input_box, text)
+        # the page translates on input events
         self.input_box.send_keys(' ')
-        
-        def updated(driver):
-            try:
-                result = driver.find_element(By.XPATH, self.output_box_xpath)
-                return result.text.strip() != ''
-            except TimeoutException as e:
-                raise e
-            except Exception as e:
-                return False
 
-        WebDriverWait(self.driver, 10, poll_frequency=0.05).until(updated)
+    def translate(self, text):
+        """Translate text using Google Translate."""
+        if self.input_box is None:
+            self.load()
+        # the previous translation is cleared first, so that the new one is recognized even if it is the same
+        if self.output_text():
+            self.input_box.send_keys(Keys.CONTROL, 'a')
+            self.input_box.send_keys(Keys.DELETE)
+            WebDriverWait(self.driver, 5, poll_frequency=0.05).until(lambda driver: self.output_text() == '')
+        self.set_input(text)
+        WebDriverWait(self.driver, 10, poll_frequency=0.05).until(lambda driver: self.output_text() != '')
+        return self.driver.find_element(By.XPATH, self.output_box_xpath).text
 
-        translated_text = self.driver.find_element(By.XPATH, self.output_box_xpath).text
-        #self.last_output = translated_text
-        return translated_text
+    def is_healthy(self):
+        """The browser answers and the page is still usable."""
+        try:
+            if self.driver.execute_script("return document.readyState") != "complete":
+                return False
+            return self.input_box is not None and self.input_box.is_enabled()
+        except Exception:
+            return False
 
     def close(self):
-        """Close the browser."""
-        self.driver.quit()
+        """Close the browser, Chrome and the virtual display."""
+        try:
+            self.driver.quit()
+        except Exception:
+            pass
+        for process in [self.chrome_process, getattr(self, 'xvfb_process', None)]:
+            if process is None:
+                continue
+            process.terminate()
+            try:
+                process.wait(5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
 
+class BrowserPool:
+    """
+    A fixed number of browsers with the translate page loaded, shared by the threads.
+    A call takes an idle browser, a browser that fails and does not pass the health check is replaced by a new one.
+    The pool keeps its size: a browser that could not be started leaves an empty slot (None) in the idle queue,
+    and the next call that takes the slot starts a browser in it.
+    """
 
-class ParallelTranslator:
-    def __init__(self, target_lang, source_lang):
+    def __init__(self, target_lang, source_lang, size=4, url="https://translate.google.com/", retries=2):
         self.target_lang = target_lang
         self.source_lang = source_lang
-        self.drivers = {}
+        self.size = size
+        self.url = url
+        self.retries = retries
         self.tempdir = tempfile.TemporaryDirectory().name
+        self.idle = queue.Queue()
+        self.browsers = []
+        self.lock = threading.Lock()
+        self.warm_up_lock = threading.Lock()
+        self.replaced = 0
+        self.started = False
+        self.closed = False
+        atexit.register(self.close)
 
-    def translate(self, text):
-        thread_id = threading.get_ident()
-        if thread_id not in self.drivers:
-            port = find_free_port()
-            print('init', port)
-            self.drivers[thread_id] = Translator(self.target_lang, self.source_lang, port, f'{self.tempdir}_{port}')
-            print('init', port, 'done')
-        while True:
+    def new_browser(self):
+        port = find_free_port()
+        print('init', port)
+        browser = Translator(self.target_lang, self.source_lang, port, f'{self.tempdir}_{port}', url=self.url)
+        try:
+            browser.load()
+        except Exception:
+            browser.close()
+            raise
+        print('init', port, 'done')
+        with self.lock:
+            self.browsers.append(browser)
+        return browser
+
+    def start_slot(self):
+        try:
+            browser = self.new_browser()
+        except Exception as e:
+            print(f'Warning: a browser could not be started: {e}')
+            browser = None
+        self.idle.put(browser)
+
+    def warm_up(self):
+        """Start the browsers and load the page in all of them at the same time."""
+        if self.started:
+            return
+        self.started = True
+        threads = [threading.Thread(target=self.start_slot) for _ in range(self.size)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if not self.browsers:
+            raise RuntimeError('no browser could be started')
+
+    def recover(self, browser):
+        # reloading the page is enough when the browser itself is fine, otherwise it is replaced
+        if browser.is_healthy():
             try:
-                return self.drivers[thread_id].translate(text)
-            except Exception as e:
-                import time
-                time.sleep(15)
-                port = find_free_port()
-                print('init', port)
-                self.drivers[thread_id] = Translator(self.target_lang, self.source_lang, port, f'{self.tempdir}_{port}')
-                print('init', port, 'done')
-                continue
+                browser.load()
+                return browser
+            except Exception:
+                pass
+        with self.lock:
+            self.browsers.remove(browser)
+            self.replaced += 1
+        browser.close()
+        return self.new_browser()
+
+    def translate(self, text):
+        with self.warm_up_lock:
+            self.warm_up()
+        browser = self.idle.get()
+        try:
+            if browser is None:
+                browser = self.new_browser()
+            for attempt in range(self.retries + 1):
+                try:
+                    return browser.translate(text)
+                except Exception:
+                    if attempt == self.retries:
+                        raise
+                    failed, browser = browser, None
+                    browser = self.recover(failed)
+        finally:
+            # the slot goes back even when its browser could not be replaced
+            self.idle.put(browser)
+
+    def close(self):
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            browsers, self.browsers = self.browsers, []
+        for browser in browsers:
+            browser.close()
+
+    def __enter__(self):
+        self.warm_up()
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class ParallelTranslator(BrowserPool):
+    def __init__(self, target_lang, source_lang, size=4, url="https://translate.google.com/"):
+        super().__init__(target_lang, source_lang, size=size, url=url)
+
+
+stand_in_page = """<!DOCTYPE html>
+<html><body>
+<textarea aria-label="Source text"></textarea>
+<div><span class="HwtZe"></span></div>
+<script>
+// answers like the translate page: the output follows the input after a short delay
+const input = document.querySelector('textarea');
+const output = document.querySelector('.HwtZe');
+let timer = null;
+input.addEventListener('input', () => {
+    clearTimeout(timer);
+    timer = setTimeout(() => { output.textContent = input.value.trim() ? '[' + input.value.trim().toUpperCase() + ']' : ''; }, 50);
+});
+</script>
+</body></html>
+"""
+
+
+class StandInPageHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = stand_in_page.encode('utf-8')
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stand_in_server(port=0):
+    """Serve a page with the same textarea and output span as the translate page, for testing the pool offline.
+    Returns the server and its url, to be given as url to BrowserPool."""
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", port), StandInPageHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/"
@@ -0,0 +1,75 @@
+import re
+import time
+import html
+import threading
+import requests
+import requests.adapters
+from urllib3.util.retry import Retry
+
+
+class GoogleTranslator:
+    '''
+    Google translate through its mobile page, like mtranslate, but over a pooled session:
+    connections are kept alive between requests, the timeouts are set on the socket
+    and failed connections or server errors are retried by urllib3, so no thread is needed per call.
+    '''
+    agent = {'User-Agent': "Mozilla/4.0 (compatible;MSIE 6.0;Windows NT 5.1;SV1;.NET CLR 1.1.4322;.NET CLR 2.0.50727;.NET CLR 3.0.04506.30)"}
+    result_pattern = re.compile(r'(?s)class="(?:t0|result-container)">(.*?)<')
+    # the texts of a batch follow numbered markers, google keeps them like the codes of the latex objects
+    segment_marker = 'XSEGX{}'
+    marker_pattern = re.compile(r'XSEGX\s*(\d+)', re.IGNORECASE)
+
+    def __init__(self, base_url='https://translate.google.com', pool_size=10, connect_timeout=5, read_timeout=10, retries=2, metrics=None):
+        self.url = base_url.rstrip('/') + '/m'
+        self.timeout = (connect_timeout, read_timeout)
+        retry = Retry(total=retries, backoff_factor=0.5, status_forcelist=(500, 502, 503, 504), allowed_methods=frozenset(['GET']))
+        self.adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.headers.update(self.agent)
+        self.session.mount('https://', self.adapter)
+        self.session.mount('http://', self.adapter)
+        self.lock = threading.Lock()
+        self.requests_sent = 0
+        # usage.EngineMetrics that the answered requests are counted in
+        self.metrics = metrics
+
+    def translate(self, text, language_to, language_from):
+        with self.lock:
+            self.requests_sent += 1
+        start = time.monotonic()
+        response = self.session.get(self.url, params={'tl': language_to, 'sl': language_from, 'q': text}, timeout=self.timeout)
+        response.raise_for_status()
+        result = self.result_pattern.findall(response.text)
+        if not result:
+            raise ValueError('no translation found in the answer of google')
+        if self.metrics is not None:
+            self.metrics.on_request(time.monotonic() - start, characters=len(text))
+        return html.unescape(result[0])
+
+    def translate_batch(self, texts, language_to, language_from):
+        """Translate several texts in one request, the answer is split on the markers in front of them.
+        A translation is kept only if its marker came back once and is followed by the marker of the next text,
+        the other texts are translated alone"""
+        joined = '\n'.join(f'{self.segment_marker.format(i)}\n{text}' for i, text in enumerate(texts))
+        parts = self.marker_pattern.split(self.translate(joined, language_to, language_from))
+        # parts: what comes before the first marker, then the id and the translation of every marker
+        ids = [int(segment_id) for segment_id in parts[1::2]] + [len(texts)]
+        found = {}
+        for k, segment in enumerate(parts[2::2]):
+            segment_id = ids[k]
+            if ids.count(segment_id) == 1 and ids[k + 1] == segment_id + 1 and segment.strip():
+                found[segment_id] = segment.strip()
+        return [found[i] if i in found else self.translate(text, language_to, language_from) for i, text in enumerate(texts)]
+
+    def is_error_request_frequency(self, e):
+        return isinstance(e, requests.HTTPError) and e.response is not None and e.response.status_code == 429
+
+    def connection_stats(self):
+        pools = [self.adapter.poolmanager.pools.get(key) for key in list(self.adapter.poolmanager.pools.keys())]
+        created = sum(pool.num_connections for pool in pools if pool is not None)
+        return {'requests': self.requests_sent,
+                'connections_created': created,
+                'connections_reused': max(self.requests_sent - created, 0)}
+
+    def close(self):
+        self.session.close()
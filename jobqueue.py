@@ -0,0 +1,312 @@
+'''
+Persistent queue of the translation jobs of the API server.
+
+Jobs are rows of a SQLite database, so that they survive a restart of the server.
+A fixed pool of worker processes takes the queued jobs by priority, then by age.
+Every job records the last stage it completed: a job that was running when the server or its worker stopped
+is queued again and resumes after that stage.
+The queue admits a bounded number of waiting jobs, the server answers 429 beyond it.
+A job asking for the same content as a queued or running one follows it instead of being queued, and gets its result.
+'''
+import os
+import json
+import time
+import sqlite3
+import datetime
+import threading
+import contextlib
+import multiprocessing
+
+# statuses of a job
+pending = 'pending'  # uploaded, waiting to be started
+queued = 'queued'  # waiting for a worker
+processing = 'processing'
+completed = 'completed'
+failed = 'failed'
+cancelled = 'cancelled'
+following = 'following'  # waiting for the result of an identical job
+active = (queued, processing)
+
+columns = {
+    'id': 'TEXT PRIMARY KEY',
+    'status': 'TEXT NOT NULL',
+    'stage': 'TEXT',  # last completed stage
+    'priority': 'INTEGER NOT NULL DEFAULT 0',
+    'message': 'TEXT',
+    'progress': 'REAL NOT NULL DEFAULT 0',
+    'created_at': 'TEXT NOT NULL',
+    'updated_at': 'TEXT NOT NULL',
+    'input_filename': 'TEXT',
+    'input_path': 'TEXT',
+    'arxiv_id': 'TEXT',
+    'options': 'TEXT',
+    'result': 'TEXT',
+    'main_tex_files': 'TEXT',
+    'worker': 'TEXT',
+    'attempts': 'INTEGER NOT NULL DEFAULT 0',
+    'queued_at': 'REAL',
+    'started_at': 'REAL',
+    'duration': 'REAL',  # seconds spent by workers on the job, once it is completed
+    'content_key': 'TEXT',  # what the job produces: its source, options and version
+    'follows': 'TEXT',  # id of the identical job whose result this one waits for
+    'cache_key': 'TEXT',  # entry of the artifact cache its files are served from
+    'paragraphs_done': 'INTEGER',  # paragraphs of the tex file being translated that are done
+    'paragraphs': 'INTEGER',
+    'eta': 'REAL',  # seconds until the tex file being translated is done
+}
+# statuses after which a job does not change anymore
+finished = (completed, failed, cancelled)
+json_columns = ('options', 'result', 'main_tex_files')
+# a guess of the duration of a job until some have been completed
+default_duration = 120
+# times a job is started before it is failed, a job that kills its worker every time is not queued again forever
+max_attempts = 3
+
+
+def now():
+    return datetime.datetime.now().isoformat()
+
+
+class JobQueue:
+    '''
+    Every thread and process gets its own connection, the database is in WAL mode
+    so that the server reads the jobs while the workers update them.
+    '''
+
+    def __init__(self, path, max_queued=20, max_attempts=max_attempts):
+        self.path = path
+        self.max_queued = max_queued
+        self.max_attempts = max_attempts
+        self.local = threading.local()
+        connection = self.connection()
+        connection.execute('CREATE TABLE IF NOT EXISTS jobs (' + ', '.join(f'{name} {kind}' for name, kind in columns.items()) + ')')
+        # databases of earlier versions get the columns they miss
+        existing = {row['name'] for row in connection.execute('PRAGMA table_info(jobs)')}
+        for name, kind in columns.items():
+            if name not in existing:
+                connection.execute(f'ALTER TABLE jobs ADD COLUMN {name} {kind}')
+        connection.execute('CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority, queued_at)')
+        connection.execute('CREATE INDEX IF NOT EXISTS jobs_content ON jobs (content_key, status)')
+        connection.execute('CREATE INDEX IF NOT EXISTS jobs_follows ON jobs (follows)')
+        connection.commit()
+
+    def connection(self):
+        # a connection must not cross a fork, the workers open their own
+        connection = getattr(self.local, 'connection', None)
+        if connection is None or self.local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.row_factory = sqlite3.Row
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self.local.connection = connection
+            self.local.pid = os.getpid()
+        return connection
+
+    @contextlib.contextmanager
+    def transaction(self):
+        # BEGIN IMMEDIATE takes the write lock at once, the changes are committed only if the block does not raise
+        connection = self.connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def to_job(self, row):
+        if row is None:
+            return None
+        job = dict(row)
+        for name in json_columns:
+            if job[name] is not None:
+                job[name] = json.loads(job[name])
+        return job
+
+    def encode(self, fields):
+        return {name: json.dumps(value) if name in json_columns and value is not None else value for name, value in fields.items()}
+
+    def insert(self, connection, job_id, status, fields):
+        fields = self.encode(dict(fields, id=job_id, status=status, created_at=now(), updated_at=now()))
+        names = ', '.join(fields)
+        connection.execute(f'INSERT INTO jobs ({names}) VALUES ({", ".join("?" * len(fields))})', tuple(fields.values()))
+
+    def create(self, job_id, status=pending, **fields):
+        self.insert(self.connection(), job_id, status, fields)
+
+    def save(self, job_id, status, **fields):
+        # creates the job or updates it if it exists
+        connection = self.connection()
+        if connection.execute('SELECT 1 FROM jobs WHERE id = ?', (job_id, )).fetchone() is None:
+            self.insert(connection, job_id, status, fields)
+        else:
+            self.set(connection, job_id, dict(fields, status=status))
+
+    def followers(self, job_id):
+        return [self.to_job(row) for row in self.connection().execute('SELECT * FROM jobs WHERE follows = ? AND status = ? ORDER BY created_at', (job_id, following))]
+
+    def promote(self, job_id):
+        # the oldest follower of a job that is deleted takes its place in the queue, the others follow it
+        job = self.get(job_id)
+        followers = self.followers(job_id)
+        if job is None or not followers:
+            return None
+        heir = followers[0]['id']
+        with self.transaction() as connection:
+            self.set(connection, heir, {'status': queued, 'follows': None, 'stage': None, 'queued_at': job['queued_at'], 'message': 'Waiting for a worker...'})
+            for follower in followers[1:]:
+                self.set(connection, follower['id'], {'follows': heir})
+        return heir
+
+    def submit_or_follow(self, job_id, content_key, priority=0, coalesce=True, **fields):
+        # queues the job if the queue admits it or, with coalesce, makes it follow a queued or running job with the same content.
+        # Both happen in one transaction, so that identical requests arriving at the same time are not both queued.
+        # The job is created, or updated if it exists (an uploaded file). Returns queued, following, or None when the queue is full
+        with self.transaction() as connection:
+            fields = dict(fields, content_key=content_key)
+            exists = connection.execute('SELECT 1 FROM jobs WHERE id = ?', (job_id, )).fetchone() is not None
+            row = None
+            if coalesce:
+                row = connection.execute(f'SELECT id FROM jobs WHERE content_key = ? AND status IN ({", ".join("?" * len(active))}) AND id != ? ORDER BY queued_at LIMIT 1',
+                                         (content_key, ) + active + (job_id, )).fetchone()
+            if row is not None:
+                status = following
+                fields = dict(fields, follows=row['id'], message='Waiting for an identical task...')
+            elif self.queued_count(connection) < self.max_queued:
+                status = queued
+                fields = dict(fields, priority=priority, queued_at=time.time())
+            else:
+                return None
+            if exists:
+                self.set(connection, job_id, dict(fields, status=status))
+            else:
+                self.insert(connection, job_id, status, fields)
+        return status
+
+    def queued_count(self, connection=None):
+        connection = connection or self.connection()
+        return connection.execute('SELECT COUNT(*) FROM jobs WHERE status = ?', (queued, )).fetchone()[0]
+
+    def set(self, connection, job_id, fields):
+        fields = self.encode(dict(fields, updated_at=now()))
+        assignments = ', '.join(f'{name} = ?' for name in fields)
+        connection.execute(f'UPDATE jobs SET {assignments} WHERE id = ?', tuple(fields.values()) + (job_id, ))
+
+    def update(self, job_id, **fields):
+        self.set(self.connection(), job_id, fields)
+
+    def get(self, job_id):
+        return self.to_job(self.connection().execute('SELECT * FROM jobs WHERE id = ?', (job_id, )).fetchone())
+
+    def list(self):
+        return [self.to_job(row) for row in self.connection().execute('SELECT * FROM jobs ORDER BY created_at DESC')]
+
+    def delete(self, job_id):
+        cursor = self.connection().execute('DELETE FROM jobs WHERE id = ?', (job_id, ))
+        return cursor.rowcount > 0
+
+    def claim(self, worker):
+        # the next queued job, now processed by worker, or None
+        with self.transaction() as connection:
+            row = connection.execute('SELECT * FROM jobs WHERE status = ? ORDER BY priority DESC, queued_at LIMIT 1', (queued, )).fetchone()
+            if row is None:
+                return None
+            self.set(connection, row['id'], {'status': processing, 'worker': worker, 'attempts': row['attempts'] + 1, 'started_at': time.time()})
+        return self.get(row['id'])
+
+    def finish(self, job_id, status, **fields):
+        # completed or failed, the time spent by the worker goes to the estimates of Retry-After
+        job = self.get(job_id)
+        if job is None:
+            return
+        duration = (job['duration'] or 0) + (time.time() - job['started_at'] if job['started_at'] else 0)
+        self.update(job_id, status=status, worker=None, duration=duration, **fields)
+
+    def requeue(self, worker=None):
+        # jobs left in processing by a worker that is gone, or by every worker when the server starts,
+        # the ones that were already started max_attempts times are failed together with their followers.
+        # Returns the number of jobs queued again
+        with self.transaction() as connection:
+            query = 'SELECT id, started_at, duration, attempts FROM jobs WHERE status = ?'
+            parameters = (processing, )
+            if worker is not None:
+                query += ' AND worker = ?'
+                parameters += (worker, )
+            rows = connection.execute(query, parameters).fetchall()
+            requeued = 0
+            for row in rows:
+                duration = (row['duration'] or 0) + (time.time() - row['started_at'] if row['started_at'] else 0)
+                if row['attempts'] >= self.max_attempts:
+                    message = f"Translation failed: the worker stopped during each of its {row['attempts']} attempts"
+                    self.set(connection, row['id'], {'status': failed, 'worker': None, 'duration': duration, 'message': message})
+                    for follower in self.followers(row['id']):
+                        self.set(connection, follower['id'], {'status': failed, 'follows': None, 'message': message})
+                    continue
+                self.set(connection, row['id'], {'status': queued, 'worker': None, 'duration': duration, 'message': 'Interrupted, waiting to resume...'})
+                requeued += 1
+        return requeued
+
+    def retry_after(self, workers):
+        # seconds until a worker is likely free for one more job
+        rows = self.connection().execute('SELECT duration FROM jobs WHERE status = ? AND duration IS NOT NULL ORDER BY updated_at DESC LIMIT 20', (completed, )).fetchall()
+        mean = sum(row['duration'] for row in rows) / len(rows) if rows else default_duration
+        return max(1, int(mean * (self.queued_count() + 1) / max(1, workers)))
+
+
+def work(path, worker, handler, poll_interval=1.0):
+    # loop of a worker process: handler(job) runs the jobs it claims
+    queue = JobQueue(path)
+    while True:
+        job = queue.claim(worker)
+        if job is None:
+            time.sleep(poll_interval)
+            continue
+        try:
+            handler(job)
+        except Exception as e:
+            print(f"Job {job['id']} failed: {e}")
+            queue.finish(job['id'], failed, message=f'Translation failed: {e}')
+
+
+class WorkerPool:
+    def __init__(self, queue, handler, workers=2, check_interval=5):
+        # handler: module level function, so that the worker processes can import it
+        self.queue = queue
+        self.handler = handler
+        self.workers = workers
+        self.check_interval = check_interval
+        self.processes = {}
+        self.restarts = 0
+
+    def start_worker(self, name):
+        process = multiprocessing.Process(target=work, args=(self.queue.path, name, self.handler), name=name, daemon=True)
+        process.start()
+        self.processes[name] = process
+
+    def start(self):
+        requeued = self.queue.requeue()
+        if requeued:
+            print(f'{requeued} interrupted jobs are queued again')
+        for i in range(self.workers):
+            self.start_worker(f'worker-{i}')
+        threading.Thread(target=self.supervise, daemon=True).start()
+
+    def supervise(self):
+        # a worker that died is replaced and its job queued again
+        while True:
+            time.sleep(self.check_interval)
+            for name, process in list(self.processes.items()):
+                if not process.is_alive():
+                    print(f'{name} stopped with exit code {process.exitcode}, starting it again')
+                    self.queue.requeue(name)
+                    self.restarts += 1
+                    self.start_worker(name)
+
+    def stats(self):
+        return {
+            'workers': self.workers,
+            'alive': sum(process.is_alive() for process in self.processes.values()),
+            'restarts': self.restarts,
+            'queued': self.queue.queued_count(),
+            'max_queued': self.queue.max_queued,
+        }
@@ -0,0 +1,248 @@
+r"""
+A small LaTeX lexer.
+
+`tokenize` splits a document into control sequences, braces, math shifts and text runs in one scan.
+`parse` builds a compact node tree on top of the tokens: brace groups are matched with a stack,
+then \begin{xxx} \end{xxx} pairs and math delimiters are folded inside the group that contains them.
+Nodes only keep source offsets, the text is always sliced from the original string.
+"""
+import re
+import functools
+
+pattern_token = re.compile(r'\\(?:[a-zA-Z]+\*?|.)|\\|\{|\}|\$\$|\$', re.DOTALL)  # everything in between is text
+pattern_spaces = re.compile(r'[ \t]*')
+pattern_options = re.compile(r'\[[^\[\]]*?\]')
+
+token_kinds = {'{': 'open', '}': 'close', '$': 'shift'}
+math_delimiters = {'$': '$', '$$': '$$', '[': ']', '(': ')'}  # opening -> closing
+
+
+class Node:
+    r'''
+    kind: 'root', 'group', 'env', 'math' or 'command'
+    name: environment name, command name (without backslash) or opening math delimiter
+    start, end: source span of the whole node
+    body_start, body_end: source span of the content ({xxx} for groups, the text between \begin{xxx}[options] and \end{xxx} for environments)
+    options: source span of the [options] of an environment, or None
+    children: nodes inside the body, ordered and non-overlapping
+    '''
+    __slots__ = ('kind', 'name', 'start', 'end', 'body_start', 'body_end', 'options', 'children')
+
+    def __init__(self, kind, start, end, name=None, body_start=None, body_end=None):
+        self.kind = kind
+        self.name = name
+        self.start = start
+        self.end = end
+        self.body_start = body_start
+        self.body_end = body_end
+        self.options = None
+        self.children = []
+
+    def __repr__(self):
+        return f'Node({self.kind}, {self.name!r}, {self.start}, {self.end}, children={len(self.children)})'
+
+
+def tokenize(text):
+    r'''
+    Yield (kind, start, end) for every token of text, where kind is
+    'command' (\xxx or \x), 'open' ({), 'close' (}), 'shift' ($ or $$) or 'text'
+    '''
+    pos = 0
+    for match in pattern_token.finditer(text):
+        start, end = match.span()
+        if start > pos:
+            yield 'text', pos, start
+        pos = end
+        yield token_kinds.get(text[start], 'command'), start, end
+    if pos < len(text):
+        yield 'text', pos, len(text)
+
+
+class Document:
+    def __init__(self, text):
+        self.text = text
+        self.groups = {}  # start offset -> group node
+        self.root = Node('root', 0, len(text), body_start=0, body_end=len(text))
+        self._build()
+        self.root.children = self._fold(self.root.children)
+
+    def _build(self):
+        # match braces with a stack, this is the only place where nesting is decided
+        text = self.text
+        stack = [self.root]
+        for match in pattern_token.finditer(text):
+            start, end = match.span()
+            char = text[start]
+            if char == '{':
+                stack.append(Node('group', start, None, body_start=end))
+            elif char == '}':
+                if len(stack) > 1:
+                    group = stack.pop()
+                    group.end = end
+                    group.body_end = start
+                    stack[-1].children.append(group)
+                    self.groups[group.start] = group
+                # an unmatched } is plain text
+            elif char == '$':
+                stack[-1].children.append(Node('shift', start, end, name=text[start:end]))
+            else:
+                stack[-1].children.append(Node('command', start, end, name=text[start + 1:end]))
+        # an unclosed { is plain text, what it contains belongs to the enclosing group
+        while len(stack) > 1:
+            group = stack.pop()
+            stack[-1].children.extend(group.children)
+
+    def _name_group(self, node):
+        # the {xxx} right after \begin or \end, if it contains nothing but the name
+        group = self.groups.get(self.skip_spaces(node.end))
+        if group is None or group.children:
+            return None
+        return group
+
+    def _fold(self, nodes):
+        for node in nodes:
+            if node.kind == 'group' and node.children:
+                node.children = self._fold(node.children)
+        nodes = self._fold_envs(nodes)
+        return self._fold_math(nodes)
+
+    def _fold_envs(self, nodes):
+        out = []
+        opened = []  # (name, index in out, name group)
+        skip_until = -1
+        for node in nodes:
+            if node.start < skip_until:
+                continue
+            if node.kind == 'command' and node.name in ('begin', 'end'):
+                group = self._name_group(node)
+                if group is not None:
+                    name = self.text[group.body_start:group.body_end]
+                    skip_until = group.end
+                    if node.name == 'begin':
+                        opened.append((name, len(out), group))
+                        out.append(node)
+                        continue
+                    for i in range(len(opened) - 1, -1, -1):
+                        if opened[i][0] == name:
+                            break
+                    else:
+                        out.append(node)
+                        continue
+                    _, index, begin_group = opened[i]
+                    del opened[i:]
+                    out[index:] = [self._make_env(name, out[index], begin_group, node, group, out[index + 1:])]
+                    continue
+            out.append(node)
+        return out
+
+    def _make_env(self, name, begin, begin_group, end, end_group, inner):
+        env = Node('env', begin.start, end_group.end, name=name, body_end=end.start)
+        body_start = self.skip_spaces(begin_group.end)
+        match = pattern_options.match(self.text, body_start)
+        if match:
+            env.options = match.span()
+            body_start = match.end()
+        env.body_start = body_start
+        env.children = self._fold_math([node for node in inner if node.start >= body_start])
+        return env
+
+    def _fold_math(self, nodes):
+        out = []
+        opened = None  # (kind, closing delimiter, index in out)
+        for node in nodes:
+            if node.kind not in ('shift', 'command'):
+                pass
+            elif opened is None:
+                if node.name in math_delimiters and (node.kind == 'shift') == (node.name[0] == '$'):
+                    opened = (node.kind, math_delimiters[node.name], len(out))
+            elif (node.kind, node.name) == opened[:2]:
+                index = opened[2]
+                begin = out[index]
+                math = Node('math', begin.start, node.end, name=begin.name, body_start=begin.end, body_end=node.start)
+                math.children = out[index + 1:]
+                out[index:] = [math]
+                opened = None
+                continue
+            out.append(node)
+        # unpaired $ are plain text
+        return [node for node in out if node.kind != 'shift']
+
+    def skip_spaces(self, pos):
+        return pattern_spaces.match(self.text, pos).end()
+
+    def slice(self, span):
+        if span is None:
+            return ''
+        return self.text[span[0]:span[1]]
+
+    def command_arguments(self, node, n=1, with_options=True):
+        r'''
+        Arguments of a command as in \xxx[options]{arg1}{arg2}..., only spaces and tabs are allowed in between
+        Returns (options span or None, [group nodes]), or None if the command does not have n arguments
+        '''
+        pos = self.skip_spaces(node.end)
+        if with_options:
+            match = pattern_options.match(self.text, pos)
+            if match:
+                groups = self._groups_from(self.skip_spaces(match.end()), n)
+                if groups is not None:
+                    return match.span(), groups
+        groups = self._groups_from(pos, n)
+        if groups is None:
+            return None
+        return None, groups
+
+    def _groups_from(self, pos, n):
+        groups = []
+        for i in range(n):
+            group = self.groups.get(pos)
+            if group is None:
+                return None
+            groups.append(group)
+            pos = self.skip_spaces(group.end)
+        return groups
+
+    def iter_nodes(self, nodes=None):
+        # depth first, in source order
+        stack = list(reversed(self.root.children if nodes is None else nodes))
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed(node.children))
+
+    def substitute(self, handler):
+        '''
+        Rebuild the text, giving handler(node, render) the chance to replace each node.
+        handler returns None to keep the node (its children are still visited),
+        or (end, replacement) to replace text[node.start:end].
+        render(start, end, children) returns text[start:end] with the children substituted,
+        so a handler can process the inner objects first.
+        '''
+        text = self.text
+
+        def render(start, end, children):
+            pieces = []
+            pos = start
+            for child in children:
+                if child.start < pos or child.end > end:
+                    continue
+                result = handler(child, render)
+                if result is None:
+                    if not child.children:
+                        continue
+                    child_end, replacement = child.end, render(child.start, child.end, child.children)
+                else:
+                    child_end, replacement = result
+                pieces.append(text[pos:child.start])
+                pieces.append(replacement)
+                pos = child_end
+            pieces.append(text[pos:end])
+            return ''.join(pieces)
+
+        return render(0, len(text), self.root.children)
+
+
+@functools.lru_cache(maxsize=16)
+def parse(text):
+    # documents are never modified, so passes that leave the text unchanged can share one
+    return Document(text)
@@ -1,15 +1,74 @@
 #!/usr/bin/env python
 import json
 import requests
+import urllib3
 import time
 import re
+import threading
+import concurrent.futures
 from typing import Optional, List
 import tiktoken
 
+# the system message of every request, it starts the cached prefix of the prompt
+system_message = "You are a precise academic translator specializing in mathematical and technical documents. Your primary directive is absolute faithfulness to the source text. NEVER add, remove, or modify information that is not explicitly part of the translation process. Preserve all formatting, mathematical notation, and technical terms exactly as written. Your role is translation ONLY, not explanation or elaboration."
+
+
+class TokenBudget:
+    """A chunk being filled up to a token budget.
+
+    Every unit is tokenized once when it is added, the tokens of the chunk are the sum of the units.
+    Tokenizing a concatenation may give a few tokens more or less than the sum of its parts,
+    so the whole chunk is tokenized again only when the sum is too close to the budget to decide.
+    The chunks are then the same as when the growing chunk is tokenized at every step.
+    """
+    slack_per_join = 4
+
+    def __init__(self, count_tokens, budget: int):
+        self.count_tokens = count_tokens
+        self.budget = budget
+        self.start("", 0)
+
+    def start(self, text: str, tokens: Optional[int] = None):
+        self.text = text
+        self.tokens = self.count_tokens(text) if tokens is None else tokens  # exact when joins is 0
+        self.joins = 0
+
+    def add(self, unit: str, tokens: int):
+        if not self.text:
+            self.start(unit, tokens)
+            return
+        self.text += unit
+        self.tokens += tokens
+        self.joins += 1
+
+    def fits(self, unit: str, tokens: int) -> bool:
+        """Whether count_tokens(text + unit) is within the budget"""
+        if not self.text:
+            return tokens <= self.budget
+        for exact in (False, True):
+            if exact:
+                if self.joins == 0:
+                    break
+                self.start(self.text)
+            estimate = self.tokens + tokens
+            slack = self.slack_per_join * (self.joins + 1)
+            if estimate + slack <= self.budget:
+                return True
+            if estimate - slack > self.budget:
+                return False
+        return self.count_tokens(self.text + unit) <= self.budget
+
+
 class OpenAITranslator:
+    # packed segments are tagged with their position, the answer is parsed back by ID
+    segment_pattern = re.compile(r'<seg id="(\d+)">(.*?)</seg>', re.DOTALL)
+
     def __init__(self, api_key: str, base_url: str = "https://api.openai.com/v1",
                  model: str = "gpt-3.5-turbo", max_tokens: int = 2000,
-                 temperature: float = 0.3, chunk_size: int = 3000):
+                 temperature: float = 0.3, chunk_size: int = 3000,
+                 stream: bool = False, stall_timeout: float = 20,
+                 max_in_flight_chunks: int = 4, limiter=None, glossary: Optional[dict] = None,
+                 metrics=None):
         # Ensure API key is provided
         if not api_key:
             raise ValueError("OpenAI API key must be provided")
@@ -20,11 +79,32 @@ class OpenAITranslator:
         self.max_tokens = max_tokens
         self.temperature = temperature
         self.chunk_size = chunk_size  # Maximum tokens per chunk
+        # streamed answers have no overall timeout, they are aborted when no token comes for stall_timeout seconds
+        self.stream = stream
+        self.stall_timeout = stall_timeout
+        # the chunks of a long text are sent at the same time, at most max_in_flight_chunks of them for all the texts,
+        # each one waiting for the rate limiter shared with the other requests to the engine when there is one
+        self.max_in_flight_chunks = max_in_flight_chunks
+        self.limiter = limiter
+        self.chunk_executor = None
         self.session = requests.Session()
         self.session.headers.update({
             "Authorization": f"Bearer {api_key}",
             "Content-Type": "application/json"
         })
+        self.lock = threading.Lock()
+        self.number_of_requests = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        # prompt tokens that the provider read from its cache of prompt prefixes
+        self.cached_tokens = 0
+        # one entry per answered request: time to first token, duration, completion tokens and tokens per second
+        self.request_stats: List[dict] = []
+        self.template_token_counts = {}
+        self.glossary = glossary or {}
+        # usage.EngineMetrics that the answered requests are counted in
+        self.metrics = metrics
+        self.prompt_prefixes = {}
 
         # Initialize tokenizer for token counting
         try:
@@ -42,10 +122,19 @@ class OpenAITranslator:
             # Approximate token counting (roughly 4 characters per token)
             return len(text) // 4
 
-    def split_text_into_chunks(self, text: str, target_language: str, source_language: str = "en") -> List[str]:
-        """Split text into chunks that fit within token limits"""
-        # Reserve tokens for the prompt template and overhead
-        prompt_template = f"""You are a professional academic translator. Your task is to translate the following text from {source_language} to {target_language}.
+    prompt_suffix = "\n\nTranslated text (strictly faithful to original):"
+
+    def prompt_prefix(self, target_language: str, source_language: str, extra_requirement: Optional[str] = None) -> str:
+        """Everything of the prompt before the text, the same bytes for every request with the same languages and requirement"""
+        key = (source_language, target_language, extra_requirement)
+        if key not in self.prompt_prefixes:
+            extra_requirement_line = f"\n9. {extra_requirement}" if extra_requirement else ""
+            glossary = ""
+            if self.glossary:
+                # sorted so that the prefix does not depend on the order of the configuration
+                terms = "\n".join(f"- {term}: {self.glossary[term]}" for term in sorted(self.glossary))
+                glossary = f"\n\nGLOSSARY (always translate these terms this way):\n{terms}"
+            self.prompt_prefixes[key] = f"""You are a professional academic translator. Your task is to translate the following text from {source_language} to {target_language}.
 
 CRITICAL REQUIREMENTS:
 1. Translate EXACTLY what is provided - DO NOT add any content that is not in the original text
@@ -55,13 +144,30 @@ CRITICAL REQUIREMENTS:
 5. Maintain the original structure, formatting, and paragraph breaks
 6. Translate ONLY the text content, keeping all non-text elements unchanged
 7. If you encounter ambiguous terms, choose the most literal translation rather than adding explanatory context
+8. SPECIAL INSTRUCTION: Any text that looks like "__MATH_PLACEHOLDER_N__" must be preserved exactly as-is. These are protected mathematical formula markers.{extra_requirement_line}{glossary}
 
 Text to translate:
-{{text}}
-
-Translated text (strictly faithful to original):"""
-
-        template_tokens = self.count_tokens(prompt_template)
+"""
+        return self.prompt_prefixes[key]
+
+    def build_messages(self, text: str, target_language: str, source_language: str, extra_requirement: Optional[str] = None) -> List[dict]:
+        """The messages of a request: the static instructions first, so that providers caching prompt prefixes reuse them, and the text last"""
+        return [
+            {"role": "system", "content": system_message},
+            {"role": "user", "content": self.prompt_prefix(target_language, source_language, extra_requirement) + text + self.prompt_suffix}
+        ]
+
+    def template_tokens(self, target_language: str, source_language: str) -> int:
+        """Tokens of the prompt around the text, counted once per language pair"""
+        key = (source_language, target_language)
+        if key not in self.template_token_counts:
+            self.template_token_counts[key] = self.count_tokens(self.prompt_prefix(target_language, source_language) + self.prompt_suffix)
+        return self.template_token_counts[key]
+
+    def split_text_into_chunks(self, text: str, target_language: str, source_language: str = "en", text_tokens: Optional[int] = None) -> List[str]:
+        """Split text into chunks that fit within token limits"""
+        # Reserve tokens for the prompt template and overhead
+        template_tokens = self.template_tokens(target_language, source_language)
         available_tokens = self.chunk_size - template_tokens - 100  # 100 token safety margin
 
         if available_tokens <= 0:
@@ -69,7 +175,9 @@ Translated text (strictly faithful to original):"""
             available_tokens = 1000
 
         # If text is small enough, return as single chunk
-        if self.count_tokens(text) <= available_tokens:
+        if text_tokens is None:
+            text_tokens = self.count_tokens(text)
+        if text_tokens <= available_tokens:
             return [text]
 
         chunks = []
@@ -81,29 +189,31 @@ Translated text (strictly faithful to original):"""
         sections = re.split(section_pattern, remaining_text)
 
         if len(sections) > 1:
-            current_chunk = ""
+            current_chunk = TokenBudget(self.count_tokens, available_tokens)
             for i, section in enumerate(sections):
+                section_tokens = self.count_tokens(section)
                 if i % 2 == 1:  # This is a section header
-                    if current_chunk and self.count_tokens(current_chunk + section) > available_tokens:
-                        chunks.append(current_chunk.strip())
-                        current_chunk = section
+                    if current_chunk.text and not current_chunk.fits(section, section_tokens):
+                        chunks.append(current_chunk.text.strip())
+                        current_chunk.start(section, section_tokens)
                     else:
-                        current_chunk += section
+                        current_chunk.add(section, section_tokens)
                 else:  # This is section content
-                    if self.count_tokens(current_chunk + section) > available_tokens:
+                    if not current_chunk.fits(section, section_tokens):
                         # Split this section further
                         sub_chunks = self.split_paragraphs(section, available_tokens)
                         for sub_chunk in sub_chunks:
-                            if current_chunk and self.count_tokens(current_chunk + sub_chunk) > available_tokens:
-                                chunks.append(current_chunk.strip())
-                                current_chunk = sub_chunk
+                            sub_chunk_tokens = self.count_tokens(sub_chunk)
+                            if current_chunk.text and not current_chunk.fits(sub_chunk, sub_chunk_tokens):
+                                chunks.append(current_chunk.text.strip())
+                                current_chunk.start(sub_chunk, sub_chunk_tokens)
                             else:
-                                current_chunk += sub_chunk
+                                current_chunk.add(sub_chunk, sub_chunk_tokens)
                     else:
-                        current_chunk += section
+                        current_chunk.add(section, section_tokens)
 
-            if current_chunk:
-                chunks.append(current_chunk.strip())
+            if current_chunk.text:
+                chunks.append(current_chunk.text.strip())
         else:
             # If no sections, split by paragraphs
             chunks = self.split_paragraphs(text, available_tokens)
@@ -114,46 +224,48 @@ Translated text (strictly faithful to original):"""
         """Split text by paragraphs"""
         paragraphs = text.split('\n\n')
         chunks = []
-        current_chunk = ""
+        current_chunk = TokenBudget(self.count_tokens, max_tokens)
+        paragraph_break_tokens = self.count_tokens("\n\n")
+        space_tokens = self.count_tokens(" ")
 
         for paragraph in paragraphs:
-            if self.count_tokens(current_chunk + paragraph) <= max_tokens:
-                if current_chunk:
-                    current_chunk += "\n\n" + paragraph
-                else:
-                    current_chunk = paragraph
+            paragraph_tokens = self.count_tokens(paragraph)
+            if current_chunk.fits(paragraph, paragraph_tokens):
+                if current_chunk.text:
+                    current_chunk.add("\n\n", paragraph_break_tokens)
+                current_chunk.add(paragraph, paragraph_tokens)
             else:
-                if current_chunk:
-                    chunks.append(current_chunk.strip())
+                if current_chunk.text:
+                    chunks.append(current_chunk.text.strip())
 
                 # If single paragraph is too long, split it
-                if self.count_tokens(paragraph) > max_tokens:
+                if paragraph_tokens > max_tokens:
                     sentences = re.split(r'(?<=[.!?])\s+', paragraph)
-                    temp_chunk = ""
+                    temp_chunk = TokenBudget(self.count_tokens, max_tokens)
                     for sentence in sentences:
-                        if self.count_tokens(temp_chunk + sentence) <= max_tokens:
-                            if temp_chunk:
-                                temp_chunk += " " + sentence
-                            else:
-                                temp_chunk = sentence
+                        sentence_tokens = self.count_tokens(sentence)
+                        if temp_chunk.fits(sentence, sentence_tokens):
+                            if temp_chunk.text:
+                                temp_chunk.add(" ", space_tokens)
+                            temp_chunk.add(sentence, sentence_tokens)
                         else:
-                            if temp_chunk:
-                                chunks.append(temp_chunk.strip())
-                            temp_chunk = sentence
+                            if temp_chunk.text:
+                                chunks.append(temp_chunk.text.strip())
+                            temp_chunk.start(sentence, sentence_tokens)
 
-                    if temp_chunk:
-                        current_chunk = temp_chunk
+                    if temp_chunk.text:
+                        current_chunk.start(temp_chunk.text)
                     else:
-                        current_chunk = paragraph
+                        current_chunk.start(paragraph, paragraph_tokens)
                 else:
-                    current_chunk = paragraph
+                    current_chunk.start(paragraph, paragraph_tokens)
 
-        if current_chunk:
-            chunks.append(current_chunk.strip())
+        if current_chunk.text:
+            chunks.append(current_chunk.text.strip())
 
         return chunks
 
-    def translate_chunk(self, chunk: str, target_language: str, source_language: str = "en") -> str:
+    def translate_chunk(self, chunk: str, target_language: str, source_language: str = "en", extra_requirement: Optional[str] = None) -> str:
         """Translate a single chunk using OpenAI API"""
         if not chunk.strip():
             return chunk
@@ -182,53 +294,36 @@ Translated text (strictly faithful to original):"""
             placeholder_map[safe_token] = placeholder
             protected_chunk = protected_chunk.replace(placeholder, safe_token)
 
-        # Construct the prompt with strict faithfulness requirements
-        prompt = f"""You are a professional academic translator. Your task is to translate the following text from {source_language} to {target_language}.
-
-CRITICAL REQUIREMENTS:
-1. Translate EXACTLY what is provided - DO NOT add any content that is not in the original text
-2. DO NOT add explanations, examples, or clarifications that are not in the source
-3. DO NOT omit any information from the original text
-4. Preserve all LaTeX commands, mathematical formulas, and technical notation exactly as they appear
-5. Maintain the original structure, formatting, and paragraph breaks
-6. Translate ONLY the text content, keeping all non-text elements unchanged
-7. If you encounter ambiguous terms, choose the most literal translation rather than adding explanatory context
-8. SPECIAL INSTRUCTION: Any text that looks like "__MATH_PLACEHOLDER_N__" must be preserved exactly as-is. These are protected mathematical formula markers.
-
-Text to translate:
-{protected_chunk}
-
-Translated text (strictly faithful to original):"""
+        payload = {
+            "model": self.model,
+            "messages": self.build_messages(protected_chunk, target_language, source_language, extra_requirement),
+            "max_tokens": self.max_tokens,
+            "temperature": self.temperature
+        }
 
         try:
-            # Make API request with enhanced prompt
-            response = self.session.post(
-                f"{self.base_url}/chat/completions",
-                json={
-                    "model": self.model,
-                    "messages": [
-                        {"role": "system", "content": "You are a precise academic translator specializing in mathematical and technical documents. Your primary directive is absolute faithfulness to the source text. NEVER add, remove, or modify information that is not explicitly part of the translation process. Preserve all formatting, mathematical notation, and technical terms exactly as written. Your role is translation ONLY, not explanation or elaboration."},
-                        {"role": "user", "content": prompt}
-                    ],
-                    "max_tokens": self.max_tokens,
-                    "temperature": self.temperature
-                },
-                timeout=60
-            )
+            start = time.monotonic()
+            if self.stream:
+                translated_text, usage, first_token_at = self.stream_completion(payload, self.count_tokens(protected_chunk))
+            else:
+                # Make API request with enhanced prompt
+                response = self.session.post(f"{self.base_url}/chat/completions", json=payload, timeout=60)
+                response.raise_for_status()
+                data = response.json()
+                usage = data.get("usage") or {}
+                if not ("choices" in data and len(data["choices"]) > 0):
+                    raise ValueError("Invalid response format from OpenAI API")
+                translated_text = data["choices"][0]["message"]["content"]
+                first_token_at = None
+            self.record_request(start, first_token_at, usage, translated_text, len(chunk))
 
-            response.raise_for_status()
-            data = response.json()
+            translated_text = translated_text.strip()
 
-            if "choices" in data and len(data["choices"]) > 0:
-                translated_text = data["choices"][0]["message"]["content"].strip()
+            # Restore original placeholders from protected tokens
+            for safe_token, original_placeholder in placeholder_map.items():
+                translated_text = translated_text.replace(safe_token, original_placeholder)
 
-                # Restore original placeholders from protected tokens
-                for safe_token, original_placeholder in placeholder_map.items():
-                    translated_text = translated_text.replace(safe_token, original_placeholder)
-
-                return translated_text
-            else:
-                raise ValueError("Invalid response format from OpenAI API")
+            return translated_text
 
         except requests.exceptions.RequestException as e:
             error_msg = str(e)
@@ -237,17 +332,111 @@ Translated text (strictly faithful to original):"""
             # Special handling for authentication errors
             if "401" in error_msg or "Unauthorized" in error_msg:
                 print("Authentication error: Please check if your OpenAI API key is correct")
-                # For authentication errors, we shouldn't fall back - we should exit
-                raise
-
-            # Fallback to original text for other API errors
-            return chunk
+            # the caller falls back to another engine or to the original text
+            raise
         except (KeyError, ValueError) as e:
             print(f"Failed to parse OpenAI API response: {e}")
-            return chunk
-        except Exception as e:
-            print(f"Unexpected error during translation: {e}")
-            return chunk
+            raise
+
+    def stream_completion(self, payload: dict, source_tokens: int):
+        """Send the request as a stream of server-sent events and accumulate the deltas of the answer.
+
+        Raises requests.exceptions.Timeout when no token comes for stall_timeout seconds,
+        and ValueError when the answer grows far beyond the source, which means that the model is not translating.
+        """
+        payload = dict(payload, stream=True, stream_options={"include_usage": True})
+        # the answer of a model that adds content is aborted instead of being paid to the end
+        runaway_tokens = 3 * source_tokens + 200
+        parts = []
+        deltas = 0
+        usage = {}
+        first_token_at = None
+        last_token_at = time.monotonic()
+        with self.session.post(f"{self.base_url}/chat/completions", json=payload, stream=True,
+                               timeout=(10, self.stall_timeout)) as response:
+            response.raise_for_status()
+            # server-sent events are UTF-8, requests would decode a text/event-stream without charset as ISO-8859-1
+            response.encoding = "utf-8"
+            lines = response.iter_lines(chunk_size=None, decode_unicode=True)
+            while True:
+                try:
+                    line = next(lines, None)
+                except requests.exceptions.ConnectionError as e:
+                    # requests reports the read timeout of a stream that sends nothing as a connection error
+                    if isinstance(e.args[0] if e.args else None, urllib3.exceptions.ReadTimeoutError):
+                        raise requests.exceptions.Timeout(f"nothing received for {self.stall_timeout} s, the answer stalled") from e
+                    raise
+                if line is None:
+                    break
+                now = time.monotonic()
+                # keep-alive comments reset the socket timeout but are not tokens
+                if now - last_token_at > self.stall_timeout:
+                    raise requests.exceptions.Timeout(f"no token for {self.stall_timeout} s, the answer stalled")
+                if not line or not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                event = json.loads(data)
+                if "error" in event:
+                    raise ValueError(f"OpenAI API error in stream: {event['error']}")
+                if event.get("usage"):
+                    usage = event["usage"]
+                for choice in event.get("choices") or []:
+                    content = (choice.get("delta") or {}).get("content")
+                    if content:
+                        if first_token_at is None:
+                            first_token_at = now
+                        last_token_at = now
+                        parts.append(content)
+                        # servers send about one token per delta
+                        deltas += 1
+                if deltas > runaway_tokens:
+                    raise ValueError(f"the answer is longer than {runaway_tokens} tokens for {source_tokens} tokens of source, aborted")
+        if first_token_at is None:
+            raise ValueError("Empty streamed answer from OpenAI API")
+        return "".join(parts), usage, first_token_at
+
+    def record_request(self, start: float, first_token_at: Optional[float], usage: dict, answer: str, characters: int = 0):
+        """Count the tokens of an answered request and keep its timings"""
+        duration = time.monotonic() - start
+        completion_tokens = usage.get("completion_tokens") or self.count_tokens(answer)
+        cached_tokens = (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+        # tokens per second of the generation, after the first token when it is known
+        generation = duration - (first_token_at - start) if first_token_at is not None else duration
+        with self.lock:
+            self.number_of_requests += 1
+            self.prompt_tokens += usage.get("prompt_tokens", 0)
+            self.completion_tokens += usage.get("completion_tokens", 0)
+            self.cached_tokens += cached_tokens
+            self.request_stats.append({
+                "model": self.model,
+                "base_url": self.base_url,
+                "stream": self.stream,
+                "time_to_first_token": first_token_at - start if first_token_at is not None else None,
+                "duration": duration,
+                "completion_tokens": completion_tokens,
+                "cached_tokens": cached_tokens,
+                "tokens_per_second": completion_tokens / generation if generation > 0 else None,
+            })
+        if self.metrics is not None:
+            self.metrics.on_request(duration, characters=characters, prompt_tokens=usage.get("prompt_tokens", 0),
+                                    completion_tokens=usage.get("completion_tokens", 0), cached_tokens=cached_tokens)
+
+    def throughput_stats(self) -> dict:
+        """Averages over the answered requests: time to first token (streaming only), duration and tokens per second"""
+        with self.lock:
+            stats = list(self.request_stats)
+        first_tokens = [s["time_to_first_token"] for s in stats if s["time_to_first_token"] is not None]
+        speeds = [s["tokens_per_second"] for s in stats if s["tokens_per_second"] is not None]
+        return {
+            "model": self.model,
+            "base_url": self.base_url,
+            "requests": len(stats),
+            "time_to_first_token": sum(first_tokens) / len(first_tokens) if first_tokens else None,
+            "duration": sum(s["duration"] for s in stats) / len(stats) if stats else None,
+            "tokens_per_second": sum(speeds) / len(speeds) if speeds else None,
+        }
 
     def translate(self, text: str, target_language: str, source_language: str = "en") -> str:
         """Translate text using OpenAI API with chunking support"""
@@ -255,27 +444,29 @@ Translated text (strictly faithful to original):"""
             return text
 
         # Check if text needs to be chunked
-        if self.count_tokens(text) <= self.chunk_size:
+        text_tokens = self.count_tokens(text)
+        if text_tokens <= self.chunk_size:
             # Small text, translate directly
-            return self.translate_chunk(text, target_language, source_language)
+            return self.send_request(self.translate_chunk, text, target_language, source_language)
 
         # Large text, split into chunks and translate
-        print(f"Text too large ({self.count_tokens(text)} tokens), splitting into chunks...")
-        chunks = self.split_text_into_chunks(text, target_language, source_language)
+        print(f"Text too large ({text_tokens} tokens), splitting into chunks...")
+        chunks = self.split_text_into_chunks(text, target_language, source_language, text_tokens)
         print(f"Split into {len(chunks)} chunks")
 
-        translated_chunks = []
         total_chunks = len(chunks)
-
-        for i, chunk in enumerate(chunks):
-            print(f"Translating chunk {i+1}/{total_chunks}...")
-
-            # Add delay to avoid rate limiting
-            if i > 0:
-                time.sleep(1)
-
-            translated_chunk = self.translate_chunk(chunk, target_language, source_language)
-            translated_chunks.append(translated_chunk)
+        with self.lock:
+            if self.chunk_executor is None:
+                self.chunk_executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_in_flight_chunks)
+        futures = [self.chunk_executor.submit(self.send_chunk, chunk, target_language, source_language, i, total_chunks)
+                   for i, chunk in enumerate(chunks)]
+        try:
+            # in the order of the text, whatever the order in which they are answered
+            translated_chunks = [future.result() for future in futures]
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
 
         # Combine translated chunks
         result = "\n\n".join(translated_chunks)
@@ -283,6 +474,86 @@ Translated text (strictly faithful to original):"""
 
         return result
 
+    def send_chunk(self, chunk: str, target_language: str, source_language: str, index: int, total_chunks: int) -> str:
+        """Translate one chunk of a long text"""
+        print(f"Translating chunk {index+1}/{total_chunks}...")
+        return self.send_request(self.translate_chunk, chunk, target_language, source_language)
+
+    def send_request(self, function, *args, **kwargs):
+        """Send one request when the rate limiter lets it, throttled requests are retried after a backoff.
+        Every request of the translator goes through here, so the engine does not wait for the limiter or retry again around it."""
+        if self.limiter is None:
+            return function(*args, **kwargs)
+        attempt = 0
+        while True:
+            sent_at = self.limiter.acquire()
+            try:
+                result = function(*args, **kwargs)
+            except requests.exceptions.RequestException as e:
+                throttled = self.is_error_request_frequency(e)
+                if throttled and self.metrics is not None:
+                    self.metrics.on_throttle(retried=attempt < self.limiter.max_retries)
+                if not throttled or attempt >= self.limiter.max_retries:
+                    raise
+                self.limiter.on_throttle(sent_at)
+                time.sleep(self.limiter.backoff(attempt))
+                attempt += 1
+                continue
+            self.limiter.on_success()
+            return result
+
+    def is_error_request_frequency(self, e) -> bool:
+        return isinstance(e, requests.HTTPError) and e.response is not None and e.response.status_code == 429
+
+    def close(self):
+        if self.chunk_executor is not None:
+            self.chunk_executor.shutdown(wait=False)
+        self.session.close()
+
+    def pack_segments(self, texts: List[str]) -> List[List[int]]:
+        """Group the segments into requests, the positions of the segments of each request are returned"""
+        # the translation of a request has to fit in max_tokens as well, and is usually longer than the source
+        budget = min(self.chunk_size, self.max_tokens) // 2
+        packs = []
+        pack = []
+        tokens = 0
+        for i, text in enumerate(texts):
+            text_tokens = self.count_tokens(text) + 10  # the tag around it
+            if pack and tokens + text_tokens > budget:
+                packs.append(pack)
+                pack = []
+                tokens = 0
+            pack.append(i)
+            tokens += text_tokens
+        if pack:
+            packs.append(pack)
+        return packs
+
+    def translate_batch(self, texts: List[str], target_language: str, source_language: str = "en") -> List[str]:
+        """Translate several segments per request, each tagged with its ID, the ones missing from the answer are translated alone"""
+        results: List[Optional[str]] = [None] * len(texts)
+        for pack in self.pack_segments(texts):
+            if len(pack) == 1:
+                results[pack[0]] = self.translate(texts[pack[0]], target_language, source_language)
+                continue
+            packed = "\n".join(f'<seg id="{i}">{texts[i]}</seg>' for i in pack)
+            # the same for every batch, so that it stays in the cached prefix of the prompt
+            requirement = 'The text consists of independent segments, each one inside <seg id="N"> and </seg>. Translate each segment separately and keep every tag with its id exactly as-is, one segment per tag.'
+            translated = self.send_request(self.translate_chunk, packed, target_language, source_language, extra_requirement=requirement)
+            found = {}
+            for segment_id, segment in self.segment_pattern.findall(translated):
+                found.setdefault(int(segment_id), segment.strip())
+            for i in pack:
+                # an empty segment means that the model merged it with another one
+                if found.get(i):
+                    results[i] = found[i]
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            print(f"Warning: {len(missing)} of {len(texts)} segments did not come back with their ID, translating them one by one")
+            for i in missing:
+                results[i] = self.translate(texts[i], target_language, source_language)
+        return results
+
     def __call__(self, text: str, target_language: str, source_language: str = "en") -> str:
         """Make the translator callable"""
         return self.translate(text, target_language, source_language)
\ No newline at end of file
@@ -0,0 +1,54 @@
+'''
+Process-wide registry of compiled regular expressions.
+
+Every distinct pattern is compiled the first time it is requested and kept for the rest of the process.
+Plain patterns are keyed by (engine, source, flags), pattern families such as `command_full` are
+registered once with a builder and keyed by (engine, name, arguments, flags).
+`registry.hits` and `registry.misses` count the lookups: once the first paragraph is done,
+a run should only add hits, otherwise something compiles on a hot path.
+Patterns used on every paragraph or object should still be fetched once into module constants.
+'''
+import re
+import threading
+import regex
+
+
+class PatternRegistry:
+    def __init__(self):
+        self._patterns = {}
+        self._families = {}  # name -> (builder, flags, engine)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def register(self, name, builder, flags=0, engine=regex):
+        # builder(*args) returns the source of the pattern
+        self._families[name] = (builder, flags, engine)
+
+    def compile(self, source, flags=0, engine=re):
+        return self._lookup((engine.__name__, source, flags), lambda: engine.compile(source, flags))
+
+    def get(self, name, *args, flags=None):
+        builder, default_flags, engine = self._families[name]
+        if flags is None:
+            flags = default_flags
+        return self._lookup((engine.__name__, name, args, flags), lambda: engine.compile(builder(*args), flags))
+
+    def _lookup(self, key, build):
+        compiled = self._patterns.get(key)
+        if compiled is not None:
+            self.hits += 1  # not locked, may undercount a little with many threads
+            return compiled
+        with self._lock:
+            compiled = self._patterns.get(key)
+            if compiled is None:
+                self.misses += 1
+                compiled = self._patterns[key] = build()
+            return compiled
+
+    def stats(self):
+        return {'patterns': len(self._patterns), 'hits': self.hits, 'misses': self.misses}
+
+
+registry = PatternRegistry()
+compile = registry.compile
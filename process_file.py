@@ -371,8 +371,10 @@ def generate_bbl_from_bib(tex_path):
         return False
 
     bib_name = bib_match.group(1)
-    bib_path = f'{bib_name}.bib'
-    bbl_path = f'{bib_name}.bbl'
+    # the bibliography is looked up next to the tex file and bibtex runs there
+    tex_dir = os.path.dirname(os.path.abspath(tex_path))
+    bib_path = os.path.join(tex_dir, f'{bib_name}.bib')
+    bbl_path = os.path.join(tex_dir, f'{bib_name}.bbl')
 
     # Check if .bib file exists
     if not os.path.exists(bib_path):
@@ -391,20 +393,20 @@ def generate_bbl_from_bib(tex_path):
         # Create a minimal aux file to run bibtex
         aux_content = '\\relax\n' + '\\citation{*}\n' + f'\\bibdata{{{bib_name}}}\n' + '\\bibstyle{plain}\n'
 
-        with open(f'{bib_name}.aux', 'w', encoding='utf-8') as f:
+        with open(os.path.join(tex_dir, f'{bib_name}.aux'), 'w', encoding='utf-8') as f:
             f.write(aux_content)
 
         # Run bibtex
-        result = subprocess.run(['bibtex', f'{bib_name}.aux'],
+        result = subprocess.run(['bibtex', f'{bib_name}.aux'], cwd=tex_dir,
                               capture_output=True, text=True, timeout=30)
 
         # Check if .bbl was generated
-        if os.path.exists(f'{bib_name}.bbl'):
+        if os.path.exists(bbl_path):
             print(f'Successfully generated {bib_name}.bbl from {bib_name}.bib')
 
             # Clean up aux files
             for ext in ['.aux', '.blg', '.log']:
-                temp_file = f'{bib_name}{ext}'
+                temp_file = os.path.join(tex_dir, f'{bib_name}{ext}')
                 if os.path.exists(temp_file):
                     try:
                         os.remove(temp_file)
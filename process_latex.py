@@ -1,5 +1,8 @@
 import re
+import functools
 import regex
+import latex_lexer
+import patterns
 from config import config
 
 math_code = config.math_code
@@ -32,9 +35,11 @@ def get_pattern_command_full(name, n=None):
     return pattern
 
 
+patterns.registry.register('command_full', get_pattern_command_full, regex.DOTALL)
+patterns.registry.register('env', get_pattern_env, regex.DOTALL)
+
 match_command_name = r'[a-zA-Z]+\*?'
 
-pattern_env = get_pattern_env(r'.*?')  # \begin{xxx} \end{xxx}, group 1: name, group 2: option, group 3: content
 pattern_command_full = get_pattern_command_full(match_command_name)   # \xxx[xxx]{xxx} and \xxx{xxx}, group 1: name, group 2: option, group 4: content
 pattern_command_simple = rf'\\({match_command_name})'  # \xxx, group 1: name
 pattern_brace = get_pattern_brace(0)  # {xxx}, group 1: content
@@ -45,6 +50,15 @@ pattern_set2 = rf'\\set[a-zA-Z]*{spaces}\{{\\[a-zA-Z]+\}}{spaces}\{{.*?\}}'
 pattern_theorem = r"\\newtheorem[ \t]*\{(.+?)\}"  # \newtheorem{xxx}, group 1: name
 pattern_accent = r"\\([`'\"^~=.])(?:\{([a-zA-Z])\}|([a-zA-Z]))"  # match special characters with accents, group 1: accent, group 2/3: normal character
 match_code_accent = rf'{math_code}([A-Z]{{2}})([a-zA-Z])'  # group 1: accent name, group 2: normal character, e.g. \"o or \"{o}
+# compiled once, these run on every paragraph or every object
+compiled_code = patterns.compile(match_code)
+compiled_code_replace = patterns.compile(match_code_replace)
+compiled_code_any_case = patterns.compile(match_code, re.IGNORECASE)  # translators sometimes change the case of the codes
+compiled_underscore = patterns.compile(r"(?<!\\)_")
+compiled_translation_note = patterns.compile(r'\s*\(strictly faithful to original\):?\s*')
+compiled_table = patterns.compile(r'\\begin{(tabular|tabularx|longtable|tabulary|array)}{([^}]*)}')
+compiled_line_break = patterns.compile(r'\n(\s*([^\s]+))')
+
 list_special = ['\\', '%', '&', '#', '$', '{', '}', ' ']  # all special characters in form of \x
 
 special_character_forward = {
@@ -85,11 +99,48 @@ def variable_code(count):
     return f'{math_code}_{count_str}'
 
 
+def canonicalize_codes(text):
+    '''
+    Renumber the variable codes in order of appearance, so that texts which only differ in the numbering of their objects are the same
+    Returns the renumbered text and the original codes, the i-th of them became variable_code(i)
+    '''
+    codes = {}
+
+    def replace_function(match):
+        code = match.group(1)
+        if code not in codes:
+            codes[code] = variable_code(len(codes))
+        return codes[code]
+
+    text = compiled_code.sub(replace_function, text)
+    return text, list(codes)
+
+
+def renumber_codes(text, mapping):
+    '''
+    Replace every variable code of text (in any case) by mapping[code]
+    Returns None if text contains a code that is not in mapping
+    '''
+    unknown = []
+
+    def replace_function(match):
+        code = match.group(1).upper()
+        if code not in mapping:
+            unknown.append(code)
+            return code
+        return mapping[code]
+
+    text = compiled_code_any_case.sub(replace_function, text)
+    if unknown:
+        return None
+    return text
+
+
 def modify_text(text, modify_func):
     # modify text without touching the variable codes
-    split_text = [s for s in re.split(match_code, text) if s is not None]
+    split_text = [s for s in compiled_code.split(text) if s is not None]
     for i in range(len(split_text)):
-        if not re.match(match_code, split_text[i]):
+        if not compiled_code.match(split_text[i]):
             split_text[i] = modify_func(split_text[i])
     text = "".join(split_text)
     return text
@@ -105,11 +156,24 @@ def modify_before(text):
 
 def modify_after(text):
     # the "_" in the text should be replaced to "\_"
-    pattern = r"(?<!\\)_"
-    text = re.sub(pattern, r"\\_", text)
+    text = compiled_underscore.sub(r"\\_", text)
     return text
 
 
+# objects that do not depend on the configuration, in the order they are masked
+latex_math_regex = [
+    r"\$\$(.*?)\$\$",  # $$ $$
+    r"\$(.*?)\$",  # $ $
+    r"\\\[(.*?)\\\]",  # \[ xxx \]
+    r"\\\((.*?)\\\)",  # \( xxx \)
+]
+# \begin{xxx} \end{xxx} are masked in between, see mask_environments
+latex_obj_regex = latex_math_regex + [
+    pattern_set1,
+    pattern_set2,
+]
+
+
 def replace_latex_objects(text, brace=True, command_simple=True):
     r"""
     Replaces all LaTeX objects in a given text with the format "{math_code}_{digit1}_{digit2}_..._{digit_last}",
@@ -121,52 +185,181 @@ def replace_latex_objects(text, brace=True, command_simple=True):
     """
 
     # You need to make sure that the input does not contain {math_code}
-    # define regular expressions for each LaTeX object
-    patterns_mularg_command = [get_pattern_command_full(name, n) for name, n, index in config.mularg_command_list]
-    latex_obj_regex = [
-        r"\$\$(.*?)\$\$",  # $$ $$
-        r"\$(.*?)\$",  # $ $
-        r"\\\[(.*?)\\\]",  # \[ xxx \]
-        r"\\\((.*?)\\\)",  # \( xxx \)
-        pattern_env,  # \begin{xxx} \end{xxx}
-        pattern_set1,
-        pattern_set2,
-    ] + patterns_mularg_command + [pattern_command_full]  # \xxx[xxx]{xxx}
-    if brace:
-        latex_obj_regex.append(pattern_brace)
-    if command_simple:
-        latex_obj_regex.append(pattern_command_simple)  # \xxx
-
     # iterate through each LaTeX object and replace with "{math_code}_{digit1}_{digit2}_..._{digit_last}"
-    count = 0
+    mularg_commands = tuple((name, n) for name, n, index in config.mularg_command_list)
     replaced_objs = []
-    for regex_symbol in latex_obj_regex:
-        pattern = regex.compile(regex_symbol, regex.DOTALL)
-        while pattern.search(text):
-            latex_obj = pattern.search(text).group()
-            replaced_objs.append(latex_obj)
-            text = pattern.sub(variable_code(count), text, 1)
-            count += 1
+    obj_patterns = get_latex_obj_patterns(mularg_commands, brace, command_simple)
+    for pattern in obj_patterns[:len(latex_math_regex)]:
+        text = mask_pattern(pattern, text, replaced_objs)
+    text = mask_environments(text, replaced_objs)
+    for pattern in obj_patterns[len(latex_math_regex):]:
+        text = mask_pattern(pattern, text, replaced_objs)
 
     text = modify_text(text, modify_before)
     return text, replaced_objs
 
 
+@functools.lru_cache(maxsize=None)
+def get_latex_obj_patterns(mularg_commands, brace, command_simple):
+    # define regular expressions for each LaTeX object, in the order they are masked
+    compiled = [patterns.compile(regex_symbol, regex.DOTALL, regex) for regex_symbol in latex_obj_regex]
+    compiled += [patterns.registry.get('command_full', name, n) for name, n in mularg_commands]
+    compiled.append(patterns.registry.get('command_full', match_command_name))  # \xxx[xxx]{xxx}
+    if brace:
+        compiled.append(patterns.compile(pattern_brace, regex.DOTALL, regex))
+    if command_simple:
+        compiled.append(patterns.compile(pattern_command_simple, regex.DOTALL, regex))  # \xxx
+    return tuple(compiled)
+
+
+def mask_pattern(pattern, text, replaced_objs):
+    '''
+    Replace every match of `pattern` by the next variable code in a single left-to-right scan,
+    appending the matched objects to `replaced_objs`.
+    If masking made a new match appear (e.g. "\\" followed by a code), the matches are masked again
+    one at a time from the start of the text, so that the codes are numbered as they always were.
+    '''
+    count = len(replaced_objs)
+    pieces = []
+    last = 0
+    for match in pattern.finditer(text):
+        start, end = match.span()
+        pieces.append(text[last:start])
+        pieces.append(variable_code(len(replaced_objs)))
+        replaced_objs.append(match.group())
+        last = end
+    if not pieces:
+        return text
+    pieces.append(text[last:])
+    masked = ''.join(pieces)
+    if not pattern.search(masked):
+        return masked
+    del replaced_objs[count:]
+    while True:
+        match = pattern.search(text)
+        if not match:
+            return text
+        replaced_objs.append(match.group())
+        text = text[:match.start()] + variable_code(len(replaced_objs) - 1) + text[match.end():]
+
+
+def mask_environments(text, replaced_objs):
+    '''
+    Replace every outermost \\begin{xxx} \\end{xxx} by the next variable code, appending the environments to `replaced_objs`.
+    The environments are the ones of the latex_lexer tree, as in process_objects, so that an environment nested
+    in another one with the same name stays inside it instead of closing it.
+    '''
+    if '\\begin' not in text:
+        return text
+    document = latex_lexer.parse(text)
+
+    def process_function(node, render):
+        if node.kind != 'env':
+            return None
+        replaced_objs.append(text[node.start:node.end])
+        return node.end, variable_code(len(replaced_objs) - 1)
+    return document.substitute(process_function)
+
+
+@functools.lru_cache(maxsize=1024)
+def resize_wide_table(content):
+    # Handle wide tables automatically, the same object is often recovered many times so the result is cached
+    # Check if this is a table environment (tabular, tabularx, longtable, tabulary)
+    table_match = compiled_table.search(content)
+    if table_match:
+        env_name = table_match.group(1)
+        col_spec = table_match.group(2)
+        # Count number of columns, ignoring vertical lines and spaces
+        # Column spec patterns: single char (l/c/r) or paragraph spec (p{...}/m{...}/b{...})
+        col_pattern = patterns.compile(r'([lcr]|p\{[^}]*\}|m\{[^}]*\}|b\{[^}]*\})')
+        cleaned_col_spec = patterns.compile(r'[|\s]').sub('', col_spec)
+        num_cols = len(col_pattern.findall(cleaned_col_spec))
+        # Fallback to string length if regex doesn't match (unusual case)
+        if num_cols == 0:
+            num_cols = len(cleaned_col_spec)
+
+        # For wide tables (more than 6 columns), make them smaller with progressive sizing
+        if num_cols > 6:
+            # Determine font size and tab spacing based on number of columns
+            if num_cols <= 10:
+                font_command = r'\\small'
+                tab_spacing = r'\\setlength{\\tabcolsep}{0.4em}'
+            elif num_cols <= 20:
+                font_command = r'\\footnotesize'
+                tab_spacing = r'\\setlength{\\tabcolsep}{0.3em}'
+            elif num_cols <= 25:  # 21-25 columns - very wide
+                font_command = r'\\tiny'
+                tab_spacing = r'\\setlength{\\tabcolsep}{0.1em}'
+            else:  # 25+ columns - extreme case
+                font_command = r'\\tiny'
+                tab_spacing = r'\\setlength{\\tabcolsep}{0.05em}'
+
+            # Create the full command we want to add
+            full_table_command = font_command + tab_spacing + r'\\begin{' + env_name + r'}'
+
+            # Check if we've already added our full command
+            has_full_command = full_table_command in content
+
+            # Check if we already have any font or spacing commands in front of begin{tabular}
+            # This prevents repeated additions
+            has_commands_before_begin = bool(patterns.compile(r'\\(small|footnotesize|scriptsize|tiny|setlength).*?\\begin{' + env_name + r'}').search(content))
+
+            # Check if we already have resizebox
+            has_resizebox = r'\\resizebox' in content
+
+            if not has_full_command and not has_commands_before_begin and not has_resizebox:
+                # Check if any font command is already present (with optional whitespace)
+                font_command_regex = patterns.compile(r'\\(small|footnotesize|scriptsize|tiny)\s*')
+                has_font = bool(font_command_regex.search(content))
+
+                # Check if tab spacing is already present
+                has_tab_spacing = r'\\setlength{\\tabcolsep}' in content
+
+                # First apply font and spacing changes
+                if has_tab_spacing:
+                    # If there's already tab spacing, just add the font command before begin{tabular}
+                    # Replace the begin{tabular} command with font command + begin{tabular}
+                    content = patterns.compile(r'\\begin{' + env_name + r'}').sub(font_command + r'\\begin{' + env_name + r'}', content)
+                    # And reduce the tab spacing to our smaller value
+                    content = patterns.compile(r'\\setlength{\\tabcolsep}{(.*?)em}').sub(tab_spacing, content)
+                else:
+                    # If no tab spacing, add both font command and tab spacing
+                    content = patterns.compile(r'\\begin{' + env_name + r'}').sub(full_table_command, content)
+
+                # Now wrap the entire tabular environment in resizebox for wide tables
+                # We'll do this for tables with 7 or more columns to handle wide content
+                if num_cols >= 7:
+                    # Find and wrap the entire tabular environment in resizebox
+                    tabular_pattern = patterns.compile(r'\\begin{' + env_name + r'}(.*?)\\end{' + env_name + r'}', re.DOTALL)
+                    content = tabular_pattern.sub(r'\\resizebox{\\textwidth}{!}{\\begin{' + env_name + r'}\g<1>\\end{' + env_name + r'}}', content)
+
+    return content
+
+
 def recover_latex_objects(text, replaced_objs, tolerate_error=False):
     # recover the latex objects from "replace_latex_objects"
+    # an object can only contain the codes of objects replaced before it, so every object is
+    # recovered once, inner objects first, and the text is scanned a single time
     nobjs = len(replaced_objs)
     matched_indices = set()
-
-    def get_obj(digit_str):
-        index = int(''.join(digit_str.split('_')))
-
-        # Check if this is the first time we're processing this object
-        is_first_process = index not in matched_indices
-
-        # Always record that we processed this object
-        matched_indices.add(index)
-
-        if index < nobjs:
+    recovered = {}  # index -> (recovered object, indices of the objects inside it)
+    recovering = []  # objects being recovered, innermost last
+    found = [matched_indices]  # where the indices of the codes being replaced are recorded
+
+    def get_obj(match):
+        index = int(match.group(1).replace('_', ''))
+        indices = found[-1]
+        indices.add(index)
+        if index in recovered:
+            content, inner_indices = recovered[index]
+        elif index >= nobjs:
+            if test_environment:
+                assert tolerate_error
+            return '???'
+        elif index in recovering:
+            # an object containing its own code is left as it is
+            return match.group(0)
+        else:
             # Remove translation quality note from inside LaTeX commands
             content = replaced_objs[index]
 
@@ -177,101 +370,28 @@ def recover_latex_objects(text, replaced_objs, tolerate_error=False):
                 content = content.replace("（严格忠实于原文的翻译：）", "").strip()
 
             # Remove English translation note
-            import re
-            content = re.sub(r'\s*\(strictly faithful to original\):?\s*', '', content)
-
-            # Handle wide tables automatically - only once per object
-            import re
-            if is_first_process:
-                # Check if this is a table environment (tabular, tabularx, longtable, tabulary)
-                table_pattern = r'\\begin{(tabular|tabularx|longtable|tabulary|array)}{([^}]*)}'
-                table_match = re.search(table_pattern, content)
-                if table_match:
-                    env_name = table_match.group(1)
-                    col_spec = table_match.group(2)
-                    # Count number of columns, ignoring vertical lines and spaces
-                    import re
-                    # Column spec patterns: single char (l/c/r) or paragraph spec (p{...}/m{...}/b{...})
-                    col_pattern = r'([lcr]|p\{[^}]*\}|m\{[^}]*\}|b\{[^}]*\})'
-                    cleaned_col_spec = re.sub(r'[|\s]', '', col_spec)
-                    num_cols = len(re.findall(col_pattern, cleaned_col_spec))
-                    # Fallback to string length if regex doesn't match (unusual case)
-                    if num_cols == 0:
-                        num_cols = len(cleaned_col_spec)
-
-                    # For wide tables (more than 6 columns), make them smaller with progressive sizing
-                    if num_cols > 6:
-                        # Determine font size and tab spacing based on number of columns
-                        if num_cols <= 10:
-                            font_command = r'\\small'
-                            tab_spacing = r'\\setlength{\\tabcolsep}{0.4em}'
-                        elif num_cols <= 20:
-                            font_command = r'\\footnotesize'
-                            tab_spacing = r'\\setlength{\\tabcolsep}{0.3em}'
-                        elif num_cols <= 25:  # 21-25 columns - very wide
-                            font_command = r'\\tiny'
-                            tab_spacing = r'\\setlength{\\tabcolsep}{0.1em}'
-                        else:  # 25+ columns - extreme case
-                            font_command = r'\\tiny'
-                            tab_spacing = r'\\setlength{\\tabcolsep}{0.05em}'
-
-                        # Create the full command we want to add
-                        full_table_command = font_command + tab_spacing + r'\\begin{' + env_name + r'}'
-
-                        # Check if we've already added our full command
-                        import re
-                        has_full_command = full_table_command in content
-
-                        # Check if we already have any font or spacing commands in front of begin{tabular}
-                        # This prevents repeated additions
-                        has_commands_before_begin = bool(re.search(r'\\(small|footnotesize|scriptsize|tiny|setlength).*?\\begin{' + env_name + r'}', content))
-
-                        # Check if we already have resizebox
-                        has_resizebox = r'\\resizebox' in content
-
-                        if not has_full_command and not has_commands_before_begin and not has_resizebox:
-                            # Check if any font command is already present (with optional whitespace)
-                            font_command_regex = re.compile(r'\\(small|footnotesize|scriptsize|tiny)\s*')
-                            has_font = bool(font_command_regex.search(content))
-
-                            # Check if tab spacing is already present
-                            has_tab_spacing = r'\\setlength{\\tabcolsep}' in content
-
-                            # First apply font and spacing changes
-                            if has_tab_spacing:
-                                # If there's already tab spacing, just add the font command before begin{tabular}
-                                # Replace the begin{tabular} command with font command + begin{tabular}
-                                content = re.sub(r'\\begin{' + env_name + r'}', font_command + r'\\begin{' + env_name + r'}', content)
-                                # And reduce the tab spacing to our smaller value
-                                content = re.sub(r'\\setlength{\\tabcolsep}{(.*?)em}', tab_spacing, content)
-                            else:
-                                # If no tab spacing, add both font command and tab spacing
-                                content = re.sub(r'\\begin{' + env_name + r'}', full_table_command, content)
-
-                            # Now wrap the entire tabular environment in resizebox for wide tables
-                            # We'll do this for tables with 7 or more columns to handle wide content
-                            if num_cols >= 7:
-                                # Find and wrap the entire tabular environment in resizebox
-                                import re
-                                tabular_pattern = re.compile(r'\\begin{' + env_name + r'}(.*?)\\end{' + env_name + r'}', re.DOTALL)
-                                content = tabular_pattern.sub(r'\\resizebox{\\textwidth}{!}{\\begin{' + env_name + r'}\g<1>\\end{' + env_name + r'}}', content)
-
-            modified_content = content
-            return modified_content
-        else:
-            if test_environment:
-                assert tolerate_error
-            return '???'
+            if "(strictly faithful to original)" in content:
+                content = compiled_translation_note.sub('', content)
+
+            if '\\begin' in content:
+                content = resize_wide_table(content)
+
+            # recover the objects inside, each of them is only done once
+            inner_indices = set()
+            if math_code in content:
+                recovering.append(index)
+                found.append(inner_indices)
+                content = compiled_code_replace.sub(get_obj, content)
+                found.pop()
+                recovering.pop()
+            recovered[index] = content, inner_indices
+        if inner_indices:
+            indices.update(inner_indices)
+        return content
 
     text = modify_text(text, modify_after)
-    pattern = re.compile(match_code_replace)
+    text = compiled_code_replace.sub(get_obj, text)
     # count number of mismatch
-    total_num = 0
-    while True:
-        text, num_modify = pattern.subn(lambda match: get_obj(match.group(1)), text)
-        total_num += num_modify
-        if num_modify == 0:
-            break
     n_good = len(set(matched_indices).intersection(set(range(nobjs))))
     n_bad1 = len(matched_indices) - n_good
     n_bad2 = nobjs - n_good
@@ -292,8 +412,8 @@ def remove_tex_comments(text):
     """
     text = text.replace(r'\\', f'{math_code}_BLACKSLASH')
     text = text.replace(r'\%', f'{math_code}_PERCENT')
-    text = re.sub(r"\n\s*%.*?(?=\n)", "", text)
-    text = re.sub(r"%.*?(?=\n)", "", text)
+    text = patterns.compile(r"\n\s*%.*?(?=\n)").sub("", text)
+    text = patterns.compile(r"%.*?(?=\n)").sub("", text)
     text = text.replace(f'{math_code}_PERCENT', r'\%')
     text = text.replace(f'{math_code}_BLACKSLASH', r'\\')
 
@@ -315,80 +435,108 @@ def split_latex_document(text, begin_code, end_code):
     return body, pre, post
 
 
+def process_objects(latex, function, env_names=(), command_names=(), mularg_commands=()):
+    # one traversal for all objects to translate, inner objects first
+    # \begin{env_name}[options] content \end{env_name} -> content replaced by `function(content)`
+    # \{command_name}[options]{content} -> content replaced by `function(content)`
+    # \{command_name}{content1}{content2}... -> the arguments to translate replaced by `function(content)`
+    env_names = set(env_names)
+    command_names = set(command_names)
+    mularg_commands = {command_name: (nargs, args_to_translate) for command_name, nargs, args_to_translate in mularg_commands}
+    if '\\' not in latex:
+        return latex
+    document = latex_lexer.parse(latex)
+
+    def process_env(node, render):
+        options = document.slice(node.options)
+        content = render(node.body_start, node.body_end, node.children)
+        processed_content = function(content)
+        return node.end, rf'\begin{{{node.name}}}{options}{processed_content}\end{{{node.name}}}'
+
+    def process_command(node, render):
+        arguments = document.command_arguments(node)
+        if arguments is None:
+            return None
+        options, (group, ) = arguments
+        options = document.slice(options)
+        content = render(group.body_start, group.body_end, group.children)
+        processed_content = function(content)
+        return group.end, rf'\{node.name}{options}{{{processed_content}}}'
+
+    def process_mularg_command(node, render):
+        nargs, args_to_translate = mularg_commands[node.name]
+        arguments = document.command_arguments(node, n=nargs, with_options=False)
+        if arguments is None:
+            return None
+        _, groups = arguments
+        contents = []
+        for i, group in enumerate(groups):
+            content = render(group.body_start, group.body_end, group.children)
+            if i in args_to_translate:
+                content = function(content)
+            contents.append(content)
+        return groups[-1].end if groups else node.end, rf'\{node.name}' + ''.join([rf'{{{content}}}' for content in contents])
+
+    def process_function(node, render):
+        if node.kind == 'env' and node.name in env_names:
+            return process_env(node, render)
+        if node.kind != 'command':
+            return None
+        result = None
+        if node.name in command_names:
+            result = process_command(node, render)
+        if result is None and node.name in mularg_commands:
+            result = process_mularg_command(node, render)
+        return result
+    return document.substitute(process_function)
+
+
 def process_specific_env(latex, function, env_name):
     # find all patterns of \begin{env_name}[options] content \end{env_name}
     # then replace `content` by `function(content)`
-    pattern = regex.compile(get_pattern_env(env_name), regex.DOTALL)
-
-    def process_function(match):
-        name = match.group(1)
-        assert re.match(env_name, name)
-        options = match.group(2)
-        if options is None:
-            options = ''
-        content = match.group(3)
-        processed_content = function(content)
-        return rf'\begin{{{env_name}}}{options}{processed_content}\end{{{env_name}}}'
-    return pattern.sub(process_function, latex)
+    if f'{{{env_name}}}' not in latex:
+        return latex
+    return process_objects(latex, function, env_names=[env_name])
 
 
 def process_specific_command(latex, function, command_name):
     # find all patterns of # \{command_name}[options]{content}
     # then replace `content` by `function(content)`
-    pattern = regex.compile(get_pattern_command_full(command_name), regex.DOTALL)
-
-    def process_function(match):
-        name = match.group(1)
-        assert re.match(command_name, name)
-        options = match.group(2)
-        if options is None:
-            options = ''
-        content = match.group(4)
-        processed_content = function(content)
-        return rf'\{command_name}{options}{{{processed_content}}}'
-    return pattern.sub(process_function, latex)
+    if f'\\{command_name}' not in latex:
+        return latex
+    return process_objects(latex, function, command_names=[command_name])
 
 
 def process_mularg_command(latex, function, command_tuple):
-    # find all patterns of # \{command_name}[options]{content}
-    # then replace `content` by `function(content)`
-    command_name, nargs, args_to_translate = command_tuple
-    pattern = regex.compile(get_pattern_command_full(command_name, n=nargs), regex.DOTALL)
-
-    def process_function(match):
-        name = match.group(1)
-        assert re.match(command_name, name)
-        group_index = 2
-        contents = []
-        for i in range(nargs):
-            content = match.group(group_index + 1)
-            if i in args_to_translate:
-                content = function(content)
-            contents.append(content)
-            group_index += 2
-        return rf'\{command_name}' + ''.join([rf'{{{content}}}' for content in contents])
-    return pattern.sub(process_function, latex)
+    # find all patterns of # \{command_name}{content1}{content2}...
+    # then replace `content` by `function(content)` for the arguments to translate
+    if f'\\{command_tuple[0]}' not in latex:
+        return latex
+    return process_objects(latex, function, mularg_commands=[command_tuple])
 
 
 def process_leading_level_brace(latex, function):
     # leading level means that the {xxx} is not inside other objects, i.e. \command{} or \begin{xxx} \end{xxx}
     # replace `{ content }` by `{ function(content) }`
     text, envs = replace_latex_objects(latex, brace=False)
+    document = latex_lexer.parse(text)
     braces_content = []
     count = 0
 
-    def process_function(match):
+    def process_function(node, render):
         nonlocal braces_content, count
-        content = match.group(1)
+        if node.kind != 'group':
+            return None
+        content = text[node.body_start:node.body_end]
         # function here is translate_paragraph_latex, which cannot contain replaced environments
         processed_content = function(recover_latex_objects(content, envs)[0])
         result = rf'{{ {processed_content} }}'
         braces_content.append(result)
         placeholder = f'BRACE{count}BRACE'
         count += 1
-        return placeholder
+        return node.end, placeholder
 
-    text = regex.compile(pattern_brace, regex.DOTALL).sub(process_function, text)
+    text = document.substitute(process_function)
     latex = recover_latex_objects(text, envs)[0]
     for i in range(count):
         latex = latex.replace(f'BRACE{i}BRACE', braces_content[i])
@@ -404,7 +552,7 @@ def split_by_command(latex):
     for pattern, command in [(r'\\item\s+', '\item')]:
         new_texts = []
         for t, sep in texts:
-            splited_t = re.split(pattern, t)
+            splited_t = patterns.compile(pattern).split(t)
             seps = [command for _ in splited_t]
             seps[-1] = sep
             new_texts += list(zip(splited_t, seps))
@@ -417,13 +565,13 @@ def split_by_command(latex):
 
 
 def remove_blank_lines(text):
-    pattern = re.compile(r'\n\n+')
+    pattern = patterns.compile(r'\n\n+')
     text = pattern.sub('\n', text)
     return text
 
 
 def insert_macro(text, macro):
-    pattern = re.compile(r"\\document(class|style)(\[.*?\])?\{(.*?)\}", re.DOTALL)
+    pattern = patterns.compile(r"\\document(class|style)(\[.*?\])?\{(.*?)\}", re.DOTALL)
     match = pattern.search(text)
     assert match is not None
     start, end = match.span()
@@ -433,9 +581,9 @@ def insert_macro(text, macro):
 
 def is_complete(latex_code):
     # Define regular expressions for \documentclass, \begin{document}, and \end{document}
-    documentclass_pattern = re.compile(r"\\document(class|style)(\[.*?\])?\{.*?\}", re.DOTALL)
-    begin_pattern = re.compile(r"\\begin\{document\}")
-    end_pattern = re.compile(r"\\end\{document\}")
+    documentclass_pattern = patterns.compile(r"\\document(class|style)(\[.*?\])?\{.*?\}", re.DOTALL)
+    begin_pattern = patterns.compile(r"\\begin\{document\}")
+    end_pattern = patterns.compile(r"\\end\{document\}")
 
     # Check if \documentclass is present
     if not documentclass_pattern.search(latex_code):
@@ -461,8 +609,8 @@ def is_complete(latex_code):
 
 
 def get_theorems(text):
-    pattern = re.compile(pattern_theorem, re.DOTALL)
-    matches = re.finditer(pattern, text)
+    pattern = patterns.compile(pattern_theorem, re.DOTALL)
+    matches = pattern.finditer(text)
     theorems = [match.group(1) for match in matches]
     return theorems
 
@@ -481,7 +629,7 @@ def replace_special(text):
     # Handle direct tilde character ~ (non-breaking space in LaTeX)
     # Only replace if not preceded by backslash
     # Note: Don't add spaces around the tilde, as it's already a space-like character
-    text = re.sub(r'(?<![\\])~', f'{math_code}TD', text)
+    text = patterns.compile(r'(?<![\\])~').sub(f'{math_code}TD', text)
 
     return text
 
@@ -503,7 +651,7 @@ def replace_latex_characters(text):
     This protects them during translation.
     """
     # Replace ~ (non-breaking space) but not precedeed by backslash
-    text = re.sub(r'(?<!\\)~', f' {math_code}TD ', text)
+    text = patterns.compile(r'(?<!\\)~').sub(f' {math_code}TD ', text)
 
     return text
 
@@ -528,7 +676,7 @@ def replace_accent(text):
         # do not add space around
         return math_code + special_character_forward[special] + f'{char}'
 
-    text = re.compile(pattern_accent).sub(replace_function, text)
+    text = patterns.compile(pattern_accent).sub(replace_function, text)
 
     return text
 
@@ -542,7 +690,7 @@ def recover_accent(text):
         except Exception:
             return ''
 
-    text = re.compile(match_code_accent).sub(replace_function, text)
+    text = patterns.compile(match_code_accent).sub(replace_function, text)
 
     return text
 
@@ -551,7 +699,7 @@ def combine_split_to_sentences(text):
     # if two lines are separately by only one \n, in latex they are in the same paragraph so we combine them in the same line
     # However we don't combine them if the second line does not start from normal letters (so usually some latex commands)
     n = len(math_code)
-    pattern = re.compile(r'\n(\s*([^\s]+))')
+    pattern = compiled_line_break
 
     def process_function(match):
         string = match.group(2)
@@ -564,13 +712,24 @@ def combine_split_to_sentences(text):
 
 
 def delete_specific_format(latex, format_name):
-    pattern = regex.compile(get_pattern_command_full(format_name), regex.DOTALL)
-    return pattern.sub(lambda m: ' ' + m.group(4) + ' ', latex)
+    if f'\\{format_name}' not in latex:
+        return latex
+    document = latex_lexer.parse(latex)
+
+    def process_function(node, render):
+        if node.kind != 'command' or node.name != format_name:
+            return None
+        arguments = document.command_arguments(node)
+        if arguments is None:
+            return None
+        _, (group, ) = arguments
+        return group.end, ' ' + render(group.body_start, group.body_end, group.children) + ' '
+    return document.substitute(process_function)
 
 
 def replace_newcommand(newcommand, latex):
     command_name, n_arguments, content = newcommand
-    pattern = regex.compile(get_pattern_command_full(command_name, n_arguments), regex.DOTALL)
+    pattern = patterns.registry.get('command_full', command_name, n_arguments)
 
     def replace_function(match):
         this_content = content
@@ -585,10 +744,10 @@ def replace_newcommand(newcommand, latex):
 
 
 def process_newcommands(latex):
-    pattern = regex.compile(pattern_newcommand, regex.DOTALL)
+    pattern = patterns.compile(pattern_newcommand, regex.DOTALL, regex)
     count = 0
     full_newcommands = []
-    matches_all = list(regex.finditer(pattern, latex))
+    matches_all = list(pattern.finditer(latex))
     for match in matches_all:
         need_replace = False
         content_all = match.group(0)
@@ -621,7 +780,7 @@ def process_makeatletter_blocks(latex):
     These blocks contain LaTeX macros with @ characters that should not be translated.
     """
     # Pattern to match \makeatletter ... \makeatother blocks
-    pattern = regex.compile(r'\\makeatletter(.*?)\\makeatother', regex.DOTALL)
+    pattern = patterns.compile(r'\\makeatletter(.*?)\\makeatother', regex.DOTALL, regex)
 
     protected_blocks = []
     count = 0
@@ -654,7 +813,7 @@ def recover_makeatletter_blocks(latex, protected_blocks):
 
 
 def remove_bibnote(latex):
-    pattern = regex.compile(get_pattern_command_full('bibinfo', 2), regex.DOTALL)
+    pattern = patterns.registry.get('command_full', 'bibinfo', 2)
 
     def replace_function(match):
         assert match.group(1) == 'bibinfo'
@@ -0,0 +1,110 @@
+'''
+Rate limiting of the requests sent to a translation engine.
+
+Every engine has one limiter shared by all the threads and tasks sending requests.
+It is a token bucket whose rate follows the answers of the server:
+it grows slowly while requests succeed and is halved when the server says that there are too many of them.
+Throttled requests are retried after an exponential backoff with jitter, so that the callers do not retry all at once.
+'''
+import time
+import random
+import asyncio
+import threading
+
+# engine: (initial rate, maximal rate) in requests per second
+# only tencent and openai report throttled requests for now, the rates of the others are bounds that their latency does not reach
+engine_rates = {
+    'google': (100, 200),
+    'tencent': (5, 20),
+    'openai': (20, 100),
+}
+
+
+class RateLimiter:
+    def __init__(self, rate, max_rate, min_rate=0.2, burst=1, increase=1.0, decrease=0.5,
+                 backoff_base=0.5, backoff_max=30, max_retries=8):
+        self.rate = rate
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+        self.burst = burst
+        self.increase = increase  # the rate grows by about this much every second of successful requests
+        self.decrease = decrease
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_retries = max_retries
+        self.lock = threading.Lock()
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.last_decrease = 0
+        self.requests = 0
+        self.throttles = 0
+        self.waited = 0.0
+
+    def take(self):
+        # takes a token if there is one, otherwise returns how long to wait for the next one
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                self.requests += 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        # returns when the request is sent, to be given to on_throttle
+        # the wait is checked again after sleeping since the rate may have changed meanwhile
+        start = time.monotonic()
+        wait = self.take()
+        while wait > 0:
+            time.sleep(wait * random.uniform(1, 1.2))
+            wait = self.take()
+        now = time.monotonic()
+        with self.lock:
+            self.waited += now - start
+        return now
+
+    async def acquire_async(self):
+        start = time.monotonic()
+        wait = self.take()
+        while wait > 0:
+            await asyncio.sleep(wait * random.uniform(1, 1.2))
+            wait = self.take()
+        now = time.monotonic()
+        with self.lock:
+            self.waited += now - start
+        return now
+
+    def on_success(self):
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.increase / self.rate)
+
+    def on_throttle(self, sent_at):
+        with self.lock:
+            self.throttles += 1
+            # the requests sent before the last decrease were sent too fast already, they do not decrease the rate again
+            if sent_at >= self.last_decrease:
+                self.rate = max(self.min_rate, self.rate * self.decrease)
+                self.last_decrease = time.monotonic()
+
+    def backoff(self, attempt):
+        # full jitter
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def stats(self):
+        return {'rate': self.rate, 'requests': self.requests, 'throttles': self.throttles, 'waited': self.waited}
+
+
+limiters = {}
+limiters_lock = threading.Lock()
+
+
+def get_limiter(engine):
+    if engine == 'tencentcloud':
+        engine = 'tencent'
+    with limiters_lock:
+        if engine not in limiters:
+            rate, max_rate = engine_rates.get(engine, (5, 50))
+            limiters[engine] = RateLimiter(rate, max_rate)
+        return limiters[engine]
@@ -47,12 +47,12 @@ def check_config():
 
 def create_directories():
     """Create necessary directories"""
-    directories = ['uploads', 'api_output', 'input']
+    directories = ['uploads', 'api_output', 'api_work', 'api_cache', 'input']
     for directory in directories:
         os.makedirs(directory, exist_ok=True)
         print(f"✅ Directory '{directory}' ready")
 
-def start_server(host='0.0.0.0', port=5000, debug=False):
+def start_server(host='0.0.0.0', port=5000, debug=False, workers=None):
     """Start the API server"""
     print(f"🚀 Starting MathTranslate API Server...")
     print(f"   Host: {host}")
@@ -67,7 +67,8 @@ def start_server(host='0.0.0.0', port=5000, debug=False):
 
     # Start the server
     try:
-        from api_app import app
+        from api_app import app, start_workers
+        start_workers(workers, debug)
         app.run(host=host, port=port, debug=debug)
     except ImportError as e:
         print(f"❌ Failed to import API app: {e}")
@@ -82,6 +83,7 @@ def main():
     parser.add_argument('--host', default='0.0.0.0', help='Host to bind to (default: 0.0.0.0)')
     parser.add_argument('--port', type=int, default=5000, help='Port to bind to (default: 5000)')
     parser.add_argument('--debug', action='store_true', help='Enable debug mode')
+    parser.add_argument('--workers', type=int, help='Worker processes translating at the same time (default: 2)')
     parser.add_argument('--check-only', action='store_true', help='Only check dependencies and config, don\'t start server')
 
     args = parser.parse_args()
@@ -128,7 +130,7 @@ def main():
     print("=" * 50)
 
     # Start the server
-    start_server(args.host, args.port, args.debug)
+    start_server(args.host, args.port, args.debug, args.workers)
 
 if __name__ == '__main__':
     try:
@@ -76,7 +76,9 @@ class AbstractClient(object):
                                   req_timeout=self.profile.httpProfile.reqTimeout,
                                   proxy=self.profile.httpProfile.proxy,
                                   is_http=is_http,
-                                  certification=self.profile.httpProfile.certification)
+                                  certification=self.profile.httpProfile.certification,
+                                  pool_maxsize=self.profile.httpProfile.poolMaxsize,
+                                  pool_block=self.profile.httpProfile.poolBlock)
         if self.profile.httpProfile.keepAlive:
             self.request.set_keep_alive()
 
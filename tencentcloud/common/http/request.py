@@ -4,7 +4,9 @@
 import os
 import socket
 import logging
+import threading
 import requests
+import requests.adapters
 import certifi
 
 try:
@@ -26,7 +28,17 @@ def _get_proxy_from_env(host, varname="HTTPS_PROXY"):
 
 
 class ProxyConnection(object):
-    def __init__(self, host, timeout=60, proxy=None, certification=None, is_http=False):
+    """Connection to one endpoint.
+
+    With keep_alive set, requests go through a session shared by all threads
+    using the client. Up to pool_maxsize connections are kept open per host and
+    reused by later requests; with pool_block set, threads wait for a free
+    connection instead of opening extra ones that are thrown away afterwards.
+    Otherwise every request opens its own connection.
+    """
+
+    def __init__(self, host, timeout=60, proxy=None, certification=None, is_http=False,
+                 pool_connections=1, pool_maxsize=10, pool_block=False):
         self.request_host = host
         self.certification = certification
         if certification is None:
@@ -40,22 +52,59 @@ class ProxyConnection(object):
         if proxy:
             self.proxy = {"http": proxy, "https": proxy}
         self.request_length = 0
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_connections,
+                                                pool_maxsize=pool_maxsize,
+                                                pool_block=pool_block)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.adapter = adapter
+        self.keep_alive = False
+        self._lock = threading.Lock()
+        self.requests_sent = 0
+        self.requests_unpooled = 0
 
     def request(self, method, url, body=None, headers={}):
         self.request_length = 0
         headers.setdefault("Host", self.request_host)
-        return requests.request(method=method,
-                                url=url,
-                                data=body,
-                                headers=headers,
-                                proxies=self.proxy,
-                                verify=self.certification,
-                                timeout=self.timeout)
+        with self._lock:
+            self.requests_sent += 1
+            if not self.keep_alive:
+                self.requests_unpooled += 1
+        send = self.session.request if self.keep_alive else requests.request
+        return send(method=method,
+                    url=url,
+                    data=body,
+                    headers=headers,
+                    proxies=self.proxy,
+                    verify=self.certification,
+                    timeout=self.timeout)
+
+    def _pools(self):
+        managers = [self.adapter.poolmanager] + list(self.adapter.proxy_manager.values())
+        for manager in managers:
+            for key in list(manager.pools.keys()):
+                pool = manager.pools.get(key)
+                if pool is not None:
+                    yield pool
+
+    def connection_stats(self):
+        """Connections opened versus requests that went over an already open one."""
+        created = self.requests_unpooled + sum(pool.num_connections for pool in self._pools())
+        sent = self.requests_sent
+        return {"requests": sent,
+                "connections_created": created,
+                "connections_reused": max(sent - created, 0)}
+
+    def close(self):
+        self.session.close()
 
 
 class ApiRequest(object):
-    def __init__(self, host, req_timeout=60, debug=False, proxy=None, is_http=False, certification=None):
-        self.conn = ProxyConnection(host, timeout=req_timeout, proxy=proxy, certification=certification, is_http=is_http)
+    def __init__(self, host, req_timeout=60, debug=False, proxy=None, is_http=False, certification=None,
+                 pool_maxsize=10, pool_block=False):
+        self.conn = ProxyConnection(host, timeout=req_timeout, proxy=proxy, certification=certification, is_http=is_http,
+                                    pool_maxsize=pool_maxsize, pool_block=pool_block)
         url = urlparse(host)
         if not url.hostname:
             if is_http:
@@ -77,6 +126,7 @@ class ApiRequest(object):
 
     def set_keep_alive(self, flag=True):
         self.keep_alive = flag
+        self.conn.keep_alive = flag
 
     def set_debug(self, debug):
         self.debug = debug
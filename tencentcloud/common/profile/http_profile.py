@@ -17,7 +17,8 @@ class HttpProfile(object):
     scheme = "https"
 
     def __init__(self, protocol=None, endpoint=None, reqMethod="POST", reqTimeout=60,
-                 keepAlive=False, proxy=None, rootDomain=None, certification=None):
+                 keepAlive=False, proxy=None, rootDomain=None, certification=None,
+                 poolMaxsize=10, poolBlock=False):
         """HTTP profile.
         :param protocol: http or https, default is https.
         :type protocol: str
@@ -29,6 +30,10 @@ class HttpProfile(object):
         :type reqTimeout: int
         :param rootDomain: The root domain to access, like: tencentcloudapi.com.
         :type rootDomain: str
+        :param poolMaxsize: The number of connections kept open to the endpoint, usually the number of threads sharing the client.
+        :type poolMaxsize: int
+        :param poolBlock: Wait for a free connection when all of them are in use, instead of opening a new one.
+        :type poolBlock: bool
         """
         self.endpoint = endpoint
         self.reqTimeout = 60 if reqTimeout is None else reqTimeout
@@ -39,4 +44,6 @@ class HttpProfile(object):
         self.keepAlive = keepAlive
         self.proxy = proxy
         self.rootDomain = "tencentcloudapi.com" if rootDomain is None else rootDomain
-        self.certification = certification
\ No newline at end of file
+        self.certification = certification
+        self.poolMaxsize = poolMaxsize
+        self.poolBlock = poolBlock
\ No newline at end of file
@@ -0,0 +1,99 @@
+import os
+import re
+import sys
+import json
+import time
+import threading
+import http.server
+
+import pytest
+
+# the modules of the package are imported by their own names, as the scripts do
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+prompt_start = 'Text to translate:\n'
+prompt_end = '\n\nTranslated text (strictly faithful to original):'
+
+
+class MockCompletions(http.server.BaseHTTPRequestHandler):
+    # answers /chat/completions like the API: the text of the prompt in brackets, segment by segment when they are packed
+    requests = []
+    drop = set()  # ids left out of the answer
+    mangle = set()  # ids whose tag is broken in the answer
+    throttled = 0  # requests answered 429 before the next ones are answered
+    stall = 0  # seconds streamed answers wait after their first token
+    keepalive = False  # whether streamed answers send comments while they wait
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        prompt = payload['messages'][-1]['content']
+        text = prompt.split(prompt_start, 1)[1].rsplit(prompt_end, 1)[0]
+        type(self).requests.append(text)
+        if type(self).throttled:
+            type(self).throttled -= 1
+            self.answer(429, {'error': {'message': 'Rate limit reached'}})
+            return
+        segments = re.findall(r'<seg id="(\d+)">(.*?)</seg>', text, re.DOTALL)
+        if segments:
+            parts = []
+            for segment_id, segment in segments:
+                if int(segment_id) in self.drop:
+                    continue
+                tag = f'<seg id={segment_id}>' if int(segment_id) in self.mangle else f'<seg id="{segment_id}">'
+                parts.append(f'{tag}[{segment}]</seg>')
+            answer = '\n'.join(parts)
+        else:
+            answer = f'[{text}]'
+        if payload.get('stream'):
+            self.answer_stream(answer, {'prompt_tokens': len(prompt) // 4, 'completion_tokens': len(answer)})
+            return
+        self.answer(200, {
+            'choices': [{'message': {'content': answer}}],
+            'usage': {'prompt_tokens': len(prompt) // 4, 'completion_tokens': len(answer) // 4},
+        })
+
+    def answer(self, status, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def answer_stream(self, answer, usage):
+        # server-sent events of one character each, in UTF-8 as the API sends them but without a charset in the content type
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.end_headers()
+        for i, character in enumerate(answer):
+            self.event({'choices': [{'delta': {'content': character}}]})
+            if i == 0 and self.stall:
+                waited = 0
+                while waited < self.stall:
+                    time.sleep(0.05)
+                    waited += 0.05
+                    if self.keepalive:
+                        self.wfile.write(b': keep-alive\n\n')
+                        self.wfile.flush()
+        self.event({'choices': [], 'usage': usage})
+        self.wfile.write(b'data: [DONE]\n\n')
+
+    def event(self, data):
+        self.wfile.write(f'data: {json.dumps(data, ensure_ascii=False)}\n\n'.encode())
+        self.wfile.flush()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def mock_openai():
+    """Base url of a local /chat/completions server, MockCompletions holds its settings and the texts it received"""
+    MockCompletions.requests = []
+    MockCompletions.drop, MockCompletions.mangle = set(), set()
+    MockCompletions.throttled = 0
+    MockCompletions.stall, MockCompletions.keepalive = 0, False
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), MockCompletions)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_address[1]}/v1'
+    server.shutdown()
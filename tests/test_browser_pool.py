@@ -0,0 +1,78 @@
+import shutil
+import threading
+
+import pytest
+
+google = pytest.importorskip('google')
+
+
+class FakeBrowser:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.closed = False
+
+    def translate(self, text):
+        if self.fail:
+            raise RuntimeError('page broken')
+        return text.upper()
+
+    def is_healthy(self):
+        return not self.fail
+
+    def load(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+class FakePool(google.BrowserPool):
+    # new_browser takes the next outcome: a FakeBrowser or an exception to raise
+    def __init__(self, outcomes, size=2):
+        super().__init__('zh-CN', 'en', size=size)
+        self.outcomes = list(outcomes)
+        self.outcomes_lock = threading.Lock()
+
+    def new_browser(self):
+        with self.outcomes_lock:
+            outcome = self.outcomes.pop(0) if self.outcomes else FakeBrowser()
+        if isinstance(outcome, Exception):
+            raise outcome
+        with self.lock:
+            self.browsers.append(outcome)
+        return outcome
+
+
+def test_failed_start_keeps_the_slot():
+    pool = FakePool([RuntimeError('no chrome'), FakeBrowser()], size=2)
+    assert pool.translate('a') == 'A'
+    assert pool.translate('b') == 'B'
+    assert pool.idle.qsize() == 2
+    pool.close()
+
+
+def test_failed_replacement_keeps_the_slot():
+    broken = FakeBrowser(fail=True)
+    pool = FakePool([broken, RuntimeError('no chrome')], size=1)
+    pool.retries = 1
+    with pytest.raises(RuntimeError):
+        pool.translate('a')
+    assert broken.closed
+    # the slot is still there and gets a new browser on the next call
+    assert pool.idle.qsize() == 1
+    assert pool.translate('b') == 'B'
+    assert pool.replaced == 1
+    pool.close()
+
+
+@pytest.mark.skipif(not (shutil.which('google-chrome') and shutil.which('Xvfb')), reason='needs Chrome and Xvfb')
+def test_pool_with_stand_in_page():
+    server, url = google.start_stand_in_server()
+    try:
+        with google.BrowserPool('zh-CN', 'en', size=2, url=url) as pool:
+            assert pool.translate('hello') == '[HELLO]'
+            # the loaded page is reused, a second call only replaces the text
+            assert pool.translate('hello again') == '[HELLO AGAIN]'
+            assert pool.replaced == 0
+    finally:
+        server.shutdown()
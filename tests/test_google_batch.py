@@ -0,0 +1,56 @@
+import html
+import threading
+import http.server
+import urllib.parse
+
+import pytest
+
+from google_translator import GoogleTranslator
+
+
+class MockPage(http.server.BaseHTTPRequestHandler):
+    # answers like the mobile page of google translate: the text in upper case, and the markers in drop left out
+    requests = []
+    drop = set()
+
+    def do_GET(self):
+        text = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)['q'][0]
+        type(self).requests.append(text)
+        for i in self.drop:
+            text = text.replace(GoogleTranslator.segment_marker.format(i) + '\n', '')
+        body = f'<div class="result-container">{html.escape(text.upper())}</div>'.encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def translator():
+    MockPage.requests, MockPage.drop = [], set()
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), MockPage)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    translator = GoogleTranslator(base_url=f'http://127.0.0.1:{server.server_address[1]}')
+    yield translator
+    translator.close()
+    server.shutdown()
+
+
+# segments of split_by_command can hold several paragraphs
+texts = ['Outer one\n\n\nXMATHX_0', 'Inner one & more', 'Outer two\n\nXMATHX_1 and the rest']
+
+
+def test_segments_with_blank_lines_are_sent_in_one_request(translator):
+    assert translator.translate_batch(texts, 'zh-CN', 'en') == [text.upper() for text in texts]
+    assert len(MockPage.requests) == 1
+
+
+def test_segment_whose_marker_is_lost_is_sent_again_alone(translator):
+    MockPage.drop = {1}
+    assert translator.translate_batch(texts, 'zh-CN', 'en') == [text.upper() for text in texts]
+    # without its marker, the second text is in the translation of the first one, so both are sent again
+    assert MockPage.requests[1:] == texts[:2]
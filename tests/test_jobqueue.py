@@ -0,0 +1,106 @@
+import pytest
+
+import jobqueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return jobqueue.JobQueue(str(tmp_path / 'jobs.db'), max_queued=3, max_attempts=2)
+
+
+def test_transaction_is_rolled_back_when_it_raises(queue, monkeypatch):
+    queue.submit_or_follow('leader', 'content')
+    queue.submit_or_follow('follower', 'content')
+    queue.claim('worker-0')
+    queue.requeue('worker-0')
+    queue.claim('worker-0')
+    calls = []
+
+    def failing_set(connection, job_id, fields):
+        # the leader is failed, then the update of its follower breaks
+        calls.append(job_id)
+        if len(calls) == 2:
+            raise RuntimeError('disk full')
+        original_set(connection, job_id, fields)
+
+    original_set = queue.set
+    monkeypatch.setattr(queue, 'set', failing_set)
+    with pytest.raises(RuntimeError):
+        queue.requeue('worker-0')
+    assert queue.get('leader')['status'] == jobqueue.processing
+    assert queue.get('follower')['status'] == jobqueue.following
+
+
+def test_jobs_are_claimed_by_priority_then_age(queue):
+    queue.submit_or_follow('old', 'a', priority=0)
+    queue.submit_or_follow('urgent', 'b', priority=5)
+    queue.submit_or_follow('new', 'c', priority=0)
+    assert [queue.claim('worker-0')['id'] for _ in range(3)] == ['urgent', 'old', 'new']
+    assert queue.claim('worker-0') is None
+
+
+def test_full_queue_does_not_admit_more_jobs(queue):
+    for i in range(3):
+        assert queue.submit_or_follow(f'job-{i}', f'content-{i}') == jobqueue.queued
+    assert queue.submit_or_follow('job-3', 'content-3') is None
+    assert queue.get('job-3') is None
+    # a job identical to a queued one follows it, it does not take a place in the queue
+    assert queue.submit_or_follow('job-4', 'content-0') == jobqueue.following
+    assert queue.retry_after(workers=1) >= 1
+
+
+def test_interrupted_job_is_queued_again_then_failed_after_max_attempts(queue):
+    queue.submit_or_follow('job', 'content')
+    queue.submit_or_follow('identical', 'content')
+    assert queue.claim('worker-0')['attempts'] == 1
+    assert queue.requeue('worker-0') == 1
+    assert queue.get('job')['status'] == jobqueue.queued
+    assert queue.claim('worker-1')['attempts'] == 2
+    # a worker that is not the one processing the job does not affect it
+    assert queue.requeue('worker-0') == 0
+    assert queue.requeue('worker-1') == 0
+    job = queue.get('job')
+    assert job['status'] == jobqueue.failed
+    assert 'each of its 2 attempts' in job['message']
+    assert queue.get('identical')['status'] == jobqueue.failed
+
+
+@pytest.fixture
+def api(tmp_path, monkeypatch, queue):
+    # the api creates its folders in the working directory when it is imported
+    monkeypatch.chdir(tmp_path)
+    api_app = pytest.importorskip('api_app')
+    for name in ('OUTPUT_FOLDER', 'WORK_FOLDER'):
+        monkeypatch.setitem(api_app.app.config, name, str(tmp_path / name.lower()))
+        (tmp_path / name.lower()).mkdir()
+    monkeypatch.setattr(api_app, 'jobs', queue)
+    monkeypatch.setattr(api_app, 'artifact_cache', api_app.artifacts.ArtifactCache(str(tmp_path / 'cache')))
+    return api_app
+
+
+def test_job_translated_before_an_interruption_is_not_translated_again(api, tmp_path, monkeypatch):
+    working_dir = tmp_path / 'work_folder' / 'job' / 'task_job'
+    working_dir.mkdir(parents=True)
+    (working_dir / 'main.tex').write_text('\\documentclass{article}\\begin{document}翻译\\end{document}', encoding='utf-8')
+    compiled = []
+
+    def translate_dir(*args):
+        raise AssertionError('the job was translated again')
+
+    def fallback_compilation(directory, tex, pdf_name, output_folder):
+        compiled.append(tex)
+        (tmp_path / 'output_folder' / f'{pdf_name}.pdf').write_bytes(b'%PDF')
+        return True
+
+    monkeypatch.setattr(api, 'translate_dir', translate_dir)
+    monkeypatch.setattr(api, 'fallback_compilation', fallback_compilation)
+    api.jobs.submit_or_follow('job', 'content', options={'compile': True}, input_path='main.tex', arxiv_id=None)
+    api.jobs.claim('worker-0')
+    api.jobs.update('job', stage='translated', main_tex_files=['main'])
+    api.jobs.requeue('worker-0')
+    api.run_job(api.jobs.claim('worker-1'))
+    job = api.jobs.get('job')
+    assert job['status'] == jobqueue.completed, job['message']
+    assert compiled == ['main.tex']
+    assert [file['type'] for file in job['result']['files']] == ['pdf', 'zip']
+    assert (tmp_path / 'output_folder' / 'job.zip').exists()
@@ -0,0 +1,39 @@
+import process_latex
+
+
+def mask_one_at_a_time(patterns, text):
+    # the masking before it was done in one scan per pattern: the first match is replaced, then the text is searched again
+    objs = []
+    for pattern in patterns:
+        while pattern.search(text):
+            objs.append(pattern.search(text).group())
+            text = pattern.sub(process_latex.variable_code(len(objs) - 1), text, 1)
+    return text, objs
+
+
+def mask(patterns, text):
+    objs = []
+    for pattern in patterns:
+        text = process_latex.mask_pattern(pattern, text, objs)
+    return text, objs
+
+
+texts = [
+    r'Let $x$ and $y$ be \textbf{real} numbers \cite{a}.',
+    # masking the math makes "\" and its code a command, which is masked in a second scan
+    '\\$x$ then $y$ and \\$z$ \\emph{w}',
+    '\\\\$x$\\[y\\]\\\\\\(z\\) \\a{\\b}',
+]
+
+
+def test_codes_are_numbered_as_when_masked_one_at_a_time():
+    patterns = process_latex.get_latex_obj_patterns((), True, True)
+    for text in texts:
+        assert mask(patterns, text) == mask_one_at_a_time(patterns, text)
+
+
+def test_canonical_codes_do_not_depend_on_the_numbering():
+    text = f'{process_latex.variable_code(3)} and {process_latex.variable_code(1)}, {process_latex.variable_code(3)}'
+    canonical, codes = process_latex.canonicalize_codes(text)
+    assert canonical == process_latex.canonicalize_codes(text.replace('_3', '_0').replace('_1', '_2'))[0]
+    assert codes == [process_latex.variable_code(3), process_latex.variable_code(1)]
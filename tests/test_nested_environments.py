@@ -0,0 +1,52 @@
+import process_latex
+import translate
+import usage
+
+
+class MarkingTranslator:
+    # stands for a TextTranslator, a translated text is recognized by its brackets
+    engine = 'marking'
+
+    def __init__(self):
+        self.metrics = usage.EngineMetrics('marking')
+        self.sent = []
+
+    def translate(self, text):
+        self.sent.append(text)
+        return f'<{text}>'
+
+
+nested = r'\begin{itemize}\item Outer one\begin{itemize}\item Inner one\end{itemize}\item Outer two\end{itemize}'
+
+
+def translate_paragraph(latex):
+    translator = MarkingTranslator()
+    latex_translator = translate.LatexTranslator(translator)
+    latex_translator.complete = False
+    latex_translator.theorems = []
+    latex_translator.num = 0
+    latex_translator.nbad = latex_translator.ntotal = 0
+    return latex_translator.translate_paragraph_latex(latex), translator.sent
+
+
+def test_nested_environment_is_masked_with_its_parent():
+    text, objs = process_latex.replace_latex_objects(nested + ' after', brace=False)
+    assert text == 'XMATHX_0 after'
+    assert objs == [nested]
+    assert process_latex.recover_latex_objects(text, objs)[0] == nested + ' after'
+
+
+def test_nested_environment_is_translated_once():
+    result, sent = translate_paragraph(nested)
+    assert sorted(sent) == ['Inner one', 'Outer oneXMATHX_0', 'Outer two']
+    assert '<<' not in result
+    assert result.count(r'\end{itemize}') == 2
+
+
+def test_nested_environment_over_several_lines():
+    latex = nested.replace(r'\item', '\n\\item').replace(r'\end', '\n\\end')
+    result, sent = translate_paragraph(latex)
+    # the text after the inner environment is sent once, without the masked end of the outer one
+    assert [text.strip() for text in sent].count('Outer two') == 1
+    assert not any(text.startswith('<') for text in sent)
+    assert '<<' not in result
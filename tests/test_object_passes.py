@@ -0,0 +1,63 @@
+import pytest
+
+import latex_lexer
+import process_latex
+import translate
+from config import config
+from test_nested_environments import MarkingTranslator
+
+paragraph = (r'\section{Intro} \begin{itemize}\item a \footnote{note}\item \textcolor{red}{b}\end{itemize}'
+             r'\begin{proof*}done \caption{c}\end{proof*} \begin{custom-0}x\end{custom-0}')
+
+
+@pytest.fixture
+def traversals(monkeypatch):
+    # the number of walks over a paragraph, each one rebuilds its text
+    calls = []
+    substitute = latex_lexer.Document.substitute
+
+    def counting_substitute(document, handler):
+        calls.append(document.text)
+        return substitute(document, handler)
+
+    monkeypatch.setattr(latex_lexer.Document, 'substitute', counting_substitute)
+    return calls
+
+
+@pytest.fixture
+def latex_translator(monkeypatch):
+    latex_translator = translate.LatexTranslator(MarkingTranslator())
+    latex_translator.theorems = []
+    # the contents are not masked and translated, so that only the traversals for the objects are counted.
+    # Their spaces are doubled instead, which leaves the commands in them as they are
+    monkeypatch.setattr(latex_translator, 'translate_text_in_paragraph_latex_and_leading_brace', lambda text: text.replace(' ', '  '))
+    return latex_translator
+
+
+def translate_one_pass_per_name(latex_translator, latex):
+    # the passes made before all objects were translated in one traversal
+    env_names = [name for name in process_latex.environment_list + latex_translator.theorems + config.custom_environments if name not in config.skip_environments]
+    command_names = [name for name in process_latex.command_list + config.custom_commands if name not in config.skip_commands]
+    function = latex_translator.translate_text_in_paragraph_latex_and_leading_brace
+    for env_name in env_names:
+        latex = process_latex.process_specific_env(latex, function, env_name)
+        latex = process_latex.process_specific_env(latex, function, env_name + '*')
+    for command_name in command_names:
+        latex = process_latex.process_specific_command(latex, function, command_name)
+        latex = process_latex.process_specific_command(latex, function, command_name + '*')
+    for command_tuple in config.mularg_command_list:
+        latex = process_latex.process_mularg_command(latex, function, command_tuple)
+    return latex
+
+
+@pytest.mark.parametrize('custom', [0, 50])
+def test_objects_are_translated_in_one_traversal(latex_translator, traversals, monkeypatch, custom):
+    monkeypatch.setattr(config, 'custom_environments', [f'custom-{i}' for i in range(custom)])
+    monkeypatch.setattr(config, 'custom_commands', [f'customcommand{i}' for i in range(custom)])
+    one_pass_per_name = translate_one_pass_per_name(latex_translator, paragraph)
+    passes = len(traversals)
+    traversals.clear()
+    assert latex_translator.translate_latex_all_objects(paragraph) == one_pass_per_name
+    assert len(traversals) == 1
+    # itemize, proof*, section, footnote, caption and textcolor, and custom-0 when it is a custom environment
+    assert passes == (7 if custom else 6)
@@ -0,0 +1,30 @@
+import pytest
+
+openai_translator = pytest.importorskip('openai_translator')
+
+from conftest import MockCompletions
+
+
+@pytest.fixture
+def translator(mock_openai):
+    translator = openai_translator.OpenAITranslator('test-key', base_url=mock_openai)
+    yield translator
+    translator.close()
+
+
+captions = [f'Figure {i}: results of the experiment number {i}.' for i in range(6)]
+
+
+def test_segments_are_packed_in_one_request(translator):
+    results = translator.translate_batch(captions, 'zh-CN', 'en')
+    assert results == [f'[{caption}]' for caption in captions]
+    assert len(MockCompletions.requests) == 1
+    assert translator.number_of_requests == 1
+
+
+def test_missing_and_mangled_segments_are_sent_again_alone(translator):
+    MockCompletions.drop, MockCompletions.mangle = {2}, {4}
+    results = translator.translate_batch(captions, 'zh-CN', 'en')
+    assert results == [f'[{caption}]' for caption in captions]
+    # the packed request, then one request for each of the two segments that did not come back
+    assert MockCompletions.requests[1:] == [captions[2], captions[4]]
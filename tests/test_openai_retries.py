@@ -0,0 +1,37 @@
+import pytest
+import requests
+
+openai_translator = pytest.importorskip('openai_translator')
+translate = pytest.importorskip('translate')
+
+import usage
+import ratelimit
+from conftest import MockCompletions
+
+
+@pytest.fixture
+def engine(mock_openai):
+    # an EngineTranslator around a translator of the mock server, without reading the config
+    limiter = ratelimit.RateLimiter(rate=100, max_rate=100, burst=10, backoff_base=0.01, max_retries=2)
+    engine = translate.EngineTranslator.__new__(translate.EngineTranslator)
+    engine.metrics = usage.EngineMetrics('openai')
+    engine.translator = openai_translator.OpenAITranslator('test-key', base_url=mock_openai, limiter=limiter, metrics=engine.metrics)
+    engine.limiter = limiter
+    engine.limited_by_translator = True
+    yield engine
+    engine.translator.close()
+
+
+def test_throttled_requests_are_retried_once_per_request(engine):
+    MockCompletions.throttled = 100
+    with pytest.raises(requests.HTTPError):
+        engine.send(engine.translator.translate, 'Hello world.', 'zh-CN', 'en')
+    # the first request and max_retries retries, not max_retries retries of each retry loop
+    assert len(MockCompletions.requests) == engine.limiter.max_retries + 1
+    assert engine.limiter.requests == engine.limiter.max_retries + 1
+
+
+def test_throttled_request_succeeds_after_a_retry(engine):
+    MockCompletions.throttled = 1
+    assert engine.send(engine.translator.translate, 'Hello world.', 'zh-CN', 'en') == '[Hello world.]'
+    assert len(MockCompletions.requests) == 2
@@ -0,0 +1,38 @@
+import pytest
+import requests
+
+openai_translator = pytest.importorskip('openai_translator')
+
+from conftest import MockCompletions, prompt_start, prompt_end
+
+
+@pytest.fixture
+def translator(mock_openai):
+    translator = openai_translator.OpenAITranslator('test-key', base_url=mock_openai, stream=True, stall_timeout=0.3)
+    yield translator
+    translator.close()
+
+
+def stream(translator, text):
+    payload = {'messages': [{'role': 'user', 'content': f'{prompt_start}{text}{prompt_end}'}]}
+    return translator.stream_completion(payload, source_tokens=len(text))
+
+
+def test_streamed_answer_is_decoded_as_utf8(translator):
+    answer, usage, first_token_at = stream(translator, 'Théorème 定理 — proof')
+    assert answer == '[Théorème 定理 — proof]'
+    assert usage['completion_tokens'] == len(answer)
+    assert first_token_at is not None
+
+
+def test_stream_sending_only_comments_is_aborted(translator):
+    # the comments keep the socket alive, the answer is aborted because no token comes
+    MockCompletions.stall, MockCompletions.keepalive = 1, True
+    with pytest.raises(requests.exceptions.Timeout, match='no token'):
+        stream(translator, 'Hello world.')
+
+
+def test_silent_stream_is_aborted(translator):
+    MockCompletions.stall = 1
+    with pytest.raises(requests.exceptions.Timeout, match='nothing received'):
+        stream(translator, 'Hello world.')
@@ -0,0 +1,39 @@
+import sqlite3
+
+import cache
+
+
+def last_used(path):
+    return dict(sqlite3.connect(path).execute('SELECT key, last_used FROM memory').fetchall())
+
+
+def test_lookups_of_recently_used_entries_do_not_write(tmp_path):
+    path = str(tmp_path / 'memory.db')
+    memory = cache.TranslationMemory(path, touch_interval=3600)
+    memory.put_many({'a': 'A', 'b': 'B'})
+    before = last_used(path)
+    changes = memory.connection().total_changes
+    assert memory.get_many(['a', 'b', 'c']) == {'a': 'A', 'b': 'B'}
+    assert memory.connection().total_changes == changes
+    assert last_used(path) == before
+
+
+def test_lookups_touch_entries_last_used_long_ago(tmp_path):
+    path = str(tmp_path / 'memory.db')
+    memory = cache.TranslationMemory(path, max_entries=1, touch_interval=3600)
+    memory.put_many({'a': 'A', 'b': 'B'})
+    memory.connection().execute('UPDATE memory SET last_used = last_used - 7200')
+    memory.connection().commit()
+    assert memory.get('a') == 'A'
+    # the entry just used is kept, the other one is evicted
+    memory.evict()
+    assert list(last_used(path)) == ['a']
+
+
+def test_old_cache_is_removed(tmp_path, monkeypatch):
+    old_cache_dir = tmp_path / 'cache'
+    (old_cache_dir / 'document').mkdir(parents=True)
+    (old_cache_dir / 'document' / 'paragraph').write_text('translated', encoding='utf-8')
+    monkeypatch.setattr(cache, 'old_cache_dir', str(old_cache_dir))
+    cache.remove_old_cache()
+    assert not old_cache_dir.exists()
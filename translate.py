@@ -4,6 +4,11 @@ __version__ = open(os.path.join(os.path.dirname(__file__), 'version.txt'), encod
 import process_latex
 import process_text
 import cache
+import patterns
+import batching
+import ratelimit
+import failover
+import usage
 from config import config
 from process_latex import environment_list, command_list, format_list
 from process_text import char_limit
@@ -11,6 +16,8 @@ from encoding import get_file_encoding
 import time
 import re
 import tqdm.auto
+import asyncio
+import threading
 import concurrent.futures
 default_begin = r'''
 \documentclass[UTF8]{article}
@@ -23,55 +30,59 @@ default_end = r'''
 '''
 
 
-class TextTranslator:
-    def __init__(self, engine, language_to, language_from):
-        self.engine = engine
-        if engine == 'google':
-            import mtranslate as translator
-            self.translator = translator
-            # Add timeout and retry logic for Google Translate
-            import signal
-            import threading
-
-            def safe_translate(text, lang_to, lang_from, timeout=10):
-                """Translate text with timeout to prevent hanging"""
-                result = [None]
-                exception = [None]
-
-                def translate_thread():
-                    try:
-                        result[0] = translator.translate(text, lang_to, lang_from)
-                    except Exception as e:
-                        exception[0] = e
+class Untranslated(str):
+    '''
+    A text returned as it is because every engine failed, it is never remembered as a translation
+    '''
 
-                thread = threading.Thread(target=translate_thread)
-                thread.daemon = True
-                thread.start()
-                thread.join(timeout)
 
-                if thread.is_alive():
-                    # Translation timed out
-                    print(f"Warning: Translation timed out for text: {text[:50]}...")
-                    return text  # Return original text if timeout
+class Fallback(str):
+    '''
+    A translation by another engine than the first of the chain,
+    the translation memory is keyed by the first engine so it is not remembered either
+    '''
 
-                if exception[0]:
-                    print(f"Warning: Translation failed: {exception[0]}")
-                    return text  # Return original text if error
 
-                return result[0]
+def rememberable(translation):
+    return not isinstance(translation, (Untranslated, Fallback))
 
-            self.try_translate = lambda text: safe_translate(text, self.language_to, self.language_from)
+
+class EngineTranslator:
+    '''
+    One translation engine, failures are raised so that TextTranslator can move on to the next engine
+    '''
+
+    def __init__(self, engine, language_to, language_from, batch=False, threads=0, metrics=None):
+        self.engine = engine
+        self.metrics = metrics if metrics is not None else usage.EngineMetrics(engine)
+        if engine == 'google':
+            from google_translator import GoogleTranslator
+            pool_size = 1 if batch else (threads or 32)
+            self.translator = GoogleTranslator(pool_size=pool_size, metrics=self.metrics)
+            self.try_translate = lambda text: self.translator.translate(text, self.language_to, self.language_from)
+            self.try_translate_batch = lambda texts: self.translator.translate_batch(texts, self.language_to, self.language_from)
+            batch_chars = 4000
+            max_in_flight = pool_size
+            request_timeout = 10
             #from mathtranslate.google import ParallelTranslator
             #self.translator = ParallelTranslator(language_to, language_from)
             #self.try_translate = lambda text: self.translator.translate(text)
         elif engine == 'tencent' or engine == 'tencentcloud':
             from tencent import Translator
+            # requests are sent by every worker, and by the batcher when batching the texts without placeholders
+            pool_size = (threads or min(32, (os.cpu_count() or 1) + 4)) + (1 if batch else 0)
             self.translator = Translator(
                 secret_id=config.tencent_secret_id,
                 secret_key=config.tencent_secret_key,
-                region=config.tencent_region
+                region=config.tencent_region,
+                pool_size=pool_size,
+                metrics=self.metrics
             )
             self.try_translate = lambda text: self.translator.translate(text, self.language_to, self.language_from)
+            self.try_translate_batch = lambda texts: self.translator.translate_batch(texts, self.language_to, self.language_from)
+            batch_chars = 1990
+            max_in_flight = pool_size
+            request_timeout = 180
         elif engine == 'openai':
             from openai_translator import OpenAITranslator
             self.translator = OpenAITranslator(
@@ -80,46 +91,265 @@ class TextTranslator:
                 model=config.openai_model,
                 max_tokens=config.openai_max_tokens,
                 temperature=config.openai_temperature,
-                chunk_size=config.openai_chunk_size
+                chunk_size=config.openai_chunk_size,
+                stream=config.openai_stream,
+                stall_timeout=config.openai_stall_timeout,
+                max_in_flight_chunks=config.openai_max_in_flight_chunks,
+                limiter=ratelimit.get_limiter(engine),
+                glossary=config.openai_glossary,
+                metrics=self.metrics
             )
             self.try_translate = lambda text: self.translator.translate(text, self.language_to, self.language_from)
+            self.try_translate_batch = lambda texts: self.translator.translate_batch(texts, self.language_to, self.language_from)
+            # the translation of a batch has to fit in max_tokens
+            batch_chars = config.openai_max_tokens
+            max_in_flight = 8
+            request_timeout = 180
         else:
             assert False, "engine must be google, tencent, tencentcloud, or openai"
         self.language_to = language_to
         self.language_from = language_from
         self.number_of_calls = 0
         self.tot_char = 0
+        self.limiter = ratelimit.get_limiter(engine)
+        # the openai translator waits for the limiter and retries throttled requests itself, for each of its requests
+        self.limited_by_translator = getattr(self.translator, 'limiter', None) is not None
+        self.breaker = failover.get_breaker(engine)
+        self.batch_chars = batch_chars
+        # asyncio mode: at most max_in_flight requests at a time, the blocking clients run on an executor of the same size
+        self.max_in_flight = threads or max_in_flight
+        # seconds a call of the asyncio mode is waited for
+        self.request_timeout = request_timeout
+        self.semaphore = None
+        self.executor = None
+        # calls whose caller stopped waiting for them, they keep a thread of the executor busy until they return
+        self.abandoned_calls = 0
 
     def translate(self, text):
-        if not re.match(re.compile(r'.*[a-zA-Z].*', re.DOTALL), text):
-            # no meaningful word inside
-            return text
+        result = self.send(self.try_translate, text)
+        self.number_of_calls += 1
+        self.tot_char += len(text)
+        self.metrics.on_call(len(text))
+        return result
+
+    def is_throttled(self, e):
+        return hasattr(self.translator, "is_error_request_frequency") and self.translator.is_error_request_frequency(e)
+
+    def send(self, function, *args):
+        # every request waits for the rate limiter, the throttled ones are retried after a backoff until max_retries
+        if self.limited_by_translator:
+            try:
+                return function(*args)
+            except BaseException:
+                self.metrics.on_failure()
+                raise
+        attempt = 0
         while True:
+            sent_at = self.limiter.acquire()
             try:
-                result = self.try_translate(text)
-                break
+                result = function(*args)
             except BaseException as e:
-                if hasattr(self.translator, "is_error_request_frequency") and self.translator.is_error_request_frequency(e):
-                    time.sleep(0.5)
-                else:
+                throttled = self.is_throttled(e)
+                if throttled:
+                    self.metrics.on_throttle(retried=attempt < self.limiter.max_retries)
+                if not throttled or attempt >= self.limiter.max_retries:
+                    self.metrics.on_failure()
                     raise e
+                self.limiter.on_throttle(sent_at)
+                time.sleep(self.limiter.backoff(attempt))
+                attempt += 1
+                continue
+            self.limiter.on_success()
+            return result
+
+    async def send_async(self, function, *args):
+        if self.limited_by_translator:
+            try:
+                return await function(*args)
+            except Exception:
+                self.metrics.on_failure()
+                raise
+        attempt = 0
+        while True:
+            sent_at = await self.limiter.acquire_async()
+            try:
+                result = await function(*args)
+            except Exception as e:
+                throttled = self.is_throttled(e)
+                if throttled:
+                    self.metrics.on_throttle(retried=attempt < self.limiter.max_retries)
+                if not throttled or attempt >= self.limiter.max_retries:
+                    self.metrics.on_failure()
+                    raise e
+                self.limiter.on_throttle(sent_at)
+                await asyncio.sleep(self.limiter.backoff(attempt))
+                attempt += 1
+                continue
+            self.limiter.on_success()
+            return result
+
+    async def try_translate_async(self, text):
+        try:
+            return await asyncio.wait_for(self.run_blocking(self.try_translate, text), self.request_timeout)
+        except asyncio.TimeoutError:
+            self.abandoned_calls += 1
+            raise TimeoutError(f"Translation timed out for text: {text[:50]}...")
+
+    def run_blocking(self, function, *args):
+        if self.executor is None:
+            self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_in_flight)
+        return asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    async def translate_async(self, text):
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.max_in_flight)
+        async with self.semaphore:
+            result = await self.send_async(self.try_translate_async, text)
         self.number_of_calls += 1
         self.tot_char += len(text)
+        self.metrics.on_call(len(text))
         return result
 
+    def can_batch(self, text):
+        # tencent cannot protect the placeholders of a text in a batch request
+        return getattr(self.translator, 'can_batch', lambda text: True)(text)
+
+    def translate_batch(self, texts):
+        # one request for several texts, called by the batcher
+        results = self.send(self.try_translate_batch, texts)
+        self.number_of_calls += 1
+        self.tot_char += sum(len(text) for text in texts)
+        self.metrics.on_call(sum(len(text) for text in texts))
+        return results
+
+    def close(self):
+        if self.executor is not None:
+            # calls that timed out may still be running, they are not waited for
+            self.executor.shutdown(wait=False)
+        if hasattr(self.translator, 'close'):
+            self.translator.close()
+
+
+class TextTranslator:
+    '''
+    Translates with the first engine of a chain like 'openai,tencent,google' whose circuit is not open,
+    and falls back to the next ones when it fails. The text is left untranslated when all of them fail.
+    Untranslated texts and the translations of the fallback engines are marked so that they do not go to the translation memory.
+    '''
+
+    def __init__(self, engine, language_to, language_from, batch=False, threads=0, metrics=None):
+        self.engine = engine
+        # usage.Metrics of the document, every engine counts its requests in its own part
+        self.metrics = metrics if metrics is not None else usage.Metrics()
+        self.engines = [EngineTranslator(name, language_to, language_from, batch, threads, self.metrics.engine(name)) for name in engine.split(',')]
+        self.language_to = language_to
+        self.language_from = language_from
+        self.untranslated = 0
+        self.lock = threading.Lock()
+        self.batcher = None
+        if batch:
+            self.batcher = batching.BatchTranslator(self.translate_batch, max_chars=min(engine.batch_chars for engine in self.engines))
+
+    @property
+    def number_of_calls(self):
+        return sum(engine.number_of_calls for engine in self.engines)
+
+    @property
+    def tot_char(self):
+        return sum(engine.tot_char for engine in self.engines)
+
+    def available_engines(self):
+        # lazily, a half-open circuit lets a probe through when it is asked
+        return (engine for engine in self.engines if engine.breaker.allow())
+
+    def failed(self, engine, e):
+        print(f"Warning: {engine.engine} translation failed: {e}")
+        engine.breaker.on_failure()
+
+    def give_up(self, count):
+        with self.lock:
+            self.untranslated += count
+        self.metrics.on_untranslated(count)
+
+    def batched(self, text):
+        # a text longer than a batch is sent alone by the single text requests, which accept it,
+        # and so is a text that the first engine cannot batch
+        return self.batcher is not None and len(text) <= self.batcher.max_chars and self.engines[0].can_batch(text)
+
+    def translate(self, text):
+        if not patterns.compile(r'.*[a-zA-Z].*', re.DOTALL).match(text):
+            # no meaningful word inside
+            return text
+        if self.batched(text):
+            return self.batcher.translate(text)
+        for engine in self.available_engines():
+            try:
+                result = engine.translate(text)
+            except Exception as e:
+                self.failed(engine, e)
+                continue
+            engine.breaker.on_success()
+            return result if engine is self.engines[0] else Fallback(result)
+        self.give_up(1)
+        return Untranslated(text)
+
+    async def translate_async(self, text):
+        if not patterns.compile(r'.*[a-zA-Z].*', re.DOTALL).match(text):
+            return text
+        if self.batched(text):
+            return await asyncio.wrap_future(self.batcher.submit(text))
+        for engine in self.available_engines():
+            try:
+                result = await engine.translate_async(text)
+            except Exception as e:
+                self.failed(engine, e)
+                continue
+            engine.breaker.on_success()
+            return result if engine is self.engines[0] else Fallback(result)
+        self.give_up(1)
+        return Untranslated(text)
+
+    def translate_batch(self, texts):
+        for engine in self.available_engines():
+            try:
+                results = engine.translate_batch(texts)
+            except Exception as e:
+                self.failed(engine, e)
+                continue
+            engine.breaker.on_success()
+            return results if engine is self.engines[0] else [Fallback(result) for result in results]
+        self.give_up(len(texts))
+        return [Untranslated(text) for text in texts]
+
+    def close(self):
+        if self.batcher is not None:
+            self.batcher.close()
+        for engine in self.engines:
+            engine.close()
+
 
 class LatexTranslator:
-    def __init__(self, translator: TextTranslator, debug=False, threads=0):
+    def __init__(self, translator: TextTranslator, debug=False, threads=0, asynchronous=False, debug_dir='.', progress=None):
         self.translator = translator
+        # progress: called with the number of paragraphs done and their total as they are translated
+        self.progress = progress
         self.debug = debug
         if self.debug:
-            self.f_old = open("text_old", "w", encoding='utf-8')
-            self.f_new = open("text_new", "w", encoding='utf-8')
-            self.f_obj = open("objs", "w", encoding='utf-8')
+            # debug_dir: where the texts before and after translation are written
+            self.f_old = open(os.path.join(debug_dir, "text_old"), "w", encoding='utf-8')
+            self.f_new = open(os.path.join(debug_dir, "text_new"), "w", encoding='utf-8')
+            self.f_obj = open(os.path.join(debug_dir, "objs"), "w", encoding='utf-8')
+        self.add_cache = False
         if threads == 0:
             self.threads = None
         else:
             self.threads = threads
+        self.asynchronous = asynchronous
+        # state of the paragraph processed by each thread:
+        # local.partial, whether a segment of the paragraph was left untranslated or translated by a fallback engine,
+        # and during a collecting pass of the asyncio mode, local.segments and local.missing, the translations of the text segments known so far
+        # and the ones still missing, with local.nbad and local.ntotal, the latex objects recovered by the pass
+        self.local = threading.local()
 
     def close(self):
         if self.debug:
@@ -144,42 +374,84 @@ class LatexTranslator:
                 parts.append(part)
                 part = line
         parts.append(part)
-        parts_translated = []
-        for part in parts:
-            text_original = part.strip()
-            if text_original.upper() == text_original:
-                result = text_original
-            else:
-                # ENHANCED: Protect XMATHX placeholders and associated command names from translation
-                import re
-                xm_placeholders = re.findall(r'XMATHX[A-Z_]*', text_original)
-                if xm_placeholders:
-                    # Ensure XMATHX patterns are in skip_commands for protection
-                    for placeholder in xm_placeholders:
-                        base_pattern = placeholder.split('_')[0]  # Get 'XMATHX' part
-                        if base_pattern not in config.skip_commands:
-                            config.skip_commands.append(base_pattern)
-                        if placeholder not in config.skip_commands:
-                            config.skip_commands.append(placeholder)
-
-                    # NEW: Also protect LaTeX command names that follow XMATHX placeholders
-                    # This prevents commands like "bibliographystyle" from being translated
-                    # when they appear after XMATHXBS placeholders
-                    command_pattern = r'XMATHX[A-Z_]*\s+(\w+)(?:\s*\{[^}]*\})*'
-                    command_matches = re.findall(command_pattern, text_original)
-                    if command_matches:
-                        for command_name in command_matches:
-                            if command_name not in config.skip_commands:
-                                config.skip_commands.append(command_name)
-
-                result = self.translator.translate(text_original)
-            parts_translated.append(result)
+        texts_original = [part.strip() for part in parts]
+        texts_to_translate = []
+        for text_original in texts_original:
+            if text_original.upper() == text_original or text_original in texts_to_translate:
+                continue
+            texts_to_translate.append(text_original)
+            # ENHANCED: Protect XMATHX placeholders and associated command names from translation
+            xm_placeholders = patterns.compile(r'XMATHX[A-Z_]*').findall(text_original)
+            if xm_placeholders:
+                # Ensure XMATHX patterns are in skip_commands for protection
+                for placeholder in xm_placeholders:
+                    base_pattern = placeholder.split('_')[0]  # Get 'XMATHX' part
+                    if base_pattern not in config.skip_commands:
+                        config.skip_commands.append(base_pattern)
+                    if placeholder not in config.skip_commands:
+                        config.skip_commands.append(placeholder)
+
+                # NEW: Also protect LaTeX command names that follow XMATHX placeholders
+                # This prevents commands like "bibliographystyle" from being translated
+                # when they appear after XMATHXBS placeholders
+                command_pattern = patterns.compile(r'XMATHX[A-Z_]*\s+(\w+)(?:\s*\{[^}]*\})*')
+                command_matches = command_pattern.findall(text_original)
+                if command_matches:
+                    for command_name in command_matches:
+                        if command_name not in config.skip_commands:
+                            config.skip_commands.append(command_name)
+
+        segments = getattr(self.local, 'segments', None)
+        if segments is not None:
+            # collecting pass of the asyncio mode, the texts without translation yet are left as they are
+            translations = {text: segments[text] for text in texts_to_translate if text in segments}
+            self.local.missing.update(text for text in texts_to_translate if text not in segments)
+        else:
+            translations = self.recall_segments(texts_to_translate) if self.add_cache else {}
+            new_translations = {}
+            for text_original in texts_to_translate:
+                if text_original not in translations:
+                    new_translations[text_original] = translations[text_original] = self.translator.translate(text_original)
+            if self.add_cache and new_translations:
+                self.remember_segments(new_translations)
+        if not all(rememberable(translation) for translation in translations.values()):
+            self.local.partial = True
+        parts_translated = [translations.get(text_original, text_original) for text_original in texts_original]
         text_translated = '\n'.join(parts_translated)
         return text_translated.replace("\u200b", "")
 
+    def segment_memory_key(self, canonical_text):
+        return cache.segment_key(canonical_text, self.memory_context + ('segment', ))
+
+    def recall_segments(self, texts):
+        # the masked texts are looked up with their codes renumbered, so that the same sentence around other objects is found as well
+        canonical_texts = {text: process_latex.canonicalize_codes(text) for text in texts}
+        keys = {text: self.segment_memory_key(canonical_text) for text, (canonical_text, codes) in canonical_texts.items()}
+        cached_segments = self.memory.get_many(keys.values(), self.translator.metrics)
+        translations = {}
+        for text, key in keys.items():
+            if key in cached_segments:
+                codes = canonical_texts[text][1]
+                result = process_latex.renumber_codes(cached_segments[key], {process_latex.variable_code(j): code for j, code in enumerate(codes)})
+                if result is not None:
+                    translations[text] = result
+        return translations
+
+    def remember_segments(self, translations):
+        new_segments = {}
+        for text, result in translations.items():
+            if not rememberable(result):
+                continue
+            canonical_text, codes = process_latex.canonicalize_codes(text)
+            canonical_result = process_latex.renumber_codes(result, {code: process_latex.variable_code(j) for j, code in enumerate(codes)})
+            if canonical_result is not None:
+                new_segments[self.segment_memory_key(canonical_text)] = canonical_result
+        if new_segments:
+            self.memory.put_many(new_segments, self.translator.metrics)
+
     def replace_with_uppercase(self, text, word):
         # Construct a regex pattern that matches the word regardless of case
-        pattern = re.compile(re.escape(word), re.IGNORECASE)
+        pattern = patterns.compile(re.escape(word), re.IGNORECASE)
         # Replace all matches with the uppercase version of the word
         result = pattern.sub(word.upper(), text)
         return result
@@ -194,20 +466,20 @@ class LatexTranslator:
         def fix_bibliography_formatting(text):
             """Fix bibliography formatting issues in LaTeX text."""
             # Fix missing backslashes on bibliography commands
-            text = re.sub(r'(?<!\\)(bibliographystyle|bibliography)(?=\s*\{)', r'\\\1', text)
+            text = patterns.compile(r'(?<!\\)(bibliographystyle|bibliography)(?=\s*\{)').sub(r'\\\1', text)
 
             # Fix double backslash issues
-            text = re.sub(r'\\\\(bibliographystyle|bibliography)', r'\\\1', text)
+            text = patterns.compile(r'\\\\(bibliographystyle|bibliography)').sub(r'\\\1', text)
             # Also handle the case where we have space + double backslash
-            text = re.sub(r'\\ \\(bibliographystyle|bibliography)', r'\\\1', text)
+            text = patterns.compile(r'\\ \\(bibliographystyle|bibliography)').sub(r'\\\1', text)
 
             # Fix spaces after backslashes
-            text = re.sub(r'\\\s+(bibliographystyle|bibliography)', r'\\\1', text)
-            text = re.sub(r'\\ (bibliographystyle|bibliography)', r'\\\1', text)
+            text = patterns.compile(r'\\\s+(bibliographystyle|bibliography)').sub(r'\\\1', text)
+            text = patterns.compile(r'\\ (bibliographystyle|bibliography)').sub(r'\\\1', text)
 
             # Fix extra spaces inside braces for bibliography commands
-            text = re.sub(r'(\\(?:bibliographystyle|bibliography)\s*\{)\s*([^}]+?)\s*(\})',
-                          lambda m: m.group(1) + m.group(2).strip() + m.group(3), text)
+            text = patterns.compile(r'(\\(?:bibliographystyle|bibliography)\s*\{)\s*([^}]+?)\s*(\})').sub(
+                lambda m: m.group(1) + m.group(2).strip() + m.group(3), text)
 
             return text
 
@@ -225,7 +497,7 @@ class LatexTranslator:
         if not self.complete:
             text_original_paragraph = process_text.split_titles(text_original_paragraph)
         # Remove additional space
-        text_original_paragraph = re.sub(r'  +', ' ', text_original_paragraph)
+        text_original_paragraph = patterns.compile(r'  +').sub(' ', text_original_paragraph)
         if self.debug:
             print(f'\n\nParagraph {self.num}\n\n', file=self.f_old)
             print(text_original_paragraph, file=self.f_old)
@@ -239,8 +511,13 @@ class LatexTranslator:
                 print(f'obj {i}', file=self.f_obj)
                 print(obj, file=self.f_obj)
         latex_translated_paragraph, nbad, ntotal = process_latex.recover_latex_objects(text_translated_paragraph, objs, tolerate_error=True)
-        self.nbad += nbad
-        self.ntotal += ntotal
+        if getattr(self.local, 'segments', None) is not None:
+            # only the last collecting pass of a paragraph is counted
+            self.local.nbad += nbad
+            self.local.ntotal += ntotal
+        else:
+            self.nbad += nbad
+            self.ntotal += ntotal
         return latex_translated_paragraph
 
     def translate_text_in_paragraph_latex(self, paragraph):
@@ -283,19 +560,14 @@ class LatexTranslator:
             if command_name not in config.skip_commands:
                 all_commands.append(command_name)
 
-        # Process environments
-        for env_name in all_environments:
-            latex = process_latex.process_specific_env(latex, translate_function, env_name)
-            latex = process_latex.process_specific_env(latex, translate_function, env_name + r'\*')
-
-        # Process commands
-        for command_name in all_commands:
-            latex = process_latex.process_specific_command(latex, translate_function, command_name)
-            latex = process_latex.process_specific_command(latex, translate_function, command_name + r'\*')
-
-        # Process multi-argument commands
-        for command_group in config.mularg_command_list:
-            latex = process_latex.process_mularg_command(latex, translate_function, command_group)
+        # Process environments (and their starred versions), commands and multi-argument commands in one traversal
+        latex = process_latex.process_objects(
+            latex,
+            translate_function,
+            env_names=all_environments + [env_name + '*' for env_name in all_environments],
+            command_names=all_commands + [command_name + '*' for command_name in all_commands],
+            mularg_commands=config.mularg_command_list,
+        )
 
         return latex
 
@@ -317,24 +589,28 @@ class LatexTranslator:
         3. convert text back to objects
         '''
         text, objs = process_latex.replace_latex_objects(latex, brace=False)
-        paragraphs_text = re.split(r'\n\n+', text)
+        paragraphs_text = patterns.compile(r'\n\n+').split(text)
         paragraphs_latex = [process_latex.recover_latex_objects(paragraph_text, objs)[0] for paragraph_text in paragraphs_text]
         return paragraphs_latex
 
     def worker(self, latex_original_paragraph):
         try:
+            if self.add_cache:
+                key = self.memory_key(latex_original_paragraph)
             # Check for problematic LaTeX patterns that might cause issues
             if '\\string' in latex_original_paragraph:
                 print(f"Warning: Found problematic \\string pattern in paragraph {self.num}, cleaning...")
                 # Replace problematic patterns: \stringX -> X for any X
-                latex_original_paragraph = re.sub(r'\\string(.)', r'\1', latex_original_paragraph)
+                latex_original_paragraph = patterns.compile(r'\\string(.)').sub(r'\1', latex_original_paragraph)
 
             if self.add_cache:
-                hash_key_paragraph = cache.deterministic_hash(latex_original_paragraph)
-                latex_translated_paragraph = cache.load_paragraph(self.hash_key, hash_key_paragraph)
+                latex_translated_paragraph = self.cached_paragraphs.get(key)
                 if latex_translated_paragraph is None:
+                    self.local.partial = False
                     latex_translated_paragraph = self.translate_paragraph_latex(latex_original_paragraph)
-                    cache.write_paragraph(self.hash_key, hash_key_paragraph, latex_translated_paragraph)
+                    # a paragraph with untranslated or fallback segments is translated again next time
+                    if not self.local.partial:
+                        self.memory.put(key, latex_translated_paragraph, self.translator.metrics)
             else:
                 latex_translated_paragraph = self.translate_paragraph_latex(latex_original_paragraph)
             self.num += 1
@@ -351,52 +627,97 @@ class LatexTranslator:
             print(f'Unexpected error in Paragraph {self.num}: {e}')
             return latex_original_paragraph
 
-    def translate_full_latex(self, latex_original, make_complete=True, nocache=False):
-        self.add_cache = (not nocache)
-        if self.add_cache:
-            cache.remove_extra()
-            self.hash_key = cache.deterministic_hash((latex_original, __version__, self.translator.engine, self.translator.language_from, self.translator.language_to, config.mularg_command_list))
-            if cache.is_cached(self.hash_key):
-                print('Cache is found')
-            cache.create_cache(self.hash_key)
-
-        self.nbad = 0
-        self.ntotal = 0
+    # passes of a paragraph in the asyncio mode, the segments still missing after the last one are left as they are
+    max_passes = 3
 
-        latex_original = process_latex.remove_tex_comments(latex_original)
-        latex_original = latex_original.replace(r'\mathbf', r'\boldsymbol')
-        # \bibinfo {note} is not working in xelatex
-        latex_original = process_latex.remove_bibnote(latex_original)
-        latex_original = process_latex.process_newcommands(latex_original)
+    def collect_paragraph(self, latex_original_paragraph, segments):
+        # one pass of the asyncio mode, on a thread of the executor
+        self.local.segments, self.local.missing = segments, set()
+        self.local.nbad = self.local.ntotal = 0
+        self.local.partial = False
+        try:
+            latex_translated_paragraph = self.translate_paragraph_latex(latex_original_paragraph)
+            return latex_translated_paragraph, list(self.local.missing), self.local.nbad, self.local.ntotal, self.local.partial
+        finally:
+            self.local.segments = self.local.missing = None
 
-        # Protect makeatletter blocks to prevent translation of @ commands
-        latex_original, protected_blocks = process_latex.process_makeatletter_blocks(latex_original)
+    async def translate_paragraph_latex_async(self, latex_original_paragraph):
+        '''
+        The text segments inside objects are only known once the text around them is translated,
+        so the paragraph is processed with the translations known so far, the missing segments are translated concurrently,
+        and again until nothing is missing, for at most max_passes. Two passes are usually enough.
+        The passes run on the default executor so that large paragraphs do not hold the event loop.
+        Returns the translated paragraph and whether some of its segments were left untranslated or translated by a fallback engine.
+        '''
+        segments = {}
+        loop = asyncio.get_running_loop()
+        for passes in range(1, self.max_passes + 1):
+            latex_translated_paragraph, missing, nbad, ntotal, partial = await loop.run_in_executor(None, self.collect_paragraph, latex_original_paragraph, segments)
+            if not missing:
+                break
+            if passes == self.max_passes:
+                print(f'Warning: {len(missing)} segments are still missing after {passes} passes, they are left as they are')
+                partial = True
+                break
+            if self.add_cache:
+                segments.update(self.recall_segments(missing))
+                missing = [text for text in missing if text not in segments]
+            results = await asyncio.gather(*(self.translator.translate_async(text) for text in missing))
+            new_translations = dict(zip(missing, results))
+            segments.update(new_translations)
+            if self.add_cache and new_translations:
+                self.remember_segments(new_translations)
+        self.nbad += nbad
+        self.ntotal += ntotal
+        return latex_translated_paragraph, partial
 
-        latex_original = process_latex.replace_accent(latex_original)
-        latex_original = process_latex.replace_special(latex_original)
+    async def worker_async(self, latex_original_paragraph):
+        try:
+            if self.add_cache:
+                key = self.memory_key(latex_original_paragraph)
+            if '\\string' in latex_original_paragraph:
+                print(f"Warning: Found problematic \\string pattern in paragraph {self.num}, cleaning...")
+                latex_original_paragraph = patterns.compile(r'\\string(.)').sub(r'\1', latex_original_paragraph)
 
-        self.complete = process_latex.is_complete(latex_original)
-        self.theorems = process_latex.get_theorems(latex_original)
-        if self.complete:
-            print('It is a full latex document')
-            latex_original, tex_begin, tex_end = process_latex.split_latex_document(latex_original, r'\begin{document}', r'\end{document}')
-            tex_begin = process_latex.remove_blank_lines(tex_begin)
-            tex_begin = process_latex.insert_macro(tex_begin, '\\usepackage{xeCJK}\n\\usepackage{amsmath}')
-        else:
-            print('It is not a full latex document')
-            latex_original = process_text.connect_paragraphs(latex_original)
-            if make_complete:
-                tex_begin = default_begin
-                tex_end = default_end
+            if self.add_cache:
+                latex_translated_paragraph = self.cached_paragraphs.get(key)
+                if latex_translated_paragraph is None:
+                    latex_translated_paragraph, partial = await self.translate_paragraph_latex_async(latex_original_paragraph)
+                    if not partial:
+                        self.memory.put(key, latex_translated_paragraph, self.translator.metrics)
             else:
-                tex_begin = ''
-                tex_end = ''
+                latex_translated_paragraph, partial = await self.translate_paragraph_latex_async(latex_original_paragraph)
+            self.num += 1
+            return latex_translated_paragraph
+        except Exception as e:
+            print(f'Error found in Paragraph {self.num}')
+            print(f'Error type: {type(e).__name__}')
+            print(f'Error message: {str(e)}')
+            print('Returning original paragraph to continue translation...')
+            return latex_original_paragraph
 
-        latex_original_paragraphs = self.split_latex_to_paragraphs(latex_original)
-        latex_translated_paragraphs = []
-        self.num = 0
+    async def translate_paragraphs_async(self, latex_original_paragraphs):
+        # every paragraph is a coroutine, the number of requests in flight is limited by the translator
+        async def run(index, paragraph):
+            return index, await self.worker_async(paragraph)
+
+        latex_translated_paragraphs = list(latex_original_paragraphs)
+        tasks = [asyncio.ensure_future(run(i, paragraph)) for i, paragraph in enumerate(latex_original_paragraphs)]
+        for done, task in enumerate(tqdm.auto.tqdm(asyncio.as_completed(tasks), total=len(tasks)), 1):
+            index, result = await task
+            latex_translated_paragraphs[index] = result
+            if self.progress is not None:
+                self.progress(done, len(tasks))
+        return latex_translated_paragraphs
+
+    def translate_paragraphs_threads(self, latex_original_paragraphs):
         # tqdm with concurrent.futures.ThreadPoolExecutor() and timeout handling
-        with concurrent.futures.ThreadPoolExecutor(max_workers=self.threads) as executor:
+        threads = self.threads
+        batcher = getattr(self.translator, 'batcher', None)
+        if threads is None and batcher is not None:
+            # workers mostly wait for their batch, there must be enough of them to fill one batch while another is sent
+            threads = 2 * batcher.max_segments
+        with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
             # Use submit with timeout instead of map to prevent hanging
             future_to_index = {executor.submit(self.worker, paragraph): i for i, paragraph in enumerate(latex_original_paragraphs)}
             latex_translated_paragraphs = [None] * len(latex_original_paragraphs)
@@ -422,6 +743,8 @@ class LatexTranslator:
                     index = future_to_index[future]
                     latex_translated_paragraphs[index] = latex_original_paragraphs[index]
                     completed_count += 1
+                if self.progress is not None:
+                    self.progress(completed_count, len(latex_original_paragraphs))
 
             # After as_completed, check for any futures that didn't complete
             remaining_futures = [f for f in all_futures if not f.done()]
@@ -439,6 +762,70 @@ class LatexTranslator:
                         index = future_to_index[future]
                         latex_translated_paragraphs[index] = latex_original_paragraphs[index]
                         completed_count += 1
+        return latex_translated_paragraphs, completed_count
+
+    def memory_key(self, latex_original_paragraph):
+        # besides the paragraph, the translation depends on the theorem environments it uses and on whether the document is complete
+        theorems = tuple(name for name in self.theorems if '{' + name + '}' in latex_original_paragraph)
+        return cache.segment_key(latex_original_paragraph, self.memory_context + (self.complete, theorems))
+
+    def translate_full_latex(self, latex_original, make_complete=True, nocache=False):
+        self.add_cache = (not nocache)
+        if self.add_cache:
+            self.memory = cache.get_memory()
+            self.memory.evict()
+            # only the translations of the first engine of the chain are remembered, see Fallback
+            engine = self.translator.engine.split(',')[0]
+            model = config.openai_model if engine == 'openai' else ''
+            # the glossary is part of the openai prompt, translations made with another glossary are not reused
+            glossary = cache.deterministic_hash(sorted((config.openai_glossary or {}).items())) if engine == 'openai' else ''
+            self.memory_context = (engine, model, glossary, self.translator.language_from, self.translator.language_to, config.mularg_command_list, __version__)
+
+        self.nbad = 0
+        self.ntotal = 0
+
+        latex_original = process_latex.remove_tex_comments(latex_original)
+        latex_original = latex_original.replace(r'\mathbf', r'\boldsymbol')
+        # \bibinfo {note} is not working in xelatex
+        latex_original = process_latex.remove_bibnote(latex_original)
+        latex_original = process_latex.process_newcommands(latex_original)
+
+        # Protect makeatletter blocks to prevent translation of @ commands
+        latex_original, protected_blocks = process_latex.process_makeatletter_blocks(latex_original)
+
+        latex_original = process_latex.replace_accent(latex_original)
+        latex_original = process_latex.replace_special(latex_original)
+
+        self.complete = process_latex.is_complete(latex_original)
+        self.theorems = process_latex.get_theorems(latex_original)
+        if self.complete:
+            print('It is a full latex document')
+            latex_original, tex_begin, tex_end = process_latex.split_latex_document(latex_original, r'\begin{document}', r'\end{document}')
+            tex_begin = process_latex.remove_blank_lines(tex_begin)
+            tex_begin = process_latex.insert_macro(tex_begin, '\\usepackage{xeCJK}\n\\usepackage{amsmath}')
+        else:
+            print('It is not a full latex document')
+            latex_original = process_text.connect_paragraphs(latex_original)
+            if make_complete:
+                tex_begin = default_begin
+                tex_end = default_end
+            else:
+                tex_begin = ''
+                tex_end = ''
+
+        latex_original_paragraphs = self.split_latex_to_paragraphs(latex_original)
+        if self.add_cache:
+            self.cached_paragraphs = self.memory.get_many((self.memory_key(paragraph) for paragraph in latex_original_paragraphs), self.translator.metrics)
+            if self.cached_paragraphs:
+                print(f'{len(self.cached_paragraphs)} paragraphs are found in the translation memory')
+        self.num = 0
+        if self.progress is not None:
+            self.progress(0, len(latex_original_paragraphs))
+        if self.asynchronous:
+            latex_translated_paragraphs = asyncio.run(self.translate_paragraphs_async(latex_original_paragraphs))
+            completed_count = len(latex_translated_paragraphs)
+        else:
+            latex_translated_paragraphs, completed_count = self.translate_paragraphs_threads(latex_original_paragraphs)
 
         # Check for any None values and fill with original text
         none_count = latex_translated_paragraphs.count(None)
@@ -471,31 +858,34 @@ class LatexTranslator:
         def fix_bibliography_formatting(text):
             """Fix bibliography formatting issues in LaTeX text."""
             # Fix double backslash issues
-            text = re.sub(r'\\\\(bibliographystyle|bibliography)', r'\\\1', text)
+            text = patterns.compile(r'\\\\(bibliographystyle|bibliography)').sub(r'\\\1', text)
             # Also handle the case where we have space + double backslash
-            text = re.sub(r'\\ \\(bibliographystyle|bibliography)', r'\\\1', text)
+            text = patterns.compile(r'\\ \\(bibliographystyle|bibliography)').sub(r'\\\1', text)
 
             # Fix spaces after backslashes
-            text = re.sub(r'\\\s+(bibliographystyle|bibliography)', r'\\\1', text)
-            text = re.sub(r'\\ (bibliographystyle|bibliography)', r'\\\1', text)
+            text = patterns.compile(r'\\\s+(bibliographystyle|bibliography)').sub(r'\\\1', text)
+            text = patterns.compile(r'\\ (bibliographystyle|bibliography)').sub(r'\\\1', text)
 
             # Fix missing backslashes on bibliography commands
-            text = re.sub(r'(?<!\\)(bibliographystyle|bibliography)(?=\s*\{)', r'\\\1', text)
+            text = patterns.compile(r'(?<!\\)(bibliographystyle|bibliography)(?=\s*\{)').sub(r'\\\1', text)
 
             # Fix extra spaces inside braces for bibliography commands
-            text = re.sub(r'(\\(?:bibliographystyle|bibliography)\s*\{)\s*([^}]+?)\s*(\})',
-                          lambda m: m.group(1) + m.group(2).strip() + m.group(3), text)
+            text = patterns.compile(r'(\\(?:bibliographystyle|bibliography)\s*\{)\s*([^}]+?)\s*(\})').sub(
+                lambda m: m.group(1) + m.group(2).strip() + m.group(3), text)
 
             # Remove duplicate bibliography commands (keep first occurrence)
             lines = text.split('\n')
             seen_commands = set()
             cleaned_lines = []
 
+            has_command = patterns.compile(r'\\(?:bibliographystyle|bibliography)\s*\{[^}]*\}')
+            command_pattern = patterns.compile(r'\\(bibliographystyle|bibliography)\s*\{([^}]*)\}')
+
             for line in lines:
                 # Check if this line contains a bibliography command
-                if re.search(r'\\(?:bibliographystyle|bibliography)\s*\{[^}]*\}', line):
+                if has_command.search(line):
                     # Extract the command and its argument
-                    match = re.search(r'\\(bibliographystyle|bibliography)\s*\{([^}]*)\}', line)
+                    match = command_pattern.search(line)
                     if match:
                         command = match.group(1)
                         argument = match.group(2)
@@ -522,11 +912,14 @@ class LatexTranslator:
             seen_commands = set()
             cleaned_lines = []
 
+            has_command = patterns.compile(r'\\(?:bibliographystyle|bibliography)\s*\{[^}]*\}')
+            command_pattern = patterns.compile(r'\\(bibliographystyle|bibliography)\s*\{([^}]*)\}')
+
             for line in lines:
                 # Check if this line contains a bibliography command
-                if re.search(r'\\(?:bibliographystyle|bibliography)\s*\{[^}]*\}', line):
+                if has_command.search(line):
                     # Extract the command and its argument
-                    match = re.search(r'\\(bibliographystyle|bibliography)\s*\{([^}]*)\}', line)
+                    match = command_pattern.search(line)
                     if match:
                         command = match.group(1)
                         argument = match.group(2)
@@ -550,10 +943,10 @@ class LatexTranslator:
         def fix_color_model_translation(text):
             """Fix color model names that were incorrectly translated with spaces"""
             # Fix RGB color model - remove extra spaces that were added during translation
-            text = re.sub(r'\{\s*RGB\s*\}', '{RGB}', text)
+            text = patterns.compile(r'\{\s*RGB\s*\}').sub('{RGB}', text)
 
             # Fix HTML color model
-            text = re.sub(r'\{\s*HTML\s*\}', '{HTML}', text)
+            text = patterns.compile(r'\{\s*HTML\s*\}').sub('{HTML}', text)
 
             # Fix other color models that might have been affected
             color_models = ['RGB', 'CMYK', 'HSB', 'HSL', 'Gray', 'wave']
@@ -561,13 +954,13 @@ class LatexTranslator:
                 # Match translated model names with spaces around them
                 pattern = rf'\{{\s*{model}\s*\}}'
                 replacement = f'{{{model}}}'
-                text = re.sub(pattern, replacement, text, flags=re.IGNORECASE)
+                text = patterns.compile(pattern, re.IGNORECASE).sub(replacement, text)
 
             # Fix color values that have extra spaces
-            text = re.sub(r'\{\s*(\d+)\s*,\s*(\d+)\s*,\s*(\d+)\s*\}', r'{\1,\2,\3}', text)
+            text = patterns.compile(r'\{\s*(\d+)\s*,\s*(\d+)\s*,\s*(\d+)\s*\}').sub(r'{\1,\2,\3}', text)
 
             # Fix HTML color values with extra spaces
-            text = re.sub(r'\{\s*([A-F0-9]+)\s*\}', r'{\1}', text)
+            text = patterns.compile(r'\{\s*([A-F0-9]+)\s*\}').sub(r'{\1}', text)
 
             return text
 
@@ -576,24 +969,23 @@ class LatexTranslator:
         # ENHANCED: Fix LaTeX unit preservation
         def fix_latex_units(text):
             """Fix LaTeX unit preservation issues"""
-            import re
             # Preserve common LaTeX units that might have been translated in commands
             # Focus on the specific case we found first
-            text = re.sub(r'(\\vskip\s+[\d.]+)\s*英寸', r'\1in', text, flags=re.IGNORECASE)
-            text = re.sub(r'(\\hskip\s+[\d.]+)\s*英寸', r'\1in', text, flags=re.IGNORECASE)
-            text = re.sub(r'(\\skip\s+[\d.]+)\s*英寸', r'\1in', text, flags=re.IGNORECASE)
-            text = re.sub(r'(\\kern\s+[\d.]+)\s*英寸', r'\1in', text, flags=re.IGNORECASE)
-            text = re.sub(r'(\\hfil\s+[\d.]+)\s*英寸', r'\1in', text, flags=re.IGNORECASE)
-            text = re.sub(r'(\\vfil\s+[\d.]+)\s*英寸', r'\1in', text, flags=re.IGNORECASE)
-            text = re.sub(r'(\\hfill\s+[\d.]+)\s*英寸', r'\1in', text, flags=re.IGNORECASE)
-            text = re.sub(r'(\\vfill\s+[\d.]+)\s*英寸', r'\1in', text, flags=re.IGNORECASE)
+            text = patterns.compile(r'(\\vskip\s+[\d.]+)\s*英寸', re.IGNORECASE).sub(r'\1in', text)
+            text = patterns.compile(r'(\\hskip\s+[\d.]+)\s*英寸', re.IGNORECASE).sub(r'\1in', text)
+            text = patterns.compile(r'(\\skip\s+[\d.]+)\s*英寸', re.IGNORECASE).sub(r'\1in', text)
+            text = patterns.compile(r'(\\kern\s+[\d.]+)\s*英寸', re.IGNORECASE).sub(r'\1in', text)
+            text = patterns.compile(r'(\\hfil\s+[\d.]+)\s*英寸', re.IGNORECASE).sub(r'\1in', text)
+            text = patterns.compile(r'(\\vfil\s+[\d.]+)\s*英寸', re.IGNORECASE).sub(r'\1in', text)
+            text = patterns.compile(r'(\\hfill\s+[\d.]+)\s*英寸', re.IGNORECASE).sub(r'\1in', text)
+            text = patterns.compile(r'(\\vfill\s+[\d.]+)\s*英寸', re.IGNORECASE).sub(r'\1in', text)
 
             # General fixes for any other places with units
-            text = re.sub(r'([\d.]+)\s*英寸', r'\1in', text, flags=re.IGNORECASE)
-            text = re.sub(r'([\d.]+)\s*厘米', r'\1cm', text, flags=re.IGNORECASE)
-            text = re.sub(r'([\d.]+)\s*毫米', r'\1mm', text, flags=re.IGNORECASE)
-            text = re.sub(r'([\d.]+)\s*点', r'\1pt', text, flags=re.IGNORECASE)
-            text = re.sub(r'([\d.]+)\s*派卡', r'\1pc', text, flags=re.IGNORECASE)
+            text = patterns.compile(r'([\d.]+)\s*英寸', re.IGNORECASE).sub(r'\1in', text)
+            text = patterns.compile(r'([\d.]+)\s*厘米', re.IGNORECASE).sub(r'\1cm', text)
+            text = patterns.compile(r'([\d.]+)\s*毫米', re.IGNORECASE).sub(r'\1mm', text)
+            text = patterns.compile(r'([\d.]+)\s*点', re.IGNORECASE).sub(r'\1pt', text)
+            text = patterns.compile(r'([\d.]+)\s*派卡', re.IGNORECASE).sub(r'\1pc', text)
 
             return text
 
@@ -602,7 +994,6 @@ class LatexTranslator:
         # ENHANCED: Fix XeLaTeX compatibility issues
         def fix_xelatex_compatibility(text):
             """Fix XeLaTeX compatibility issues"""
-            import re
             modifications = [
                 # Remove \pdfoutput=1 command which is only for pdfTeX
                 (r'\\pdfoutput=1\s*\n?', ''),
@@ -613,7 +1004,7 @@ class LatexTranslator:
             ]
 
             for pattern, replacement in modifications:
-                text = re.sub(pattern, replacement, text, flags=re.MULTILINE)
+                text = patterns.compile(pattern, re.MULTILINE).sub(replacement, text)
 
             return text
 
@@ -636,20 +1027,62 @@ class LatexTranslator:
         return latex_translated
 
 
-def translate_single_tex_file(input_path, output_path, engine, l_from, l_to, debug, nocache, threads):
+def translate_single_tex_file(input_path, output_path, engine, l_from, l_to, debug, nocache, threads, batch=False, asynchronous=False, metrics_path=None, progress=None):
+    # metrics_path: where the JSON usage report of the document is written, if anywhere
+    # progress: called with the number of paragraphs translated and their total, see LatexTranslator
     # Display translation engine information
     import os
     filename = os.path.basename(input_path)
     print(f'Processing {filename} using {engine.upper()} translation engine...')
 
-    text_translator = TextTranslator(engine, l_to, l_from)
-    latex_translator = LatexTranslator(text_translator, debug, threads)
+    text_translator = TextTranslator(engine, l_to, l_from, batch=batch, threads=threads)
+    latex_translator = LatexTranslator(text_translator, debug, threads, asynchronous, os.path.dirname(os.path.abspath(output_path)), progress)
 
     input_encoding = get_file_encoding(input_path)
     text_original = open(input_path, encoding=input_encoding).read()
-    text_final = latex_translator.translate_full_latex(text_original, nocache=nocache)
+    try:
+        text_final = latex_translator.translate_full_latex(text_original, nocache=nocache)
+    finally:
+        text_translator.close()
     with open(output_path, "w", encoding='utf-8') as file:
         print(text_final, file=file)
     print('Number of translation called:', text_translator.number_of_calls)
+    if text_translator.batcher is not None:
+        print('Segments sent in batches:', text_translator.batcher.number_of_segments)
     print('Total characters translated:', text_translator.tot_char)
+    for engine_translator in text_translator.engines:
+        name = engine_translator.engine
+        if engine_translator.abandoned_calls:
+            print(f"Warning: {engine_translator.abandoned_calls} calls to {name} timed out and were abandoned")
+        if hasattr(engine_translator.translator, 'connection_stats'):
+            stats = engine_translator.translator.connection_stats()
+            print(f"Connections to {name}: {stats['connections_created']} opened, {stats['connections_reused']} reused")
+        if hasattr(engine_translator.translator, 'prompt_tokens'):
+            translator = engine_translator.translator
+            print(f"Requests to {name}: {translator.number_of_requests}, {translator.prompt_tokens} prompt tokens ({translator.cached_tokens} cached), {translator.completion_tokens} completion tokens")
+            stats = translator.throughput_stats()
+            if stats['requests']:
+                first_token = f", first token after {stats['time_to_first_token']:.1f} s" if stats['time_to_first_token'] is not None else ''
+                print(f"Throughput of {stats['model']} at {stats['base_url']}: {stats['tokens_per_second']:.1f} tokens/s, {stats['duration']:.1f} s per request{first_token}")
+        stats = engine_translator.metrics.latency.to_dict()
+        if stats['count']:
+            print(f"Latency of {name}: {stats['p50']:.2f} s median, {stats['p90']:.2f} s at 90%, {stats['max']:.2f} s at most over {stats['count']} requests")
+        stats = engine_translator.limiter.stats()
+        print(f"Rate limiter of {name}: {stats['rate']:.1f} requests/s, {stats['throttles']} throttled requests, {stats['waited']:.1f} s spent waiting")
+        stats = engine_translator.breaker.stats()
+        if stats['times_opened']:
+            print(f"Circuit of {name} opened {stats['times_opened']} times, {stats['rejected']} requests skipped it")
+    if text_translator.untranslated:
+        print(f'Warning: {text_translator.untranslated} segments could not be translated by any engine and are left as they are')
+    if not nocache:
+        stats = text_translator.metrics.report()['cache']
+        if stats['hit_rate'] is not None:
+            print(f"Translation memory: {stats['hits']} paragraphs or segments reused, {stats['misses']} not found, hit rate {stats['hit_rate']:.0%}")
+    if metrics_path is not None:
+        text_translator.metrics.write_report(metrics_path, input=input_path, output=output_path, engine=engine, language_from=l_from, language_to=l_to,
+                                             calls=text_translator.number_of_calls, characters=text_translator.tot_char)
+        print('usage report saved to', metrics_path)
+    if debug:
+        stats = patterns.registry.stats()
+        print(f"Compiled patterns: {stats['patterns']} ({stats['misses']} compiled, {stats['hits']} reused)")
     print('saved to', output_path)
@@ -344,6 +344,17 @@ def is_local_directory(input_str):
     return None
 
 
+def get_document_name(number):
+    """Name of the output directory of an arxiv number, local archive or local directory"""
+    local_archive = is_local_archive(number)
+    if local_archive:
+        return os.path.splitext(os.path.basename(local_archive))[0]
+    local_directory = is_local_directory(number)
+    if local_directory:
+        return os.path.basename(local_directory.rstrip('/\\'))
+    return number.replace('/', '-')
+
+
 def is_pdf(filename):
     return open(filename, 'rb').readline()[0:4] == b'%PDF'
 
@@ -352,12 +363,8 @@ def fallback_compilation(document_dir, tex_filename, document_name, output_dir):
     """Fallback compilation method using basic XeLaTeX with proper bibliography handling"""
     print(f'Using fallback compilation for {tex_filename}...')
 
-    # Change to document directory for compilation
-    original_cwd = os.getcwd()
-    os.chdir(document_dir)
-
     # Check if .bib files exist
-    has_bib_files = len([f for f in os.listdir('.') if f.endswith('.bib')]) > 0
+    has_bib_files = len([f for f in os.listdir(document_dir) if f.endswith('.bib')]) > 0
 
     try:
         # First, clean any previous compilation files to avoid issues
@@ -373,6 +380,7 @@ def fallback_compilation(document_dir, tex_filename, document_name, output_dir):
             clean_files.append(f"{os.path.splitext(tex_filename)[0]}.bbl")
 
         for f in clean_files:
+            f = os.path.join(document_dir, f)
             if os.path.exists(f):
                 os.remove(f)
                 print(f"Cleaned old compilation file: {os.path.basename(f)}")
@@ -385,17 +393,17 @@ def fallback_compilation(document_dir, tex_filename, document_name, output_dir):
             # Step 1: First xelatex run (generates .aux file with citation info)
             print('Running xelatex (1/3)...')
             result1 = subprocess.run(
-                xelatex_cmd_base + ['-no-pdf', tex_filename],
+                xelatex_cmd_base + ['-no-pdf', tex_filename], cwd=document_dir,
                 capture_output=True, text=True, encoding='utf-8', errors='ignore', timeout=300
             )
 
             # Step 2: Run bibtex if .bib files exist and .aux file was generated
             result_bib = None
             aux_filename = f'{os.path.splitext(tex_filename)[0]}.aux'
-            if has_bib_files and os.path.exists(aux_filename):
+            if has_bib_files and os.path.exists(os.path.join(document_dir, aux_filename)):
                 print('Running bibtex...')
                 result_bib = subprocess.run(
-                    bibtex_cmd_base,
+                    bibtex_cmd_base, cwd=document_dir,
                     capture_output=True, text=True, encoding='utf-8', errors='ignore', timeout=120
                 )
                 if result_bib.returncode != 0:
@@ -408,14 +416,14 @@ def fallback_compilation(document_dir, tex_filename, document_name, output_dir):
             # Step 3: Second xelatex run (inserts bibliography and resolves references)
             print('Running xelatex (2/3)...')
             result2 = subprocess.run(
-                xelatex_cmd_base + [tex_filename],
+                xelatex_cmd_base + [tex_filename], cwd=document_dir,
                 capture_output=True, text=True, encoding='utf-8', errors='ignore', timeout=300
             )
 
             # Step 4: Final xelatex run (updates reference numbers)
             print('Running xelatex (3/3)...')
             result3 = subprocess.run(
-                xelatex_cmd_base + [tex_filename],
+                xelatex_cmd_base + [tex_filename], cwd=document_dir,
                 capture_output=True, text=True, encoding='utf-8', errors='ignore', timeout=300
             )
         except subprocess.TimeoutExpired:
@@ -429,7 +437,7 @@ def fallback_compilation(document_dir, tex_filename, document_name, output_dir):
         if all(r.returncode == 0 for r in [result1, result2, result3]):
             print(f'Fallback compilation successful: {tex_filename}')
             pdf_filename = os.path.splitext(tex_filename)[0] + '.pdf'
-            if os.path.exists(pdf_filename):
+            if os.path.exists(os.path.join(document_dir, pdf_filename)):
                 print(f'PDF generated: {pdf_filename}')
                 # Copy PDF to output directory with document name
                 pdf_source_path = os.path.join(document_dir, pdf_filename)
@@ -437,6 +445,7 @@ def fallback_compilation(document_dir, tex_filename, document_name, output_dir):
                 pdf_output_path = os.path.join(output_dir, pdf_output_name)
                 shutil.copy2(pdf_source_path, pdf_output_path)
                 print(f'PDF copied to: {pdf_output_path}')
+                return True
             else:
                 print(f'Fallback compilation completed but PDF not found: {pdf_filename}')
         else:
@@ -449,8 +458,7 @@ def fallback_compilation(document_dir, tex_filename, document_name, output_dir):
 
     except Exception as e:
         print(f'Fallback compilation error for {tex_filename}: {e}')
-    finally:
-        os.chdir(original_cwd)
+    return False
 
 def list_input_files():
     """List all downloaded arxiv files in input directory"""
@@ -565,7 +573,10 @@ def zipdir(dir, output_path):
         zipf.write(file, arcname=rel_path)
 
 
-def translate_dir(dir, options):
+def translate_dir(dir, options, progress=None):
+    # every path is taken under dir, which does not need to be the current directory
+    # progress: called with the index of every main tex file, their number and the file before it is translated,
+    # then with the number of paragraphs of the file translated so far and their total as keyword arguments
     files = loop_files(dir)
     texs = [f[0:-4] for f in files if f[-4:] == '.tex']
     bibs = [f[0:-4] for f in files if f[-4:] == '.bib']
@@ -607,10 +618,17 @@ def translate_dir(dir, options):
             os.remove(f'{basename}.bbl')
     if options.notranslate:
         return complete_texs
-    for filename in complete_texs:
+    for i, filename in enumerate(complete_texs):
+        if progress is not None:
+            progress(i, len(complete_texs), filename)
         print(f'Processing {filename} using {options.engine.upper()} translation engine')
         file_path = f'{filename}.tex'
-        translate_single_tex_file(file_path, file_path, options.engine, options.l_from, options.l_to, options.debug, options.nocache, options.threads)
+        metrics_path = f'{filename}.metrics.json' if options.metrics else None
+        paragraph_progress = None
+        if progress is not None:
+            def paragraph_progress(done, total, i=i, filename=filename):
+                progress(i, len(complete_texs), filename, paragraphs_done=done, paragraphs=total)
+        translate_single_tex_file(file_path, file_path, options.engine, options.l_from, options.l_to, options.debug, options.nocache, options.threads, options.batch, options.asynchronous, metrics_path, paragraph_progress)
 
     # After translation, ensure proper CMYK support if needed
     for tex in complete_texs:
@@ -637,6 +655,77 @@ def translate_dir(dir, options):
     return complete_texs
 
 
+def compile_document(temp_dir, document_dir, main_tex_files, document_name, output_dir):
+    """Copy the translated project from temp_dir to document_dir and compile its main tex files there,
+    returns True if a PDF was copied to output_dir"""
+    compiled = False
+    print('\nCompiling LaTeX files...')
+
+    # Copy all necessary files to document directory for compilation
+    for root, dirs, files in os.walk(temp_dir):
+        for file in files:
+            source_file = os.path.join(root, file)
+            rel_path = os.path.relpath(source_file, temp_dir)
+            target_file = os.path.join(document_dir, rel_path)
+            # Create subdirectories if needed
+            target_dir = os.path.dirname(target_file)
+            if target_dir != document_dir:
+                os.makedirs(target_dir, exist_ok=True)
+            shutil.copy2(source_file, target_file)
+
+    print(f'All files copied to document directory for compilation: {document_dir}')
+
+    # Compile each main tex file using improved compilation script
+    for tex_file in main_tex_files:
+        tex_filename = os.path.basename(tex_file) + '.tex'
+        tex_filepath = os.path.join(document_dir, tex_filename)
+        print(f'Compiling {tex_filename} with improved bibliography handling...')
+
+        try:
+            # Use our improved compilation script
+            import subprocess
+            import sys
+            project_root = os.path.dirname(os.path.abspath(__file__))
+            compile_script = os.path.join(project_root, 'compile_simple.py')
+
+            if os.path.exists(compile_script):
+                result = subprocess.run([
+                    sys.executable, compile_script, tex_filepath
+                ], capture_output=True, text=True, encoding='utf-8', errors='ignore')
+
+                if result.returncode == 0:
+                    print(f'Compiled successfully: {tex_filename}')
+                    pdf_filename = os.path.splitext(tex_filename)[0] + '.pdf'
+                    if os.path.exists(os.path.join(document_dir, pdf_filename)):
+                        print(f'PDF generated: {pdf_filename}')
+                        # Copy PDF to output directory with document name
+                        pdf_source_path = os.path.join(document_dir, pdf_filename)
+                        pdf_output_name = f"{document_name}.pdf"
+                        pdf_output_path = os.path.join(output_dir, pdf_output_name)
+                        shutil.copy2(pdf_source_path, pdf_output_path)
+                        print(f'PDF copied to: {pdf_output_path}')
+                        compiled = True
+                    else:
+                        print(f'Compilation completed but PDF not found: {pdf_filename}')
+                else:
+                    print(f'Compilation failed for {tex_filename}:')
+                    print(f'Error output: {result.stderr}')
+                    # Fallback to simple compilation
+                    compiled = fallback_compilation(document_dir, tex_filename, document_name, output_dir) or compiled
+            else:
+                print(f'Compilation script not found, using fallback method')
+                compiled = fallback_compilation(document_dir, tex_filename, document_name, output_dir) or compiled
+
+        except Exception as e:
+            print(f'Compilation error for {tex_filename}: {e}')
+            # Try fallback method
+            try:
+                compiled = fallback_compilation(document_dir, tex_filename, document_name, output_dir) or compiled
+            except:
+                print(f'Fallback compilation also failed for {tex_filename}')
+    return compiled
+
+
 def main(args=None, require_updated=False):
     '''
     There are four types of a downdload arxiv project
@@ -665,6 +754,10 @@ def main(args=None, require_updated=False):
     parser.add_argument("--clean-input", action='store_true', help='clean all files in input directory')
     parser.add_argument("--no-network-check", action='store_true', help='skip network connectivity check before downloading')
     parser.add_argument("--verify-cache", action='store_true', help='verify integrity of cached ArXiv files')
+    parser.add_argument("--manifest", type=str, help='with --file, JSON file recording the state of every arXiv ID so that an interrupted batch resumes where it stopped, default is the file name followed by .manifest.json')
+    parser.add_argument("--download-workers", type=int, default=4, help='with --file, papers downloaded at the same time, default is 4')
+    parser.add_argument("--translate-workers", type=int, default=2, help='with --file, papers translated at the same time, default is 2')
+    parser.add_argument("--compile-workers", type=int, default=2, help='with --file, papers compiled at the same time, default is 2')
     utils.add_arguments(parser)
     options = parser.parse_args(args)
     utils.process_options(options)
@@ -675,36 +768,11 @@ def main(args=None, require_updated=False):
         with open(options.file, 'r', encoding='utf-8') as f:
             arxiv_ids = [line.strip() for line in f if line.strip()]
 
-        # Process each arXiv ID
-        for idx, arxiv_id in enumerate(arxiv_ids):
-            print(f"\n{'='*60}")
-            print(f"Processing arXiv ID {idx+1}/{len(arxiv_ids)}: {arxiv_id}")
-            print('='*60)
-
-            # Create a new argument list for this ID
-            id_args = args.copy() if args else []
-
-            # Remove any existing number argument
-            if len(id_args) > 0 and not id_args[0].startswith('-'):
-                id_args.pop(0)
-
-            # Add the current arXiv ID as the number argument
-            id_args.insert(0, arxiv_id)
-
-            # Call main recursively for each ID
-            try:
-                result = main(id_args, require_updated=require_updated)
-                print(f"\n{'='*60}")
-                print(f"Result for {arxiv_id}: {'Success' if result else 'Failed'}")
-            except Exception as e:
-                print(f"\n{'='*60}")
-                print(f"Error processing {arxiv_id}: {e}")
-                import traceback
-                traceback.print_exc()
-
-            print('='*60)
-
-        sys.exit(0)
+        import arxiv_batch
+        manifest_path = options.manifest or f'{options.file}.manifest.json'
+        run = arxiv_batch.BatchRun(arxiv_ids, options, args if args is not None else sys.argv[1:], manifest_path)
+        failed = run.run()
+        sys.exit(1 if failed else 0)
 
     # Handle input directory management options (skip version check for these)
     if options.list_input:
@@ -744,19 +812,19 @@ def main(args=None, require_updated=False):
         print(f'Using local archive: {local_archive}')
         print()
         # Use archive filename (without extension) as document name
-        document_name = os.path.splitext(os.path.basename(local_archive))[0]
+        document_name = get_document_name(number)
         print(f'Document name: {document_name}')
     elif local_directory:
         print(f'Using local directory: {local_directory}')
         print()
         # Use directory name as document name
-        document_name = os.path.basename(local_directory.rstrip('/\\'))
+        document_name = get_document_name(number)
         print(f'Document name: {document_name}')
     else:
         print('arxiv number:', number)
         print()
         # Original arxiv processing
-        document_name = number.replace('/', '-')  # Use arxiv ID as document name
+        document_name = get_document_name(number)  # Use arxiv ID as document name
 
     download_path = document_name
 
@@ -782,7 +850,6 @@ def main(args=None, require_updated=False):
 
     success = True
     main_tex_files = False
-    cwd = os.getcwd()
 
     # Create temporary directory within document directory
     import time
@@ -792,13 +859,13 @@ def main(args=None, require_updated=False):
     os.makedirs(temp_dir, exist_ok=True)
     print(f'document directory: {document_dir}')
     print(f'temporary directory: {temp_dir}')
+    # the source is downloaded into the temporary directory, every path below is absolute so that nothing depends on the current directory
+    source_path = os.path.join(temp_dir, download_path)
 
     try:
         if options.from_dir or local_directory:
             src_dir = local_directory if local_directory else number
             shutil.copytree(src_dir, temp_dir, dirs_exist_ok=True)
-        os.chdir(temp_dir)
-        # must os.chdir(cwd) whenever released!
 
         if not options.from_dir and not local_directory:
             if local_archive:
@@ -807,20 +874,18 @@ def main(args=None, require_updated=False):
                     extract_success = process_local_archive(local_archive, temp_dir)
                     if not extract_success:
                         print('Failed to extract local archive')
-                        os.chdir(cwd)
                         shutil.rmtree(temp_dir, ignore_errors=True)
                         return False
                     # After successful extraction, process the directory
-                    main_tex_files = translate_dir('.', options)
+                    main_tex_files = translate_dir(temp_dir, options)
                 except BaseException as e:
                     print(f'Error processing local archive: {e}')
-                    os.chdir(cwd)
                     shutil.rmtree(temp_dir, ignore_errors=True)
                     return False
             else:
                 # Original arxiv download logic
                 try:
-                    download_source_with_cache(number, download_path)
+                    download_source_with_cache(number, source_path)
                 except Exception as download_error:
                     print(f'Cannot download source for arXiv {number}: {download_error}')
                     print('Possible reasons:')
@@ -841,22 +906,21 @@ def main(args=None, require_updated=False):
                     except Exception as check_error:
                         print(f'Unable to verify if arXiv {number} exists: {check_error}')
 
-                    os.chdir(cwd)
                     shutil.rmtree(temp_dir, ignore_errors=True)
                     return False
-                if is_pdf(download_path):
+                if is_pdf(source_path):
                     # case 1
                     success = False
                     main_tex_files = False
                 else:
                     try:
-                        content = gzip.decompress(open(download_path, "rb").read())
-                        with open(download_path, "wb") as f:
+                        content = gzip.decompress(open(source_path, "rb").read())
+                        with open(source_path, "wb") as f:
                             f.write(content)
                     except (EOFError, gzip.BadGzipFile) as e:
                         print(f'Error: Corrupted gzip file detected: {e}')
                         print('Attempting to re-download the file...')
-                        os.remove(download_path)
+                        os.remove(source_path)
                         # Also remove the cached file
                         project_root = os.path.dirname(os.path.abspath(__file__))
                         input_dir = os.path.join(project_root, 'input')
@@ -868,28 +932,27 @@ def main(args=None, require_updated=False):
 
                         try:
                             # Download fresh copy bypassing cache
-                            download_source_with_cache(number, download_path, force_download=True)
-                            content = gzip.decompress(open(download_path, "rb").read())
-                            with open(download_path, "wb") as f:
+                            download_source_with_cache(number, source_path, force_download=True)
+                            content = gzip.decompress(open(source_path, "rb").read())
+                            with open(source_path, "wb") as f:
                                 f.write(content)
                             print('Successfully re-downloaded and decompressed the file')
                         except Exception as e2:
                             print(f'Error: Failed to download or decompress file after retry: {e2}')
-                            os.chdir(cwd)
                             shutil.rmtree(temp_dir, ignore_errors=True)
                             return False
                     try:
                         # case 4
-                        with tarfile.open(download_path, mode='r') as f:
-                            f.extractall()
-                        os.remove(download_path)
+                        with tarfile.open(source_path, mode='r') as f:
+                            f.extractall(temp_dir)
+                        os.remove(source_path)
                     except tarfile.ReadError:
                         # case 2 or 3
                         print('This is a pure text file')
-                        shutil.move(download_path, 'main.tex')
-                main_tex_files = translate_dir('.', options)
+                        shutil.move(source_path, os.path.join(temp_dir, 'main.tex'))
+                main_tex_files = translate_dir(temp_dir, options)
         else:
-            main_tex_files = translate_dir('.', options)
+            main_tex_files = translate_dir(temp_dir, options)
 
         # Handle the case where translate_dir returns False or a list of files
         if main_tex_files is False:
@@ -897,80 +960,15 @@ def main(args=None, require_updated=False):
         else:
             success = True
 
-        os.chdir(cwd)
         if success:
             # case 3 or 4
             zipdir(temp_dir, output_path)
 
             # Compile LaTeX files if --compile option is used
             if options.compile and main_tex_files:
-                print('\nCompiling LaTeX files...')
-
-                # Copy all necessary files to document directory for compilation
-                for root, dirs, files in os.walk(temp_dir):
-                    for file in files:
-                        source_file = os.path.join(root, file)
-                        rel_path = os.path.relpath(source_file, temp_dir)
-                        target_file = os.path.join(document_dir, rel_path)
-                        # Create subdirectories if needed
-                        target_dir = os.path.dirname(target_file)
-                        if target_dir != document_dir:
-                            os.makedirs(target_dir, exist_ok=True)
-                        shutil.copy2(source_file, target_file)
-
-                print(f'All files copied to document directory for compilation: {document_dir}')
-
-                # Compile each main tex file using improved compilation script
-                for tex_file in main_tex_files:
-                    tex_filename = os.path.basename(tex_file) + '.tex'
-                    tex_filepath = os.path.join(document_dir, tex_filename)
-                    print(f'Compiling {tex_filename} with improved bibliography handling...')
-
-                    try:
-                        # Use our improved compilation script
-                        import subprocess
-                        import sys
-                        project_root = os.path.dirname(os.path.abspath(__file__))
-                        compile_script = os.path.join(project_root, 'compile_simple.py')
-
-                        if os.path.exists(compile_script):
-                            result = subprocess.run([
-                                sys.executable, compile_script, tex_filepath
-                            ], capture_output=True, text=True, encoding='utf-8', errors='ignore')
-
-                            if result.returncode == 0:
-                                print(f'Compiled successfully: {tex_filename}')
-                                pdf_filename = os.path.splitext(tex_filename)[0] + '.pdf'
-                                if os.path.exists(os.path.join(document_dir, pdf_filename)):
-                                    print(f'PDF generated: {pdf_filename}')
-                                    # Copy PDF to output directory with document name
-                                    pdf_source_path = os.path.join(document_dir, pdf_filename)
-                                    pdf_output_name = f"{document_name}.pdf"
-                                    pdf_output_path = os.path.join(output_dir, pdf_output_name)
-                                    shutil.copy2(pdf_source_path, pdf_output_path)
-                                    print(f'PDF copied to: {pdf_output_path}')
-                                else:
-                                    print(f'Compilation completed but PDF not found: {pdf_filename}')
-                            else:
-                                print(f'Compilation failed for {tex_filename}:')
-                                print(f'Error output: {result.stderr}')
-                                # Fallback to simple compilation
-                                fallback_compilation(document_dir, tex_filename, document_name, output_dir)
-                        else:
-                            print(f'Compilation script not found, using fallback method')
-                            fallback_compilation(document_dir, tex_filename, document_name, output_dir)
-
-                    except Exception as e:
-                        print(f'Compilation error for {tex_filename}: {e}')
-                        # Try fallback method
-                        try:
-                            fallback_compilation(document_dir, tex_filename, document_name, output_dir)
-                        except:
-                            print(f'Fallback compilation also failed for {tex_filename}')
+                compile_document(temp_dir, document_dir, main_tex_files, document_name, output_dir)
 
     except BaseException as e:
-        # first go back otherwise tempfile trying to delete the current directory that python is running in
-        os.chdir(cwd)
         shutil.rmtree(temp_dir, ignore_errors=True)
         raise e
 
@@ -1007,4 +1005,4 @@ def main(args=None, require_updated=False):
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,168 @@
+'''
+Usage accounting of the translation of a document.
+
+One Metrics is made for every document and shared by everything that translates it:
+each engine of the chain gets an EngineMetrics that its client fills request by request
+(latency, characters, tokens), the engine chain adds the retried, throttled and failed requests,
+and the translation memory its hits and misses.
+The report is a plain dict, written as JSON next to the translated document.
+'''
+import json
+import time
+import bisect
+import datetime
+import threading
+
+# upper bounds in seconds of the buckets of the latency histograms
+latency_buckets = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 180)
+
+
+class LatencyHistogram:
+    def __init__(self, buckets=latency_buckets):
+        self.buckets = buckets
+        # the last count is for the latencies above the last bound
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q):
+        # the upper bound of the bucket of the quantile, the maximum for the last one
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self):
+        buckets = {f'<={bound}': count for bound, count in zip(self.buckets, self.counts)}
+        buckets[f'>{self.buckets[-1]}'] = self.counts[-1]
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else None,
+            'p50': self.quantile(0.5),
+            'p90': self.quantile(0.9),
+            'p99': self.quantile(0.99),
+            'max': self.max,
+            'buckets': buckets,
+        }
+
+
+class EngineMetrics:
+    def __init__(self, name):
+        self.name = name
+        self.lock = threading.Lock()
+        self.calls = 0  # texts or batches given to the engine
+        self.characters = 0  # characters of these texts
+        self.requests = 0  # answered requests sent by the client, a long text can take several
+        self.request_characters = 0  # characters sent in them, what character-billed engines charge for
+        self.failures = 0
+        self.retries = 0
+        self.throttles = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_tokens = 0
+        self.latency = LatencyHistogram()
+
+    def on_call(self, characters):
+        with self.lock:
+            self.calls += 1
+            self.characters += characters
+
+    def on_request(self, latency, characters=0, prompt_tokens=0, completion_tokens=0, cached_tokens=0):
+        with self.lock:
+            self.requests += 1
+            self.request_characters += characters
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+            self.cached_tokens += cached_tokens
+            self.latency.observe(latency)
+
+    def on_throttle(self, retried):
+        with self.lock:
+            self.throttles += 1
+            if retried:
+                self.retries += 1
+
+    def on_failure(self):
+        with self.lock:
+            self.failures += 1
+
+    def to_dict(self, wall_time):
+        with self.lock:
+            return {
+                'calls': self.calls,
+                'characters': self.characters,
+                'characters_per_second': self.characters / wall_time if wall_time > 0 else None,
+                'requests': self.requests,
+                'request_characters': self.request_characters,
+                'failures': self.failures,
+                'retries': self.retries,
+                'throttles': self.throttles,
+                'prompt_tokens': self.prompt_tokens,
+                'completion_tokens': self.completion_tokens,
+                'cached_tokens': self.cached_tokens,
+                'latency': self.latency.to_dict(),
+            }
+
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started_at = datetime.datetime.now().isoformat(timespec='seconds')
+        self.start = time.monotonic()
+        self.engines = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_writes = 0
+        self.untranslated = 0
+
+    def engine(self, name):
+        with self.lock:
+            if name not in self.engines:
+                self.engines[name] = EngineMetrics(name)
+            return self.engines[name]
+
+    def on_cache_lookup(self, hits, misses):
+        with self.lock:
+            self.cache_hits += hits
+            self.cache_misses += misses
+
+    def on_cache_write(self, writes):
+        with self.lock:
+            self.cache_writes += writes
+
+    def on_untranslated(self, count):
+        with self.lock:
+            self.untranslated += count
+
+    def report(self, **document):
+        # document: what the report is about, like the input and output paths or the languages
+        wall_time = time.monotonic() - self.start
+        lookups = self.cache_hits + self.cache_misses
+        return dict(document, **{
+            'started_at': self.started_at,
+            'wall_time': wall_time,
+            'untranslated': self.untranslated,
+            'cache': {
+                'hits': self.cache_hits,
+                'misses': self.cache_misses,
+                'writes': self.cache_writes,
+                'hit_rate': self.cache_hits / lookups if lookups else None,
+            },
+            'engines': {name: engine.to_dict(wall_time) for name, engine in self.engines.items()},
+        })
+
+    def write_report(self, path, **document):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(**document), f, indent=2, ensure_ascii=False)
@@ -86,7 +86,7 @@ def check_update(require_updated=True):
 
 
 def add_arguments(parser):
-    parser.add_argument("--engine", dest='engine', default=config.default_engine, help=f'translation engine, avaiable options include google, tencent, and openai. default is {config.default_engine}')
+    parser.add_argument("--engine", dest='engine', default=config.default_engine, help=f'translation engine, avaiable options include google, tencent, and openai. several engines separated by commas, like openai,tencent,google, are used in turn when the previous ones fail. default is {config.default_engine}')
     parser.add_argument("-from", default=config.default_language_from, dest='l_from', help=f'language from, default is {config.default_language_from}')
     parser.add_argument("-to", default=config.default_language_to, dest='l_to', help=f'language to, default is {config.default_language_to}')
     parser.add_argument("-threads", default=config.default_threads, type=int, help='threads for tencent translation, default is auto')
@@ -98,6 +98,9 @@ def add_arguments(parser):
     parser.add_argument("--setdefault", action='store_true', help='set default translation engine and languages')
     parser.add_argument("--debug", action='store_true', help='Debug options for developers')
     parser.add_argument("--nocache", action='store_true', help='Debug options for developers')
+    parser.add_argument("--batch", action='store_true', help='send the text of several paragraphs in one request')
+    parser.add_argument("--async", action='store_true', dest='asynchronous', help='translate the paragraphs as asyncio tasks, -threads then limits the requests in flight')
+    parser.add_argument("--metrics", action='store_true', help='write the requests, tokens, latencies and cache hits of every translated file to a JSON report next to it')
 
 
 def process_options(options):
@@ -191,23 +194,23 @@ def process_options(options):
         from . import encoding
         encoding.force_utf8 = True
 
-    if options.engine == 'tencent':
+    engines = options.engine.split(',')
+    if 'tencent' in engines:
         haskey = (config.tencent_secret_id is not None) and (config.tencent_secret_key is not None)
         if not haskey:
             print('Please save ID and key for tencent translation api first by')
             print('translate_tex --setkey')
             sys.exit()
-        if options.l_from == 'zh-CN':
-            options.l_from = 'zh'
-        if options.l_to == 'zh-CN':
-            options.l_to = 'zh'
-        if options.threads == 0:
-            options.threads = 1
-        elif options.threads > 1:
-            options.threads = 1
-            print('tencent engine does not support multi-threading, set to 1')
+        # zh-CN is mapped to zh by the tencent translator itself, the other engines of the chain keep the codes as given
+        # with --batch the requests are sent one batch at a time, the threads only prepare the paragraphs
+        if not options.batch and engines[0] == 'tencent':
+            if options.threads == 0:
+                options.threads = 1
+            elif options.threads > 1:
+                options.threads = 1
+                print('tencent engine does not support multi-threading, set to 1')
 
-    if options.engine == 'openai':
+    if 'openai' in engines:
         haskey = bool(config.openai_api_key)
         if not haskey:
             print('Please save OpenAI API key first by')
@@ -255,4 +258,6 @@ def process_options(options):
     print('language to', options.l_to)
 
     print('threads', options.threads if options.threads > 0 else 'auto')
+    if options.asynchronous:
+        print('paragraphs are translated as asyncio tasks')
     print()